@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from uuid import UUID
-from app.db import get_db
+from app.db import get_async_db
 from app.db.models import EvidenceItem, Incident
 from pydantic import BaseModel
 from datetime import datetime
 import os
 from app.config import settings
+from app.services.image_hashing import compute_perceptual_hash
 
 router = APIRouter()
 
@@ -20,6 +22,7 @@ class EvidenceItemResponse(BaseModel):
     source: Optional[str]
     source_url: Optional[str]
     file_path: Optional[str]
+    log_digest: Optional[dict] = None
     created_at: datetime
 
     class Config:
@@ -38,21 +41,21 @@ class EvidenceItemCreate(BaseModel):
 async def get_incident_evidence(
     incident_id: UUID,
     evidence_type: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all evidence items for an incident."""
-    query = db.query(EvidenceItem).filter(EvidenceItem.incident_id == incident_id)
+    query = select(EvidenceItem).where(EvidenceItem.incident_id == incident_id)
     if evidence_type:
-        query = query.filter(EvidenceItem.evidence_type == evidence_type)
+        query = query.where(EvidenceItem.evidence_type == evidence_type)
     
-    evidence = query.order_by(EvidenceItem.created_at.desc()).all()
-    return evidence
+    evidence = await db.scalars(query.order_by(EvidenceItem.created_at.desc()))
+    return evidence.all()
 
 
 @router.get("/{evidence_id}", response_model=EvidenceItemResponse)
-async def get_evidence(evidence_id: UUID, db: Session = Depends(get_db)):
+async def get_evidence(evidence_id: UUID, db: AsyncSession = Depends(get_async_db)):
     """Get a specific evidence item."""
-    evidence = db.query(EvidenceItem).filter(EvidenceItem.id == evidence_id).first()
+    evidence = await db.get(EvidenceItem, evidence_id)
     if not evidence:
         raise HTTPException(status_code=404, detail="Evidence not found")
     return evidence
@@ -62,11 +65,11 @@ async def get_evidence(evidence_id: UUID, db: Session = Depends(get_db)):
 async def create_evidence(
     incident_id: UUID,
     evidence: EvidenceItemCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new evidence item."""
     # Verify incident exists
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
@@ -79,8 +82,8 @@ async def create_evidence(
         source_url=evidence.source_url
     )
     db.add(db_evidence)
-    db.commit()
-    db.refresh(db_evidence)
+    await db.commit()
+    await db.refresh(db_evidence)
     
     # Process evidence asynchronously (generate embedding, analyze with VLM if screenshot, etc.)
     from app.workers.evidence_worker import process_evidence
@@ -89,15 +92,55 @@ async def create_evidence(
     return db_evidence
 
 
+@router.post("/incident/{incident_id}/bulk", response_model=List[EvidenceItemResponse])
+async def create_evidence_bulk(
+    incident_id: UUID,
+    evidence_items: List[EvidenceItemCreate],
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Create many evidence items at once (e.g. an alert storm).
+    
+    Embeddings for all items are generated by a single batched task instead
+    of one task and one API call per item.
+    """
+    incident = await db.get(Incident, incident_id)
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    
+    # One multi-row INSERT ... RETURNING loads the rows (server defaults
+    # included) without a refresh per item
+    result = await db.scalars(
+        insert(EvidenceItem).returning(EvidenceItem),
+        [
+            {
+                "incident_id": incident_id,
+                "evidence_type": evidence.evidence_type,
+                "title": evidence.title,
+                "content": evidence.content,
+                "source": evidence.source,
+                "source_url": evidence.source_url
+            }
+            for evidence in evidence_items
+        ]
+    )
+    db_items = result.all()
+    await db.commit()
+    
+    from app.workers.evidence_worker import process_evidence_batch
+    process_evidence_batch.delay([str(e.id) for e in db_items])
+    
+    return db_items
+
+
 @router.post("/incident/{incident_id}/upload-screenshot", response_model=EvidenceItemResponse)
 async def upload_screenshot(
     incident_id: UUID,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload a screenshot and process it with VLM."""
     # Verify incident exists
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
@@ -109,16 +152,20 @@ async def upload_screenshot(
         content = await file.read()
         f.write(content)
     
+    # Hash now so the worker can skip VLM analysis of repeat uploads
+    perceptual_hash = await compute_perceptual_hash(file_path)
+    
     # Create evidence item
     db_evidence = EvidenceItem(
         incident_id=incident_id,
         evidence_type="screenshot",
         title=f"Screenshot: {file.filename}",
-        file_path=file_path
+        file_path=file_path,
+        perceptual_hash=perceptual_hash
     )
     db.add(db_evidence)
-    db.commit()
-    db.refresh(db_evidence)
+    await db.commit()
+    await db.refresh(db_evidence)
     
     # Process with VLM
     from app.workers.evidence_worker import process_screenshot
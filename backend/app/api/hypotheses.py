@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from uuid import UUID
-from app.db import get_db
+from app.db import get_async_db
 from app.db.models import Hypothesis, Incident
 from pydantic import BaseModel
 from datetime import datetime
@@ -25,23 +26,25 @@ class HypothesisResponse(BaseModel):
 
 
 @router.get("/incident/{incident_id}", response_model=List[HypothesisResponse])
-async def get_incident_hypotheses(incident_id: UUID, db: Session = Depends(get_db)):
+async def get_incident_hypotheses(incident_id: UUID, db: AsyncSession = Depends(get_async_db)):
     """Get all hypotheses for an incident, ranked by confidence."""
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
-    hypotheses = db.query(Hypothesis).filter(
-        Hypothesis.incident_id == incident_id
-    ).order_by(Hypothesis.rank.asc(), Hypothesis.confidence.desc()).all()
+    hypotheses = await db.scalars(
+        select(Hypothesis).where(
+            Hypothesis.incident_id == incident_id
+        ).order_by(Hypothesis.rank.asc(), Hypothesis.confidence.desc())
+    )
     
-    return hypotheses
+    return hypotheses.all()
 
 
 @router.get("/{hypothesis_id}", response_model=HypothesisResponse)
-async def get_hypothesis(hypothesis_id: UUID, db: Session = Depends(get_db)):
+async def get_hypothesis(hypothesis_id: UUID, db: AsyncSession = Depends(get_async_db)):
     """Get a specific hypothesis."""
-    hypothesis = db.query(Hypothesis).filter(Hypothesis.id == hypothesis_id).first()
+    hypothesis = await db.get(Hypothesis, hypothesis_id)
     if not hypothesis:
         raise HTTPException(status_code=404, detail="Hypothesis not found")
     return hypothesis
@@ -51,16 +54,16 @@ async def get_hypothesis(hypothesis_id: UUID, db: Session = Depends(get_db)):
 async def update_hypothesis_status(
     hypothesis_id: UUID,
     status: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update the status of a hypothesis."""
-    hypothesis = db.query(Hypothesis).filter(Hypothesis.id == hypothesis_id).first()
+    hypothesis = await db.get(Hypothesis, hypothesis_id)
     if not hypothesis:
         raise HTTPException(status_code=404, detail="Hypothesis not found")
     
     hypothesis.status = status
-    db.commit()
-    db.refresh(hypothesis)
+    await db.commit()
+    await db.refresh(hypothesis)
     
     return {"message": "Hypothesis status updated", "hypothesis": hypothesis}
 
@@ -1,12 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from uuid import UUID
-from app.db import get_db
+from app.db import SessionLocal, get_async_db, get_db
 from app.db.models import Incident, TimelineEvent, Hypothesis, Action
+from app.db.vector_indexes import MAX_EF_SEARCH
 from app.services.incident_service import IncidentService
+from app.services.runbook_suggestions import RunbookSuggestionService
+from app.services.similar_incidents import SimilarIncidentService
+from app.api.hypotheses import HypothesisResponse
 from pydantic import BaseModel
 from datetime import datetime
+import json
 
 router = APIRouter()
 
@@ -45,24 +53,53 @@ class TimelineEventResponse(BaseModel):
         from_attributes = True
 
 
+class RunbookSuggestionResponse(BaseModel):
+    runbook_id: UUID
+    title: str
+    description: Optional[str]
+    service: Optional[str]
+    rank: int
+    score: float
+    section: Optional[str]
+    snippet: Optional[str]
+
+
+class PostmortemSummaryResponse(BaseModel):
+    id: UUID
+    title: str
+    summary: Optional[str]
+    root_cause: Optional[str]
+    resolution: Optional[str]
+
+    class Config:
+        from_attributes = True
+
+
+class SimilarIncidentResponse(BaseModel):
+    incident: IncidentResponse
+    similarity: float
+    confirmed_hypotheses: List[HypothesisResponse]
+    postmortem: Optional[PostmortemSummaryResponse]
+
+
 @router.get("/", response_model=List[IncidentResponse])
 async def list_incidents(
     status: Optional[str] = None,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List all incidents, optionally filtered by status."""
-    query = db.query(Incident)
+    query = select(Incident)
     if status:
-        query = query.filter(Incident.status == status)
-    incidents = query.order_by(Incident.created_at.desc()).limit(limit).all()
-    return incidents
+        query = query.where(Incident.status == status)
+    incidents = await db.scalars(query.order_by(Incident.created_at.desc()).limit(limit))
+    return incidents.all()
 
 
 @router.get("/{incident_id}", response_model=IncidentResponse)
-async def get_incident(incident_id: UUID, db: Session = Depends(get_db)):
+async def get_incident(incident_id: UUID, db: AsyncSession = Depends(get_async_db)):
     """Get a specific incident by ID."""
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     return incident
@@ -71,7 +108,7 @@ async def get_incident(incident_id: UUID, db: Session = Depends(get_db)):
 @router.post("/", response_model=IncidentResponse)
 async def create_incident(
     incident: IncidentCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new incident."""
     db_incident = Incident(
@@ -80,8 +117,8 @@ async def create_incident(
         severity=incident.severity
     )
     db.add(db_incident)
-    db.commit()
-    db.refresh(db_incident)
+    await db.commit()
+    await db.refresh(db_incident)
     
     # Trigger async processing
     from app.workers.incident_worker import process_new_incident
@@ -98,22 +135,75 @@ async def create_incident(
     return db_incident
 
 
+@router.get("/{incident_id}/runbook-suggestions", response_model=List[RunbookSuggestionResponse])
+def get_runbook_suggestions(incident_id: UUID, limit: Optional[int] = None, db: Session = Depends(get_db)):
+    """Precomputed runbook matches for an incident, best first.
+    
+    Served from storage; a background task recomputes them when the
+    incident's title, description or top evidence changes.
+    """
+    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    
+    suggestions = RunbookSuggestionService(db).get_suggestions(incident, limit=limit)
+    return [
+        RunbookSuggestionResponse(
+            runbook_id=s.runbook_id,
+            title=s.runbook.title,
+            description=s.runbook.description,
+            service=s.runbook.service,
+            rank=s.rank,
+            score=s.score,
+            section=s.section,
+            snippet=s.chunk.content if s.chunk else None
+        )
+        for s in suggestions
+    ]
+
+
+@router.get("/{incident_id}/similar", response_model=List[SimilarIncidentResponse])
+def get_similar_incidents(
+    incident_id: UUID,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    resolved_only: bool = False,
+    ef_search: Optional[int] = Query(None, ge=1, le=MAX_EF_SEARCH),
+    probes: Optional[int] = Query(None, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Past incidents most similar to this one, with their confirmed
+    hypotheses and postmortems."""
+    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    
+    return SimilarIncidentService(db).find_similar(
+        incident,
+        limit=limit,
+        resolved_only=resolved_only,
+        ef_search=ef_search,
+        probes=probes
+    )
+
+
 @router.get("/{incident_id}/timeline", response_model=List[TimelineEventResponse])
-async def get_incident_timeline(incident_id: UUID, db: Session = Depends(get_db)):
+async def get_incident_timeline(incident_id: UUID, db: AsyncSession = Depends(get_async_db)):
     """Get timeline events for an incident."""
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
-    events = db.query(TimelineEvent).filter(
-        TimelineEvent.incident_id == incident_id
-    ).order_by(TimelineEvent.timestamp.asc()).all()
+    events = await db.scalars(
+        select(TimelineEvent).where(
+            TimelineEvent.incident_id == incident_id
+        ).order_by(TimelineEvent.timestamp.asc())
+    )
     
-    return events
+    return events.all()
 
 
 @router.post("/{incident_id}/generate-timeline")
-async def generate_timeline(incident_id: UUID, db: Session = Depends(get_db)):
+async def generate_timeline(incident_id: UUID):
     """Manually trigger timeline generation for an incident."""
     from app.workers.incident_worker import generate_incident_timeline
     generate_incident_timeline.delay(str(incident_id))
@@ -121,17 +211,101 @@ async def generate_timeline(incident_id: UUID, db: Session = Depends(get_db)):
 
 
 @router.post("/{incident_id}/generate-hypotheses")
-async def generate_hypotheses(incident_id: UUID, db: Session = Depends(get_db)):
-    """Manually trigger hypothesis generation for an incident."""
+async def generate_hypotheses(incident_id: UUID, refresh: bool = False):
+    """Manually trigger hypothesis generation for an incident.
+    
+    Identical prompts reuse a cached LLM response; pass refresh=true to
+    force a new generation.
+    """
     from app.workers.incident_worker import generate_hypotheses
-    generate_hypotheses.delay(str(incident_id))
+    generate_hypotheses.delay(str(incident_id), use_cache=not refresh)
     return {"message": "Hypothesis generation started"}
 
 
 @router.post("/{incident_id}/generate-postmortem")
-async def generate_postmortem(incident_id: UUID, db: Session = Depends(get_db)):
-    """Generate a postmortem draft for an incident."""
+async def generate_postmortem(incident_id: UUID, refresh: bool = False):
+    """Generate a postmortem draft for an incident (refresh=true bypasses the LLM cache)."""
     from app.workers.incident_worker import generate_postmortem
-    generate_postmortem.delay(str(incident_id))
+    generate_postmortem.delay(str(incident_id), use_cache=not refresh)
     return {"message": "Postmortem generation started"}
 
+
+def _sse(event: str, data: dict) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"  # Disable proxy buffering so tokens arrive immediately
+}
+
+
+@router.get("/{incident_id}/hypotheses/stream")
+async def stream_hypotheses(incident_id: UUID, refresh: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """Generate ranked hypotheses and stream them over SSE as they are produced.
+    
+    Emits `token` events with {"text": ...} and a `candidate` event as each
+    hypothesis object completes, then one `hypothesis` event per stored
+    hypothesis in rank order, then `done`. An `error` event is sent if
+    generation fails.
+    """
+    if not await db.get(Incident, incident_id):
+        raise HTTPException(status_code=404, detail="Incident not found")
+    # Don't hold the connection for the length of the generation
+    await db.close()
+    
+    async def events():
+        # The service's sync session runs its queries in worker threads
+        session = SessionLocal()
+        service = IncidentService(session)
+        try:
+            async for kind, value in service.stream_hypotheses(incident_id, use_cache=not refresh):
+                if kind == "token":
+                    yield _sse("token", {"text": value})
+                elif kind == "candidate":
+                    yield _sse("candidate", value)
+                else:
+                    yield _sse("hypothesis", HypothesisResponse.model_validate(value).model_dump())
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            session.close()
+        yield _sse("done", {})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
+@router.get("/{incident_id}/postmortem/stream")
+async def stream_postmortem(incident_id: UUID, refresh: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """Generate a postmortem draft and stream tokens over SSE as they are produced.
+    
+    Emits `token` events, then a `postmortem` event with the stored row's id,
+    then `done`.
+    """
+    if not await db.get(Incident, incident_id):
+        raise HTTPException(status_code=404, detail="Incident not found")
+    # Don't hold the connection for the length of the generation
+    await db.close()
+    
+    async def events():
+        # The service's sync session runs its queries in worker threads
+        session = SessionLocal()
+        service = IncidentService(session)
+        try:
+            async for kind, value in service.stream_postmortem(incident_id, use_cache=not refresh):
+                if kind == "token":
+                    yield _sse("token", {"text": value})
+                else:
+                    yield _sse("postmortem", {
+                        "id": value.id,
+                        "title": value.title,
+                        "summary": value.summary
+                    })
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            session.close()
+        yield _sse("done", {})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=_SSE_HEADERS)
@@ -0,0 +1,112 @@
+"""Runtime statistics and index maintenance for the ML layer."""
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from typing import Optional
+from uuid import UUID
+from app.config import settings
+from app.db import get_db
+from app.db.models import ReindexJob
+from app.db.vector_indexes import vector_index_status
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_batcher import embedding_batcher
+from app.services.llm_cache import llm_cache
+from app.services.inference_scheduler import inference_scheduler
+from app.services.runbook_index import runbook_index
+from app.services.reindex import create_reindex_job, drop_previous_column, job_status, stale_rows, stale_summary
+
+router = APIRouter()
+
+
+class ReindexRequest(BaseModel):
+    target: str  # runbooks, runbook_chunks, evidence_items, postmortems
+    model: Optional[str] = None  # Defaults to EMBEDDING_MODEL
+    shadow: bool = False  # Embed into a shadow column (for switching models)
+    swap: bool = False  # Swap the shadow column in when complete
+    all_rows: bool = False  # Re-embed rows that already have an embedding
+
+
+@router.get("/stats")
+async def ml_stats():
+    """Return cache and batching counters for the ML layer in this process."""
+    return {
+        "embedding_backend": settings.EMBEDDING_BACKEND,
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_batcher": embedding_batcher.stats(),
+        "llm_cache": llm_cache.stats(),
+        "inference": inference_scheduler.stats(),
+        "runbook_index": runbook_index.stats()
+    }
+
+
+@router.get("/vector-indexes")
+def vector_indexes():
+    """Method, size and row count of each pgvector ANN index."""
+    return vector_index_status()
+
+
+@router.get("/embeddings/stale")
+def stale_embeddings(
+    target: Optional[str] = None,
+    model: Optional[str] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """Rows missing an embedding or embedded by another model than EMBEDDING_MODEL.
+    
+    Without ``target``, counts per table; with it, the ids of stale rows.
+    """
+    if target is None:
+        return stale_summary(db, model)
+    try:
+        return {"target": target, "ids": [str(i) for i in stale_rows(db, target, model, limit)]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/reindex")
+def start_reindex(request: ReindexRequest, db: Session = Depends(get_db)):
+    """Create a bulk (re-)embedding job and queue it."""
+    from app.workers.reindex_worker import reindex_embeddings
+    try:
+        job = create_reindex_job(
+            db,
+            request.target,
+            model=request.model,
+            shadow=request.shadow,
+            only_missing=False if request.all_rows else None,
+            swap=request.swap
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    reindex_embeddings.delay(str(job.id))
+    return job_status(job)
+
+
+@router.post("/reindex/{job_id}/resume")
+def resume_reindex(job_id: UUID, db: Session = Depends(get_db)):
+    """Re-queue an interrupted or failed job; it continues from its checkpoint."""
+    from app.workers.reindex_worker import reindex_embeddings
+    job = db.query(ReindexJob).filter(ReindexJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Reindex job not found")
+    reindex_embeddings.delay(str(job.id))
+    return job_status(job)
+
+
+@router.delete("/reindex/previous/{target}")
+def delete_previous_embeddings(target: str, db: Session = Depends(get_db)):
+    """Drop the embeddings kept for rollback by the last shadow-column swap."""
+    try:
+        return {"target": target, "dropped": drop_previous_column(db, target)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/reindex/{job_id}")
+def get_reindex_job(job_id: UUID, db: Session = Depends(get_db)):
+    """Progress and throughput of a reindex job."""
+    job = db.query(ReindexJob).filter(ReindexJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Reindex job not found")
+    return job_status(job)
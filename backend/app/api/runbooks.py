@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
 from uuid import UUID
-from app.db import get_db
+from app.db import get_async_db, get_db
 from app.db.models import Action, Incident, Runbook
+from app.db.vector_indexes import MAX_EF_SEARCH
 from app.services.rag_service import RAGService
 from pydantic import BaseModel
 from datetime import datetime
@@ -24,6 +27,18 @@ class ActionResponse(BaseModel):
         from_attributes = True
 
 
+class PostmortemSearchResult(BaseModel):
+    id: UUID
+    incident_id: Optional[UUID]
+    title: str
+    summary: Optional[str]
+    root_cause: Optional[str]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class RunbookResponse(BaseModel):
     id: UUID
     title: str
@@ -36,51 +51,134 @@ class RunbookResponse(BaseModel):
         from_attributes = True
 
 
+class RunbookSearchResult(BaseModel):
+    id: UUID
+    title: str
+    description: Optional[str]
+    service: Optional[str]
+    tags: List[str]
+    section: Optional[str] = None  # Heading path of the best-matching section
+    snippet: Optional[str] = None  # That section's text
+    content: Optional[str] = None  # Full markdown, only with include_content=true
+
+
 @router.get("/incident/{incident_id}/actions", response_model=List[ActionResponse])
-async def get_incident_actions(incident_id: UUID, db: Session = Depends(get_db)):
+async def get_incident_actions(incident_id: UUID, db: AsyncSession = Depends(get_async_db)):
     """Get all actions for an incident."""
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
-    actions = db.query(Action).filter(
-        Action.incident_id == incident_id
-    ).order_by(Action.created_at.asc()).all()
+    actions = await db.scalars(
+        select(Action).where(
+            Action.incident_id == incident_id
+        ).order_by(Action.created_at.asc())
+    )
     
-    return actions
+    return actions.all()
 
 
 @router.post("/incident/{incident_id}/actions/{action_id}/complete")
 async def complete_action(
     incident_id: UUID,
     action_id: UUID,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Mark an action as completed."""
-    action = db.query(Action).filter(
-        Action.id == action_id,
-        Action.incident_id == incident_id
-    ).first()
+    action = await db.scalar(
+        select(Action).where(
+            Action.id == action_id,
+            Action.incident_id == incident_id
+        )
+    )
     
     if not action:
         raise HTTPException(status_code=404, detail="Action not found")
     
     action.status = "completed"
     action.completed_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     return {"message": "Action completed", "action": action}
 
 
-@router.get("/search", response_model=List[RunbookResponse])
+@router.get("/search", response_model=List[RunbookSearchResult])
 async def search_runbooks(
     query: str,
     service: Optional[str] = None,
-    limit: int = 10,
+    limit: int = Query(10, ge=1, le=100),
+    ef_search: Optional[int] = Query(None, ge=1, le=MAX_EF_SEARCH),
+    probes: Optional[int] = Query(None, ge=1, le=1000),
+    mode: Optional[Literal["semantic", "lexical", "hybrid"]] = None,
+    include_content: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Search runbooks using RAG."""
+    """Search runbooks using RAG.
+    
+    Each result carries the best-matching section (`section`, `snippet`);
+    the full `content` is only returned with `include_content=true`.
+    `mode` selects semantic, lexical (full-text only, no embedding call) or
+    hybrid (rank-fused) retrieval. `ef_search` (HNSW) and `probes` (IVFFlat)
+    tune recall vs. latency of the vector index for this query.
+    """
     rag_service = RAGService(db)
-    runbooks = await rag_service.search_runbooks(query, service=service, limit=limit)
-    return runbooks
+    matches = await rag_service.search_runbook_sections(
+        query,
+        service=service,
+        limit=limit,
+        ef_search=ef_search,
+        probes=probes,
+        mode=mode
+    )
+    return [
+        RunbookSearchResult(
+            id=runbook.id,
+            title=runbook.title,
+            description=runbook.description,
+            service=runbook.service,
+            tags=runbook.tags or [],
+            section=chunk.heading if chunk else None,
+            snippet=chunk.content if chunk else None,
+            content=runbook.content if include_content else None
+        )
+        for runbook, chunk in matches
+    ]
+
+
+@router.post("/reindex")
+async def reindex_runbooks(force: bool = False):
+    """Queue chunking and embedding of all runbooks (unchanged ones are skipped unless ``force``)."""
+    from app.workers.incident_worker import index_runbooks
+    index_runbooks.delay(force=force)
+    return {"message": "Runbook indexing queued"}
+
+
+
+@router.get("/postmortems/search", response_model=List[PostmortemSearchResult])
+async def search_postmortems(
+    query: str,
+    limit: int = Query(10, ge=1, le=100),
+    mode: Optional[Literal["semantic", "lexical", "hybrid"]] = None,
+    severity: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    """Search past postmortems, optionally filtered by incident severity and date."""
+    rag_service = RAGService(db)
+    return await rag_service.search_postmortems(
+        query,
+        limit=limit,
+        mode=mode,
+        severity=severity,
+        created_after=created_after,
+        created_before=created_before
+    )
+
 
+@router.post("/postmortems/reindex")
+async def reindex_postmortems():
+    """Queue embedding of postmortems that are not indexed yet."""
+    from app.workers.incident_worker import backfill_postmortem_embeddings
+    backfill_postmortem_embeddings.delay()
+    return {"message": "Postmortem backfill queued"}
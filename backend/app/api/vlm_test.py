@@ -1,9 +1,10 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.ml_service import MLService
+from app.services.ml_service import MLService, VLM_ASPECTS
+from app.services.image_preprocessing import original_marker_for, processed_path_for
 from app.config import settings
-import asyncio
 import os
 import tempfile
+import time
 
 router = APIRouter()
 
@@ -23,36 +24,21 @@ async def test_vlm(file: UploadFile = File(...)):
         tmp_path = tmp_file.name
     
     try:
-        # Test different prompts
-        prompts = [
-            "Describe what you see in this image in detail.",
-            "What errors or anomalies do you see?",
-            "What are the key metrics and their values?",
-            "Summarize the important information in this dashboard screenshot."
-        ]
-        
-        results = {}
-        for i, prompt in enumerate(prompts):
-            try:
-                analysis = await ml_service.analyze_image(tmp_path, prompt)
-                results[f"prompt_{i+1}"] = {
-                    "prompt": prompt,
-                    "result": analysis,
-                    "status": "success"
-                }
-            except Exception as e:
-                results[f"prompt_{i+1}"] = {
-                    "prompt": prompt,
-                    "error": str(e),
-                    "status": "error"
-                }
-        
-        from app.config import settings
+        # All aspects in one structured request, per-prompt concurrently as fallback
+        started = time.monotonic()
+        try:
+            analysis = await ml_service.analyze_image_structured(tmp_path)
+            status = "completed"
+        except Exception as e:
+            analysis = {"error": str(e)}
+            status = "error"
         
         return {
-            "status": "completed",
+            "status": status,
             "model": settings.VLM_MODEL,
-            "results": results,
+            "analysis": analysis,
+            "prompts": VLM_ASPECTS,
+            "latency_ms": round(1000 * (time.monotonic() - started), 1),
             "file_info": {
                 "filename": file.filename,
                 "size": len(content),
@@ -60,9 +46,10 @@ async def test_vlm(file: UploadFile = File(...)):
             }
         }
     finally:
-        # Clean up temp file
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+        # Clean up temp file and its preprocessed variant (or marker)
+        for path in (tmp_path, processed_path_for(tmp_path), original_marker_for(tmp_path)):
+            if os.path.exists(path):
+                os.unlink(path)
 
 
 @router.get("/test/vlm/status")
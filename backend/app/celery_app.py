@@ -1,11 +1,17 @@
 """Celery application configuration."""
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 from app.config import settings
 
 celery_app = Celery(
     "opslens",
     broker=settings.REDIS_URL,
-    backend=settings.REDIS_URL
+    backend=settings.REDIS_URL,
+    include=[
+        "app.workers.incident_worker",
+        "app.workers.evidence_worker",
+        "app.workers.reindex_worker",
+    ]
 )
 
 celery_app.conf.update(
@@ -19,3 +25,19 @@ celery_app.conf.update(
     task_soft_time_limit=240,  # 4 minutes
 )
 
+
+
+@worker_process_init.connect
+def _init_worker_process(**kwargs):
+    """Open the shared inference client and load local models once per worker process."""
+    from app.workers.runtime import init_worker_runtime
+    from app.services.embedding_backends import preload_embedding_backend
+    init_worker_runtime()
+    preload_embedding_backend()
+
+
+@worker_process_shutdown.connect
+def _shutdown_worker_process(**kwargs):
+    """Release pooled inference connections on worker exit."""
+    from app.workers.runtime import shutdown_worker_runtime
+    shutdown_worker_runtime()
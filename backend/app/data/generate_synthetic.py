@@ -140,7 +140,14 @@ def generate_synthetic_incidents():
     """Generate realistic incidents with coherent timelines and evidence."""
     db = SessionLocal()
     try:
+        existing = {title for (title,) in db.query(Incident.title).all()}
+        created = 0
         for scenario in INCIDENT_SCENARIOS:
+            # Re-running the seed leaves scenarios that are already loaded alone
+            if scenario["title"] in existing:
+                continue
+            created += 1
+            
             # Create incident
             incident = Incident(
                 title=scenario["title"],
@@ -210,7 +217,7 @@ def generate_synthetic_incidents():
                 db.add(action)
         
         db.commit()
-        print(f"Generated {len(INCIDENT_SCENARIOS)} realistic incidents with coherent timelines, evidence, hypotheses, and actions.")
+        print(f"Generated {created} realistic incidents with coherent timelines, evidence, hypotheses, and actions ({len(INCIDENT_SCENARIOS) - created} already present).")
         
     finally:
         db.close()
@@ -400,15 +407,17 @@ def generate_synthetic_runbooks():
             },
         ]
         
+        existing = {runbook.title: runbook for runbook in db.query(Runbook).all()}
         for runbook_data in runbooks_data:
-            runbook = Runbook(
-                title=runbook_data["title"],
-                description=runbook_data["description"],
-                content=runbook_data["content"],
-                service=runbook_data["service"],
-                tags=runbook_data["tags"]
-            )
-            db.add(runbook)
+            runbook = existing.get(runbook_data["title"])
+            if runbook is None:
+                runbook = Runbook(title=runbook_data["title"])
+                db.add(runbook)
+            # Unchanged runbooks keep their content hash, so re-indexing skips them
+            runbook.description = runbook_data["description"]
+            runbook.content = runbook_data["content"]
+            runbook.service = runbook_data["service"]
+            runbook.tags = runbook_data["tags"]
         
         db.commit()
         print(f"Generated {len(runbooks_data)} realistic runbooks.")
@@ -1,11 +1,36 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
+
+def async_database_url(url: str) -> str:
+    """The DATABASE_URL with the asyncpg driver (e.g. postgresql+asyncpg://...)."""
+    scheme, rest = url.split("://", 1)
+    return f"{scheme.split('+', 1)[0]}+asyncpg://{rest}"
+
+
+POOL_OPTIONS = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+}
+
+# Workers and maintenance (index builds, bulk re-embedding) use the sync engine
+engine = create_engine(settings.DATABASE_URL, **POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# API handlers use the async engine so a slow query doesn't stall the event
+# loop; the statement timeout bounds how long one request can hold a connection
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    connect_args={"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}},
+    **POOL_OPTIONS
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -17,3 +42,8 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    """Dependency for getting an async (asyncpg) database session."""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -6,9 +6,43 @@ from sqlalchemy import text
 # Import all models so they're registered with Base
 from app.db.models import (
     Incident, TimelineEvent, Hypothesis, EvidenceItem, 
-    Action, Runbook, Postmortem
+    Action, Runbook, RunbookChunk, Postmortem, ReindexJob, IncidentRunbookSuggestion,
+    RUNBOOK_SEARCH_DOCUMENT, POSTMORTEM_SEARCH_DOCUMENT
 )
 from app.auth.models import APIKey, WebhookEndpoint
+from app.db.vector_indexes import ensure_vector_indexes
+from app.db.vector_types import embedding_sql_type
+
+
+# Idempotent upgrades for databases created before a column existed
+# (create_all only creates missing tables, it never alters existing ones)
+SCHEMA_UPGRADES = [
+    "ALTER TABLE evidence_items ADD COLUMN IF NOT EXISTS perceptual_hash VARCHAR(16)",
+    "ALTER TABLE evidence_items ADD COLUMN IF NOT EXISTS vlm_analysis TEXT",
+    "CREATE INDEX IF NOT EXISTS ix_evidence_items_perceptual_hash ON evidence_items (perceptual_hash)",
+    "ALTER TABLE evidence_items ADD COLUMN IF NOT EXISTS log_digest JSON",
+    f"ALTER TABLE runbooks ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS ({RUNBOOK_SEARCH_DOCUMENT}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_runbooks_search_vector ON runbooks USING gin (search_vector)",
+    f"ALTER TABLE postmortems ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS ({POSTMORTEM_SEARCH_DOCUMENT}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_postmortems_search_vector ON postmortems USING gin (search_vector)",
+    f"ALTER TABLE postmortems ADD COLUMN IF NOT EXISTS embedding {embedding_sql_type()}",
+    f"ALTER TABLE incidents ADD COLUMN IF NOT EXISTS embedding {embedding_sql_type()}",
+    "ALTER TABLE incidents ADD COLUMN IF NOT EXISTS embedding_source_hash VARCHAR(64)",
+    "ALTER TABLE runbooks ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "ALTER TABLE runbooks ADD COLUMN IF NOT EXISTS embedding_model VARCHAR(255)",
+    "ALTER TABLE evidence_items ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "ALTER TABLE evidence_items ADD COLUMN IF NOT EXISTS embedding_model VARCHAR(255)",
+    "ALTER TABLE postmortems ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "ALTER TABLE postmortems ADD COLUMN IF NOT EXISTS embedding_model VARCHAR(255)",
+]
+
+
+def upgrade_schema():
+    """Apply SCHEMA_UPGRADES to an existing database."""
+    with engine.connect() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+        conn.commit()
 
 
 def init_db():
@@ -20,6 +54,8 @@ def init_db():
     
     # Create all tables
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+    ensure_vector_indexes()
     print("Database initialized successfully!")
 
 
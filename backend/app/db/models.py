@@ -1,12 +1,27 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float, Computed, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
-from pgvector.sqlalchemy import Vector
 import uuid
 from app.db import Base
+from app.db.vector_types import embedding_type
 
 
+# Full-text search documents (weighted: A = title, B = body, C = details)
+TEXT_SEARCH_CONFIG = "english"
+
+RUNBOOK_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'C')"
+)
+
+POSTMORTEM_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(summary, '') || ' ' || coalesce(root_cause, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(impact, '') || ' ' || coalesce(resolution, '')), 'C')"
+)
+
 class Incident(Base):
     __tablename__ = "incidents"
     
@@ -27,6 +42,19 @@ class Incident(Base):
     
     # Metadata (renamed to avoid SQLAlchemy reserved word conflict)
     incident_metadata = Column(JSON, default=dict)
+    
+    # Embedding of title, description and top evidence digests (see
+    # incident_document; the runbook suggestion and similar-incident query)
+    # and a hash of the text it was computed from, to detect changes
+    embedding = Column(embedding_type(), nullable=True)
+    embedding_source_hash = Column(String(64), nullable=True)
+    
+    runbook_suggestions = relationship(
+        "IncidentRunbookSuggestion",
+        back_populates="incident",
+        cascade="all, delete-orphan",
+        order_by="IncidentRunbookSuggestion.rank"
+    )
 
 
 class TimelineEvent(Base):
@@ -76,10 +104,15 @@ class EvidenceItem(Base):
     source = Column(String(100))
     source_url = Column(String(500))
     file_path = Column(String(500))  # For screenshots/artifacts
+    perceptual_hash = Column(String(16), nullable=True, index=True)  # dHash of screenshots
+    vlm_analysis = Column(Text, nullable=True)  # Raw VLM output for screenshots
+    log_digest = Column(JSON, nullable=True)  # Mined log templates with counts (see services/log_miner.py)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Embedding for RAG
-    embedding = Column(Vector(1024), nullable=True)  # BGE-M3 produces 1024-dim vectors
+    embedding = Column(embedding_type(), nullable=True)  # BGE-M3 produces 1024-dim vectors
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the embedded text
+    embedding_model = Column(String(255), nullable=True)
     
     # Relationships
     incident = relationship("Incident", back_populates="evidence_items")
@@ -114,7 +147,41 @@ class Runbook(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Embedding for RAG
-    embedding = Column(Vector(1024), nullable=True)
+    embedding = Column(embedding_type(), nullable=True)
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the document and chunking settings
+    embedding_model = Column(String(255), nullable=True)
+    
+    # Full-text search (maintained by Postgres; deferred so normal loads skip it)
+    search_vector = deferred(Column(TSVECTOR, Computed(RUNBOOK_SEARCH_DOCUMENT, persisted=True)))
+    
+    # Relationships
+    chunks = relationship(
+        "RunbookChunk",
+        back_populates="runbook",
+        cascade="all, delete-orphan",
+        order_by="RunbookChunk.chunk_index"
+    )
+    
+    __table_args__ = (
+        Index("ix_runbooks_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+
+class RunbookChunk(Base):
+    __tablename__ = "runbook_chunks"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    runbook_id = Column(UUID(as_uuid=True), ForeignKey("runbooks.id", ondelete="CASCADE"), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    heading = Column(Text)  # Section path, e.g. "Mitigation > Rollback"
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Embedding of the section (with runbook title and heading for context)
+    embedding = Column(embedding_type(), nullable=True)
+    
+    # Relationships
+    runbook = relationship("Runbook", back_populates="chunks")
 
 
 class Postmortem(Base):
@@ -132,4 +199,62 @@ class Postmortem(Base):
     follow_ups = Column(JSON, default=list)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # Embedding for semantic search
+    embedding = Column(embedding_type(), nullable=True)
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the embedded text
+    embedding_model = Column(String(255), nullable=True)
+    
+    # Full-text search (maintained by Postgres; deferred so normal loads skip it)
+    search_vector = deferred(Column(TSVECTOR, Computed(POSTMORTEM_SEARCH_DOCUMENT, persisted=True)))
+    
+    __table_args__ = (
+        Index("ix_postmortems_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+
 
+class IncidentRunbookSuggestion(Base):
+    """Precomputed runbook matches for an incident."""
+    __tablename__ = "incident_runbook_suggestions"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    incident_id = Column(UUID(as_uuid=True), ForeignKey("incidents.id", ondelete="CASCADE"), nullable=False)
+    runbook_id = Column(UUID(as_uuid=True), ForeignKey("runbooks.id", ondelete="CASCADE"), nullable=False)
+    chunk_id = Column(UUID(as_uuid=True), ForeignKey("runbook_chunks.id", ondelete="SET NULL"), nullable=True)
+    rank = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)  # Cosine similarity of the best-matching section
+    section = Column(Text)  # Heading path of that section
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    incident = relationship("Incident", back_populates="runbook_suggestions")
+    runbook = relationship("Runbook")
+    chunk = relationship("RunbookChunk")
+    
+    __table_args__ = (
+        UniqueConstraint("incident_id", "runbook_id", name="uq_incident_runbook_suggestion"),
+        Index("ix_incident_runbook_suggestions_incident_rank", "incident_id", "rank"),
+    )
+
+
+class ReindexJob(Base):
+    """Progress of a bulk (re-)embedding run, checkpointed so it can resume."""
+    __tablename__ = "reindex_jobs"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    target = Column(String(50), nullable=False)  # runbooks, runbook_chunks, evidence_items, postmortems
+    column_name = Column(String(63), nullable=False)  # embedding, or a shadow column when switching models
+    model = Column(String(255), nullable=False)
+    only_missing = Column(Boolean, default=True)  # Only rows whose column is NULL (or embedded by another model)
+    swap_on_complete = Column(Boolean, default=False)
+    status = Column(String(20), default="pending")  # pending, running, completed, swapped, failed
+    last_id = Column(UUID(as_uuid=True), nullable=True)  # Keyset checkpoint
+    catch_up = Column(Boolean, default=False)  # Second pass for rows added during the first
+    processed = Column(Integer, default=0)
+    skipped = Column(Integer, default=0)
+    rows_per_second = Column(Float, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
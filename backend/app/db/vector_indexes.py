@@ -0,0 +1,342 @@
+"""Approximate nearest neighbour (pgvector) indexes on embedding columns.
+
+Without an index every similarity search is a sequential scan. HNSW gives the
+best speed/recall trade-off and can be built on an empty table; IVFFlat builds
+faster and uses less memory but needs representative data to train its lists,
+so it should be (re)built after bulk loads.
+
+With VECTOR_BINARY_QUANTIZATION the index is built over
+``binary_quantize(embedding)`` (1 bit per dimension, 32x smaller than float32)
+and searched by Hamming distance; the top candidates are then rescored
+exactly on the stored vectors. ``recall`` measures what that costs.
+
+Rebuild from the command line (builds alongside the old index, then swaps):
+
+    python -m app.db.vector_indexes rebuild --method hnsw
+    python -m app.db.vector_indexes rebuild --method ivfflat --table runbooks
+    python -m app.db.vector_indexes storage --type halfvec --table evidence_items
+    python -m app.db.vector_indexes recall --table evidence_items
+    python -m app.db.vector_indexes status
+"""
+import argparse
+import math
+from typing import Any, Dict, List, Optional, Sequence
+from pgvector.sqlalchemy import BIT
+from sqlalchemy import cast, func, literal, select, text
+from sqlalchemy.orm import Query, Session
+from app.db import engine
+from app.db.vector_types import STORAGE_TYPES, embedding_sql_type, embedding_type
+from app.config import settings
+
+
+# (table, column) pairs that get an ANN index; all searched by cosine distance
+VECTOR_INDEXES = [
+    ("runbooks", "embedding"),
+    ("runbook_chunks", "embedding"),
+    ("evidence_items", "embedding"),
+    ("postmortems", "embedding"),
+    ("incidents", "embedding"),
+]
+
+METHODS = ("hnsw", "ivfflat")
+BINARY_OPERATOR_CLASS = "bit_hamming_ops"
+
+# pgvector rejects a larger hnsw.ef_search, and an HNSW scan returns at most
+# ef_search rows, so this also caps the candidates one search can use
+MAX_EF_SEARCH = 1000
+
+
+def index_name(table: str, column: str, quantized: Optional[bool] = None) -> str:
+    """Name of the full-precision or binary-quantized ANN index."""
+    if quantized is None:
+        quantized = settings.VECTOR_BINARY_QUANTIZATION
+    return f"ix_{table}_{column}_bit_ann" if quantized else f"ix_{table}_{column}_ann"
+
+
+def binary_expression(column: str) -> str:
+    # Must match binary_codes() for the planner to use the index
+    return f"(binary_quantize({column})::bit({settings.EMBEDDING_DIMENSIONS}))"
+
+
+def ivfflat_lists(row_count: int) -> int:
+    """pgvector's guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond."""
+    if settings.VECTOR_IVFFLAT_LISTS:
+        return settings.VECTOR_IVFFLAT_LISTS
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return int(math.sqrt(row_count))
+
+
+def autocommit_connection():
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    return engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+def _row_count(conn, table: str, column: str) -> int:
+    return conn.execute(text(f"SELECT count(*) FROM {table} WHERE {column} IS NOT NULL")).scalar() or 0
+
+
+def _column_type(conn, table: str, column: str) -> Optional[str]:
+    """Storage type of an embedding column ("vector" or "halfvec")."""
+    return conn.execute(text(
+        "SELECT t.typname FROM pg_attribute a JOIN pg_type t ON t.oid = a.atttypid "
+        "WHERE a.attrelid = to_regclass(:table) AND a.attname = :column AND NOT a.attisdropped"
+    ), {"table": table, "column": column}).scalar()
+
+
+def _index_exists(conn, name: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM pg_indexes WHERE indexname = :name"), {"name": name}
+    ).first() is not None
+
+
+def index_ddl(
+    table: str,
+    column: str,
+    method: str,
+    name: str,
+    row_count: int = 0,
+    concurrently: bool = False,
+    quantized: bool = False,
+    column_type: str = "vector"
+) -> str:
+    """CREATE INDEX statement for the given method."""
+    if method == "hnsw":
+        options = f"m = {settings.VECTOR_HNSW_M}, ef_construction = {settings.VECTOR_HNSW_EF_CONSTRUCTION}"
+    elif method == "ivfflat":
+        options = f"lists = {ivfflat_lists(row_count)}"
+    else:
+        raise ValueError(f"Unknown vector index method: {method}")
+    keyword = "CONCURRENTLY " if concurrently else ""
+    if quantized:
+        key = f"{binary_expression(column)} {BINARY_OPERATOR_CLASS}"
+    else:
+        key = f"{column} {column_type}_cosine_ops"
+    return f"CREATE INDEX {keyword}{name} ON {table} USING {method} ({key}) WITH ({options})"
+
+
+def create_vector_index(
+    conn,
+    table: str,
+    column: str,
+    method: str,
+    name: Optional[str] = None,
+    concurrently: bool = False,
+    quantized: Optional[bool] = None
+) -> bool:
+    """Build one ANN index; returns False if it was skipped."""
+    if quantized is None:
+        quantized = settings.VECTOR_BINARY_QUANTIZATION
+    name = name or index_name(table, column, quantized)
+    row_count = _row_count(conn, table, column)
+    if method == "ivfflat" and row_count == 0:
+        # Lists trained on no data give poor recall; build after loading
+        print(f"Skipping IVFFlat index on {table}.{column}: no embeddings yet (run rebuild after loading)")
+        return False
+
+    column_type = _column_type(conn, table, column) or "vector"
+    conn.execute(text(f"SET maintenance_work_mem = '{settings.VECTOR_INDEX_MAINTENANCE_WORK_MEM}'"))
+    conn.execute(text(index_ddl(table, column, method, name, row_count, concurrently, quantized, column_type)))
+    return True
+
+
+def ensure_vector_indexes(method: Optional[str] = None):
+    """Create any missing ANN indexes (no-op for existing ones)."""
+    method = method or settings.VECTOR_INDEX_METHOD
+    if method == "none":
+        return
+    with autocommit_connection() as conn:
+        for table, column in VECTOR_INDEXES:
+            if not _index_exists(conn, index_name(table, column)):
+                create_vector_index(conn, table, column, method)
+
+
+def rebuild_vector_indexes(method: Optional[str] = None, tables: Optional[List[str]] = None):
+    """Rebuild ANN indexes without blocking searches.
+
+    The new index is built concurrently under a temporary name, then the old
+    one is dropped and the new one renamed into place.
+    """
+    method = method or settings.VECTOR_INDEX_METHOD
+    if method not in METHODS:
+        raise ValueError(f"Cannot rebuild with method {method!r}; choose one of {METHODS}")
+
+    with autocommit_connection() as conn:
+        for table, column in VECTOR_INDEXES:
+            if tables and table not in tables:
+                continue
+            name = index_name(table, column)
+            temp_name = f"{name}_new"
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {temp_name}"))
+            print(f"Building {method} index on {table}.{column}...")
+            if not create_vector_index(conn, table, column, method, name=temp_name, concurrently=True):
+                continue
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            conn.execute(text(f"ALTER INDEX {temp_name} RENAME TO {name}"))
+            # After switching quantization on or off, the other index is dead weight
+            other = index_name(table, column, not settings.VECTOR_BINARY_QUANTIZATION)
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {other}"))
+            print(f"Rebuilt {name}")
+
+
+def convert_storage(storage: str, tables: Optional[List[str]] = None):
+    """Change embedding columns to ``vector`` or ``halfvec`` storage.
+
+    This rewrites the table under an exclusive lock, so run it in a
+    maintenance window. ANN indexes are dropped first (their operator classes
+    are type-specific) and rebuilt afterwards.
+    """
+    sql_type = embedding_sql_type(storage)
+    with autocommit_connection() as conn:
+        for table, column in VECTOR_INDEXES:
+            if tables and table not in tables:
+                continue
+            current = _column_type(conn, table, column)
+            if current is None or current == storage:
+                continue
+            print(f"Converting {table}.{column} from {current} to {storage}...")
+            for quantized in (False, True):
+                conn.execute(text(f"DROP INDEX IF EXISTS {index_name(table, column, quantized)}"))
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {sql_type} USING {column}::{sql_type}"))
+            if settings.VECTOR_INDEX_METHOD != "none":
+                create_vector_index(conn, table, column, settings.VECTOR_INDEX_METHOD)
+
+
+def vector_index_status() -> List[Dict[str, Any]]:
+    """Method, size and row count for each managed ANN index."""
+    status = []
+    with engine.connect() as conn:
+        for table, column in VECTOR_INDEXES:
+            name = index_name(table, column)
+            row = conn.execute(text(
+                "SELECT am.amname, pg_relation_size(c.oid) "
+                "FROM pg_class c JOIN pg_am am ON am.oid = c.relam "
+                "WHERE c.relname = :name"
+            ), {"name": name}).first()
+            status.append({
+                "table": table,
+                "column": column,
+                "index": name,
+                "storage": _column_type(conn, table, column),
+                "quantized": settings.VECTOR_BINARY_QUANTIZATION,
+                "method": row[0] if row else None,
+                "size_bytes": row[1] if row else 0,
+                "rows": _row_count(conn, table, column)
+            })
+    return status
+
+
+def candidate_limit(limit: int) -> int:
+    """Rows the index scan must return to produce ``limit`` results (at most MAX_EF_SEARCH)."""
+    if settings.VECTOR_BINARY_QUANTIZATION:
+        limit = limit * settings.VECTOR_RESCORE_CANDIDATES_FACTOR
+    return min(limit, MAX_EF_SEARCH)
+
+
+def apply_search_params(db: Session, ef_search: Optional[int] = None, probes: Optional[int] = None, limit: int = 10):
+    """Set ANN search parameters for the current transaction.
+
+    ``hnsw.ef_search`` is the candidate list size (at least ``limit``, or the
+    index returns fewer rows than asked); ``ivfflat.probes`` is the number of
+    lists scanned. Higher values raise recall at the cost of latency. Both
+    reset when the transaction ends. ``ef_search`` is clamped to MAX_EF_SEARCH.
+    """
+    ef_search = max(int(ef_search or settings.VECTOR_HNSW_EF_SEARCH), candidate_limit(limit))
+    ef_search = min(ef_search, MAX_EF_SEARCH)
+    probes = max(1, int(probes or settings.VECTOR_IVFFLAT_PROBES))
+    db.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+    db.execute(text(f"SET LOCAL ivfflat.probes = {probes}"))
+
+
+def binary_codes(expression):
+    """``binary_quantize(expression)::bit(n)``, as indexed when quantized."""
+    return cast(func.binary_quantize(expression), BIT(settings.EMBEDDING_DIMENSIONS))
+
+
+def nearest(query: Query, id_column, column, embedding: Sequence[float], limit: int) -> Query:
+    """Order ``query`` by cosine distance of ``column`` to ``embedding``.
+
+    Without quantization this is a plain ANN scan. With it, the quantized
+    index picks ``candidate_limit(limit)`` rows by Hamming distance and only
+    those are rescored exactly on the full vectors.
+    """
+    distance = column.cosine_distance(embedding)
+    if not settings.VECTOR_BINARY_QUANTIZATION:
+        return query.order_by(distance).limit(limit)
+
+    query_codes = binary_codes(cast(literal(embedding, embedding_type()), embedding_type()))
+    candidates = query.with_entities(id_column.label("id")).order_by(
+        binary_codes(column).hamming_distance(query_codes)
+    ).limit(candidate_limit(limit)).subquery()
+    return query.filter(id_column.in_(select(candidates.c.id))).order_by(distance).limit(limit)
+
+
+def measure_recall(table: str, column: str = "embedding", k: int = 10, sample: int = 50) -> Dict[str, Any]:
+    """Recall@k of the configured search path against exact search.
+
+    The stored embeddings of ``sample`` random rows serve as queries; exact
+    neighbours come from a sequential scan with index scans disabled.
+    """
+    from app.db import Base, SessionLocal
+    import app.db.models  # noqa: F401 (registers the tables)
+
+    model_table = Base.metadata.tables[table]
+    id_column, vector_column = model_table.c.id, model_table.c[column]
+    db = SessionLocal()
+    recalls = []
+    try:
+        queries = db.query(vector_column).filter(
+            vector_column.isnot(None)
+        ).order_by(func.random()).limit(sample).all()
+        base = db.query(id_column).filter(vector_column.isnot(None))
+        for (embedding,) in queries:
+            apply_search_params(db, limit=k)
+            approximate = {row[0] for row in nearest(base, id_column, vector_column, embedding, k)}
+            db.execute(text("SET LOCAL enable_indexscan = off"))
+            exact = {row[0] for row in base.order_by(vector_column.cosine_distance(embedding)).limit(k)}
+            db.rollback()
+            if exact:
+                recalls.append(len(approximate & exact) / len(exact))
+    finally:
+        db.close()
+    return {
+        "table": table,
+        "k": k,
+        "queries": len(recalls),
+        "quantized": settings.VECTOR_BINARY_QUANTIZATION,
+        "mean_recall": sum(recalls) / len(recalls) if recalls else None,
+        "min_recall": min(recalls) if recalls else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage pgvector ANN indexes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild = subparsers.add_parser("rebuild", help="Rebuild indexes concurrently")
+    rebuild.add_argument("--method", choices=METHODS, default=None)
+    rebuild.add_argument("--table", action="append", dest="tables", help="Only this table (repeatable)")
+    storage = subparsers.add_parser("storage", help="Convert embedding columns to vector or halfvec")
+    storage.add_argument("--type", choices=STORAGE_TYPES, required=True, dest="storage")
+    storage.add_argument("--table", action="append", dest="tables", help="Only this table (repeatable)")
+    recall = subparsers.add_parser("recall", help="Measure recall@k against exact search")
+    recall.add_argument("--table", action="append", dest="tables", help="Only this table (repeatable)")
+    recall.add_argument("--k", type=int, default=10)
+    recall.add_argument("--sample", type=int, default=50)
+    subparsers.add_parser("status", help="Show index method, size and rows")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        rebuild_vector_indexes(args.method, args.tables)
+    elif args.command == "storage":
+        convert_storage(args.storage, args.tables)
+    elif args.command == "recall":
+        for table, column in VECTOR_INDEXES:
+            if not args.tables or table in args.tables:
+                print(measure_recall(table, column, k=args.k, sample=args.sample))
+    else:
+        for entry in vector_index_status():
+            print(entry)
+
+
+if __name__ == "__main__":
+    main()
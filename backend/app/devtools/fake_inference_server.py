@@ -0,0 +1,252 @@
+"""Local stand-in for the Hugging Face Inference API.
+
+Implements the endpoints MLService uses so the ML paths can be exercised and
+load-tested without network access or an API key:
+
+- text generation (``inputs`` is a string), including ``stream: true`` in
+  text-generation-inference SSE format and JSON hypotheses for structured
+  prompts
+- vision-language requests (``inputs.messages`` with an image)
+- feature extraction (``inputs`` is a list of strings), returning
+  deterministic unit vectors derived from a hash of model + text
+
+Latency is drawn from a configurable distribution and errors (500), cold
+model responses (503 with ``estimated_time``) and rate limiting (429 with
+``Retry-After``) can be injected at fixed rates.
+
+Run with:
+
+    python -m app.devtools.fake_inference_server --port 8001
+
+and point the backend at it with ``HUGGINGFACE_API_URL=http://localhost:8001``.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+from typing import Any, Dict, List
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeServerConfig:
+    """Runtime knobs, set from the command line."""
+
+    def __init__(self):
+        self.embedding_dim = 1024
+        self.latency_dist = "lognormal"  # fixed, uniform, normal, lognormal
+        self.latency_sigma = 0.5  # Spread (relative) for the random distributions
+        self.text_latency_ms = 800.0
+        self.image_latency_ms = 2000.0
+        self.embedding_latency_ms = 40.0
+        self.embedding_per_item_ms = 2.0
+        self.first_token_latency_ms = 200.0
+        self.token_latency_ms = 15.0
+        self.error_rate = 0.0
+        self.loading_rate = 0.0
+        self.loading_estimated_time = 2.0
+        self.rate_limit_rate = 0.0
+        self.retry_after = 1.0
+
+
+config = FakeServerConfig()
+rng = random.Random()
+stats: Dict[str, int] = {"text": 0, "stream": 0, "image": 0, "embedding": 0, "errors_injected": 0}
+
+app = FastAPI(title="OpsLens fake inference server")
+
+
+def sample_latency(mean_ms: float) -> float:
+    """Seconds to wait for a request whose mean latency is mean_ms."""
+    if mean_ms <= 0:
+        return 0.0
+    sigma = config.latency_sigma
+    if config.latency_dist == "fixed":
+        ms = mean_ms
+    elif config.latency_dist == "uniform":
+        ms = rng.uniform(mean_ms * (1 - sigma), mean_ms * (1 + sigma))
+    elif config.latency_dist == "normal":
+        ms = rng.gauss(mean_ms, mean_ms * sigma)
+    else:
+        # Lognormal with the requested mean: heavy right tail like real inference
+        mu = np.log(mean_ms) - sigma ** 2 / 2
+        ms = rng.lognormvariate(mu, sigma)
+    return max(0.0, ms) / 1000.0
+
+
+def injected_error():
+    """Return an error response according to the configured rates, or None."""
+    roll = rng.random()
+    if roll < config.loading_rate:
+        stats["errors_injected"] += 1
+        return JSONResponse(
+            status_code=503,
+            content={"error": "Model is currently loading", "estimated_time": config.loading_estimated_time}
+        )
+    roll -= config.loading_rate
+    if roll < config.rate_limit_rate:
+        stats["errors_injected"] += 1
+        return JSONResponse(
+            status_code=429,
+            content={"error": "Rate limit reached"},
+            headers={"Retry-After": str(config.retry_after)}
+        )
+    roll -= config.rate_limit_rate
+    if roll < config.error_rate:
+        stats["errors_injected"] += 1
+        return JSONResponse(status_code=500, content={"error": "Injected failure"})
+    return None
+
+
+def fake_embedding(model: str, text: str) -> List[float]:
+    """Deterministic unit vector for (model, text)."""
+    seed = int.from_bytes(hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(config.embedding_dim).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    return vector.tolist()
+
+
+def fake_hypotheses(prompt: str, digest: str) -> str:
+    """Structured hypotheses citing the evidence ids found in the prompt."""
+    evidence_ids = re.findall(r"^\[([0-9a-fA-F-]{36})\]", prompt, re.MULTILINE)
+    candidates = [
+        ("Connection pool exhaustion", "Connections to a downstream dependency were saturated after the deployment.", 0.72),
+        ("Bad deployment", "A recent change introduced a regression that raised error rates.", 0.55),
+        ("Capacity shortfall", "Traffic exceeded provisioned capacity, increasing latency.", 0.31),
+    ]
+    return json.dumps({"hypotheses": [
+        {
+            "title": f"{title} ({digest})",
+            "description": description,
+            "confidence": confidence,
+            "evidence_ids": evidence_ids[i:i + 2]
+        }
+        for i, (title, description, confidence) in enumerate(candidates)
+    ]})
+
+
+def fake_completion(prompt: str, max_tokens: int) -> str:
+    """Plausible, deterministic text for a prompt."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+    if "JSON" in prompt and '"hypotheses"' in prompt:
+        return fake_hypotheses(prompt, digest)
+    words = (
+        f"Synthetic response {digest}. The evidence points to resource exhaustion in a "
+        "downstream dependency following a recent change. Error rates rose after the "
+        "deployment and latency increased while connections were saturated. Recommended "
+        "next steps: roll back the change, raise pool limits and add alerting."
+    ).split()
+    return " ".join(words[:max(1, max_tokens)])
+
+
+def fake_image_analysis(prompt: str) -> str:
+    if "JSON" in prompt:
+        return json.dumps({
+            "description": "A monitoring dashboard with latency, error rate and throughput panels.",
+            "anomalies": ["Error rate spike to 15% at 10:15", "p99 latency above 2s"],
+            "metrics": ["error rate: 15%", "p99 latency: 2.3s", "throughput: 1.2k rps"],
+            "summary": "Error rate and latency spiked together around 10:15."
+        })
+    return "A monitoring dashboard showing an error rate spike and elevated p99 latency around 10:15."
+
+
+async def stream_tokens(text: str):
+    await asyncio.sleep(sample_latency(config.first_token_latency_ms))
+    tokens = text.split(" ")
+    for i, word in enumerate(tokens):
+        await asyncio.sleep(sample_latency(config.token_latency_ms))
+        token_text = word if i == 0 else f" {word}"
+        event = {
+            "token": {"id": i, "text": token_text, "logprob": 0.0, "special": False},
+            "generated_text": text if i == len(tokens) - 1 else None,
+            "details": None
+        }
+        yield f"data:{json.dumps(event)}\n\n"
+
+
+@app.post("/models/{model:path}")
+async def model_endpoint(model: str, request: Request):
+    payload: Dict[str, Any] = await request.json()
+    inputs = payload.get("inputs")
+    parameters = payload.get("parameters") or {}
+
+    error = injected_error()
+    if error is not None:
+        return error
+
+    if isinstance(inputs, list):
+        stats["embedding"] += 1
+        await asyncio.sleep(sample_latency(
+            config.embedding_latency_ms + config.embedding_per_item_ms * len(inputs)
+        ))
+        return [fake_embedding(model, str(text)) for text in inputs]
+
+    if isinstance(inputs, dict) and "messages" in inputs:
+        stats["image"] += 1
+        prompt = ""
+        for message in inputs.get("messages", []):
+            for part in message.get("content", []):
+                if part.get("type") == "text":
+                    prompt += part.get("text", "")
+        await asyncio.sleep(sample_latency(config.image_latency_ms))
+        return [{"generated_text": fake_image_analysis(prompt)}]
+
+    prompt = str(inputs or "")
+    text = fake_completion(prompt, int(parameters.get("max_new_tokens", 256)))
+
+    if payload.get("stream"):
+        stats["stream"] += 1
+        return StreamingResponse(stream_tokens(text), media_type="text/event-stream")
+
+    stats["text"] += 1
+    await asyncio.sleep(sample_latency(config.text_latency_ms))
+    return [{"generated_text": text}]
+
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy"}
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Hugging Face Inference API for offline testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--seed", type=int, default=None, help="Seed for latency/error sampling")
+    parser.add_argument("--embedding-dim", type=int, default=config.embedding_dim)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "normal", "lognormal"], default=config.latency_dist)
+    parser.add_argument("--latency-sigma", type=float, default=config.latency_sigma)
+    parser.add_argument("--text-latency-ms", type=float, default=config.text_latency_ms)
+    parser.add_argument("--image-latency-ms", type=float, default=config.image_latency_ms)
+    parser.add_argument("--embedding-latency-ms", type=float, default=config.embedding_latency_ms)
+    parser.add_argument("--embedding-per-item-ms", type=float, default=config.embedding_per_item_ms)
+    parser.add_argument("--first-token-latency-ms", type=float, default=config.first_token_latency_ms)
+    parser.add_argument("--token-latency-ms", type=float, default=config.token_latency_ms)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--loading-rate", type=float, default=0.0, help="Fraction of requests answered 503 'model loading'")
+    parser.add_argument("--loading-estimated-time", type=float, default=config.loading_estimated_time)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered 429")
+    parser.add_argument("--retry-after", type=float, default=config.retry_after)
+    args = parser.parse_args()
+
+    for name, value in vars(args).items():
+        if hasattr(config, name):
+            setattr(config, name, value)
+    if args.seed is not None:
+        rng.seed(args.seed)
+
+    print(f"Fake inference server on http://{args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
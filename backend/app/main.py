@@ -1,8 +1,11 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import incidents, evidence, hypotheses, runbooks, integrations, vlm_test, webhooks, auth
+from app.api import incidents, evidence, hypotheses, runbooks, integrations, vlm_test, webhooks, auth, ml
 from app.auth.security import get_api_key
 from app.config import settings
+from app.services.http_client import init_inference_client, close_inference_client
+from app.services.embedding_backends import preload_embedding_backend
 from fastapi import Depends
 from app.config import settings
 
@@ -37,6 +40,7 @@ if ENABLE_AUTH:
     app.include_router(runbooks.router, prefix="/api/v1/runbooks", tags=["runbooks"], dependencies=[Depends(get_api_key)])
     app.include_router(integrations.router, prefix="/api/v1/integrations", tags=["integrations"], dependencies=[Depends(get_api_key)])
     app.include_router(vlm_test.router, prefix="/api/v1", tags=["vlm-test"], dependencies=[Depends(get_api_key)])
+    app.include_router(ml.router, prefix="/api/v1/ml", tags=["ml"], dependencies=[Depends(get_api_key)])
 else:
     # Development mode - no auth required
     app.include_router(incidents.router, prefix="/api/v1/incidents", tags=["incidents"])
@@ -45,6 +49,19 @@ else:
     app.include_router(runbooks.router, prefix="/api/v1/runbooks", tags=["runbooks"])
     app.include_router(integrations.router, prefix="/api/v1/integrations", tags=["integrations"])
     app.include_router(vlm_test.router, prefix="/api/v1", tags=["vlm-test"])
+    app.include_router(ml.router, prefix="/api/v1/ml", tags=["ml"])
+
+
+@app.on_event("startup")
+async def startup():
+    await init_inference_client()
+    # Local embedding model (if configured) loads off the event loop
+    await asyncio.to_thread(preload_embedding_backend)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_inference_client()
 
 
 @app.get("/")
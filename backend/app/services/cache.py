@@ -0,0 +1,179 @@
+"""Two-tier (in-process LRU + Redis) cache used by the ML services."""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.http_client import release_loop_bound
+
+
+_redis_client = None
+_redis_loop: Optional[asyncio.AbstractEventLoop] = None
+_redis_disabled_until = 0.0
+
+# After a Redis error the tier is skipped for this long instead of paying a
+# connect timeout on every lookup.
+REDIS_RETRY_INTERVAL = 30.0
+
+
+def get_redis_client():
+    """Return an asyncio Redis client bound to the running loop, or None."""
+    global _redis_client, _redis_loop
+
+    if time.monotonic() < _redis_disabled_until:
+        return None
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+    if _redis_client is None or _redis_loop is not loop:
+        import redis.asyncio as redis_asyncio
+        if _redis_client is not None:
+            # aclose also disconnects the client's connection pool
+            release_loop_bound(_redis_client.aclose, _redis_loop, loop)
+        _redis_client = redis_asyncio.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=settings.CACHE_REDIS_TIMEOUT,
+            socket_timeout=settings.CACHE_REDIS_TIMEOUT
+        )
+        _redis_loop = loop
+
+    return _redis_client
+
+
+def _mark_redis_unavailable(error: Exception):
+    global _redis_disabled_until
+    print(f"Cache Redis tier unavailable: {error}")
+    _redis_disabled_until = time.monotonic() + REDIS_RETRY_INTERVAL
+
+
+class LRUCache:
+    """Size-bounded in-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes):
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TwoTierCache:
+    """Byte-value cache: process-local LRU in front of a shared Redis tier.
+
+    Redis is best-effort; if it is unreachable lookups fall through to a
+    miss and the caller recomputes.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int,
+        ttl: Optional[float] = None,
+        use_redis: bool = True
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.memory = LRUCache(max_entries, ttl)
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _redis_key(self, key: str) -> str:
+        return f"opslens:{self.namespace}:{key}"
+
+    async def get_many(self, keys: List[str], record: bool = True) -> List[Optional[bytes]]:
+        """Look up keys, promoting Redis hits into the memory tier.
+
+        ``record=False`` leaves the hit/miss counters alone (for polling).
+        """
+        values: List[Optional[bytes]] = [self.memory.get(k) for k in keys]
+        if record:
+            self.memory_hits += sum(1 for v in values if v is not None)
+
+        missing = [i for i, v in enumerate(values) if v is None]
+        redis = get_redis_client() if (self.use_redis and missing) else None
+        if redis is not None:
+            try:
+                found = await redis.mget([self._redis_key(keys[i]) for i in missing])
+            except Exception as e:
+                _mark_redis_unavailable(e)
+                found = [None] * len(missing)
+            for i, value in zip(missing, found):
+                if value is not None:
+                    values[i] = value
+                    self.memory.set(keys[i], value)
+                    if record:
+                        self.redis_hits += 1
+
+        if record:
+            self.misses += sum(1 for v in values if v is None)
+        return values
+
+    async def get(self, key: str, record: bool = True) -> Optional[bytes]:
+        return (await self.get_many([key], record=record))[0]
+
+    async def set_many(self, items: Dict[str, bytes]):
+        """Store values in both tiers."""
+        if not items:
+            return
+        for key, value in items.items():
+            self.memory.set(key, value)
+
+        redis = get_redis_client() if self.use_redis else None
+        if redis is None:
+            return
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for key, value in items.items():
+                if self.ttl:
+                    pipe.set(self._redis_key(key), value, ex=int(self.ttl))
+                else:
+                    pipe.set(self._redis_key(key), value)
+            await pipe.execute()
+        except Exception as e:
+            _mark_redis_unavailable(e)
+
+    async def set(self, key: str, value: bytes):
+        await self.set_many({key: value})
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        hits = self.memory_hits + self.redis_hits
+        return {
+            "memory_entries": len(self.memory),
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "evictions": self.memory.evictions,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
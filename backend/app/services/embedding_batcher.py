@@ -0,0 +1,104 @@
+"""Micro-batching of concurrent embedding requests."""
+import asyncio
+import weakref
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+
+
+Dispatch = Callable[[List[str], str], Awaitable[List[List[float]]]]
+
+
+class _PendingBatch:
+    """Texts waiting to be sent for one model on one event loop."""
+
+    def __init__(self, dispatch: Dispatch):
+        self.dispatch = dispatch
+        self.items: List[Tuple[str, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent generate_embeddings calls into batched requests.
+
+    Callers submit texts and await their vectors. Texts are held for at most
+    ``max_wait`` seconds (or until ``max_batch_size`` texts are queued) and
+    then sent to the inference API as a single list input; the results are
+    fanned back out to each waiting caller.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait: float):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._pending: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _PendingBatch]]" = weakref.WeakKeyDictionary()
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+
+    async def submit(self, texts: List[str], model: str, dispatch: Dispatch) -> List[List[float]]:
+        """Queue texts for embedding and wait for their vectors."""
+        loop = asyncio.get_running_loop()
+        batches = self._pending.setdefault(loop, {})
+        batch = batches.get(model)
+        if batch is None:
+            batch = batches[model] = _PendingBatch(dispatch)
+
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            batch.items.append((text, future))
+            futures.append(future)
+        self.requests += 1
+
+        if len(batch.items) >= self.max_batch_size:
+            self._flush(loop, model)
+        elif batch.timer is None:
+            batch.timer = loop.call_later(self.max_wait, self._flush, loop, model)
+
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self, loop: asyncio.AbstractEventLoop, model: str):
+        batch = self._pending.get(loop, {}).pop(model, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+
+        for start in range(0, len(batch.items), self.max_batch_size):
+            chunk = batch.items[start:start + self.max_batch_size]
+            loop.create_task(self._run(chunk, model, batch.dispatch))
+
+    async def _run(self, chunk: List[Tuple[str, asyncio.Future]], model: str, dispatch: Dispatch):
+        # Identical texts in the same window are embedded once
+        unique_texts = list(dict.fromkeys(text for text, _ in chunk))
+        self.batches += 1
+        self.texts += len(unique_texts)
+        try:
+            embeddings = await dispatch(unique_texts, model)
+            if len(embeddings) != len(unique_texts):
+                raise ValueError(
+                    f"Expected {len(unique_texts)} embeddings, got {len(embeddings)}"
+                )
+        except Exception as e:
+            for _, future in chunk:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(unique_texts, embeddings))
+        for text, future in chunk:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0
+        }
+
+
+embedding_batcher = EmbeddingBatcher(
+    max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+    max_wait=settings.EMBEDDING_BATCH_MAX_WAIT_MS / 1000.0
+)
@@ -0,0 +1,59 @@
+"""Content-addressed cache for text embeddings."""
+import hashlib
+from array import array
+from typing import List, Optional
+from app.config import settings
+from app.services.cache import TwoTierCache
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different copies share an entry."""
+    return " ".join(text.split())
+
+
+def embedding_cache_key(model: str, text: str) -> str:
+    """SHA-256 of model name + normalized text."""
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _encode(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode(data: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(data)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """Maps (model, text) to a float32 embedding in the two-tier cache."""
+
+    def __init__(self):
+        self.cache = TwoTierCache(
+            "emb",
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+            ttl=settings.EMBEDDING_CACHE_TTL,
+            use_redis=settings.EMBEDDING_CACHE_REDIS
+        )
+
+    async def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        keys = [embedding_cache_key(model, t) for t in texts]
+        values = await self.cache.get_many(keys)
+        return [_decode(v) if v is not None else None for v in values]
+
+    async def set_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        await self.cache.set_many({
+            embedding_cache_key(model, t): _encode(e)
+            for t, e in zip(texts, embeddings)
+        })
+
+    def stats(self):
+        return self.cache.stats()
+
+
+embedding_cache = EmbeddingCache()
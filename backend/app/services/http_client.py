@@ -0,0 +1,102 @@
+"""Shared HTTP client pool for the inference backend."""
+import asyncio
+import httpx
+from typing import Awaitable, Callable, Optional, Set
+from app.config import settings
+
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_closing: Set[asyncio.Task] = set()
+
+
+def _http2_available() -> bool:
+    """Check whether the optional h2 package needed for HTTP/2 is installed."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build_client() -> httpx.AsyncClient:
+    """Create a pooled client using the configured limits."""
+    http2 = settings.INFERENCE_HTTP2
+    if http2 and not _http2_available():
+        print("INFERENCE_HTTP2 is enabled but 'h2' is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.INFERENCE_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.INFERENCE_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.INFERENCE_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(
+        settings.INFERENCE_TIMEOUT,
+        connect=settings.INFERENCE_CONNECT_TIMEOUT
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+def get_inference_client() -> httpx.AsyncClient:
+    """Return the process-wide inference client, creating it on first use.
+
+    Connections are bound to the event loop they were opened on, so a new
+    client is created if the caller runs on a different loop than the one
+    the current client belongs to (e.g. a one-off loop in a script).
+    """
+    global _client, _client_loop
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    if _client is None or _client.is_closed or (loop is not None and _client_loop is not loop):
+        if _client is not None and not _client.is_closed:
+            release_loop_bound(_client.aclose, _client_loop, loop)
+        _client = _build_client()
+        _client_loop = loop
+
+    return _client
+
+
+def release_loop_bound(
+    aclose: Callable[[], Awaitable],
+    owner_loop: Optional[asyncio.AbstractEventLoop],
+    loop: Optional[asyncio.AbstractEventLoop]
+):
+    """Close a client that is being replaced because the event loop changed.
+
+    Its connections can only be closed on the loop that opened them: the
+    close is scheduled there if that loop is still open (it runs the next
+    time the loop does), or on the running loop if the client was never
+    bound to one. A client whose loop is already closed is just dropped.
+
+    Processes are expected to run on one long-lived loop (the API's, or
+    ``workers.runtime.get_worker_loop`` in workers), so this only happens
+    for one-off loops such as ``asyncio.run`` in scripts.
+    """
+    if owner_loop is None or owner_loop is loop:
+        if loop is not None:
+            task = loop.create_task(aclose())
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+    elif not owner_loop.is_closed():
+        asyncio.run_coroutine_threadsafe(aclose(), owner_loop)
+
+
+async def init_inference_client():
+    """Open the shared client eagerly (FastAPI startup / worker init)."""
+    get_inference_client()
+
+
+async def close_inference_client():
+    """Close the shared client and release pooled connections."""
+    global _client, _client_loop
+
+    client = _client
+    _client = None
+    _client_loop = None
+    if client is not None and not client.is_closed:
+        await client.aclose()
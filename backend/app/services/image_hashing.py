@@ -0,0 +1,40 @@
+"""Perceptual hashing for detecting near-identical screenshots."""
+import asyncio
+from typing import Optional
+from PIL import Image
+
+
+HASH_SIZE = 8  # 8x8 gradient bits -> 64-bit hash
+
+
+def dhash(image_path: str) -> str:
+    """Difference hash of an image as a 16-char hex string.
+
+    The image is reduced to grayscale (HASH_SIZE+1)xHASH_SIZE and each bit
+    records whether a pixel is brighter than its right neighbour, so small
+    changes (re-encoding, resizing, a ticking clock) flip only a few bits.
+    """
+    with Image.open(image_path) as img:
+        small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+
+def hamming_distance(a: str, b: str) -> int:
+    """Number of differing bits between two hex hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+async def compute_perceptual_hash(image_path: str) -> Optional[str]:
+    """Hash off the event loop; None if the file isn't a readable image."""
+    try:
+        return await asyncio.to_thread(dhash, image_path)
+    except Exception as e:
+        print(f"Perceptual hash failed for {image_path}: {e}")
+        return None
@@ -0,0 +1,91 @@
+"""Screenshot preprocessing before VLM analysis."""
+import asyncio
+import hashlib
+import os
+from PIL import Image, ImageOps
+from app.config import settings
+
+
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+
+
+def _variant_suffix() -> str:
+    """Short tag of the preprocessing settings, so changing them invalidates old variants."""
+    params = f"{settings.VLM_IMAGE_MAX_SIDE}:{settings.VLM_IMAGE_FORMAT}:{settings.VLM_IMAGE_QUALITY}"
+    return hashlib.sha1(params.encode("utf-8")).hexdigest()[:8]
+
+
+def processed_path_for(image_path: str) -> str:
+    """Path of the processed variant, stored next to the original."""
+    ext = FORMAT_EXTENSIONS.get(settings.VLM_IMAGE_FORMAT.upper(), "jpg")
+    return f"{image_path}.vlm-{_variant_suffix()}.{ext}"
+
+
+def original_marker_for(image_path: str) -> str:
+    """Marker recording that the processed variant was not smaller than the original."""
+    return f"{processed_path_for(image_path)}.original"
+
+
+def _is_fresh(processed: str, original: str) -> bool:
+    return os.path.exists(processed) and os.path.getmtime(processed) >= os.path.getmtime(original)
+
+
+def preprocess_image(image_path: str) -> str:
+    """Downscale and re-encode a screenshot for the VLM, returning the path to send.
+
+    The image is rotated per EXIF, flattened to RGB, shrunk so its longest
+    side is at most VLM_IMAGE_MAX_SIDE and saved without metadata in
+    VLM_IMAGE_FORMAT. The result is cached next to the original; if it
+    would not be smaller than the original, the original is used instead
+    and an empty marker file records that, so it isn't re-encoded again.
+    """
+    processed = processed_path_for(image_path)
+    if _is_fresh(processed, image_path):
+        return processed
+    marker = original_marker_for(image_path)
+    if _is_fresh(marker, image_path):
+        return image_path
+
+    image_format = settings.VLM_IMAGE_FORMAT.upper()
+    with Image.open(image_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+
+        max_side = settings.VLM_IMAGE_MAX_SIDE
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        save_kwargs = {"optimize": True}
+        if image_format in ("JPEG", "WEBP"):
+            save_kwargs["quality"] = settings.VLM_IMAGE_QUALITY
+
+        # Write atomically so concurrent workers never read a partial file
+        tmp_path = f"{processed}.tmp{os.getpid()}"
+        try:
+            img.save(tmp_path, format=image_format, **save_kwargs)
+            if os.path.getsize(tmp_path) >= os.path.getsize(image_path):
+                open(marker, "w").close()
+                return image_path
+            os.replace(tmp_path, processed)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    return processed
+
+
+async def prepare_image_for_vlm(image_path: str) -> str:
+    """Preprocess off the event loop; fall back to the original on any error."""
+    if not settings.VLM_IMAGE_PREPROCESS:
+        return image_path
+    try:
+        return await asyncio.to_thread(preprocess_image, image_path)
+    except Exception as e:
+        print(f"Image preprocessing failed for {image_path}: {e}")
+        return image_path
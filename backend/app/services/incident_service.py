@@ -1,9 +1,14 @@
 """Service for incident management and state machine."""
+import asyncio
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from uuid import UUID
-from app.db.models import Incident, TimelineEvent, Hypothesis, EvidenceItem, Action
+from app.db.models import Incident, TimelineEvent, Hypothesis, EvidenceItem, Action, Postmortem
 from app.services.ml_service import MLService
+from app.services.prompt_builder import EvidencePromptBuilder
+from app.services.rag_service import RAGService
+from app.services.structured_output import IncrementalJSONArrayParser
+from app.config import settings
 from datetime import datetime
 
 
@@ -41,47 +46,200 @@ class IncidentService:
         
         return events
     
-    async def generate_hypotheses(self, incident_id: UUID) -> List[Hypothesis]:
-        """Generate hypotheses based on evidence."""
-        incident = self.db.query(Incident).filter(Incident.id == incident_id).first()
+    def _get_incident(self, incident_id: UUID) -> Optional[Incident]:
+        return self.db.query(Incident).filter(Incident.id == incident_id).first()
+    
+    def _load_incident_evidence(self, incident_id: UUID) -> Tuple[Optional[Incident], List[EvidenceItem]]:
+        incident = self._get_incident(incident_id)
         if not incident:
-            return []
+            return None, []
         
         # Get all evidence
         evidence = self.db.query(EvidenceItem).filter(
             EvidenceItem.incident_id == incident_id
         ).all()
-        
+        return incident, evidence
+    
+    async def _hypothesis_prompt_inputs(self, incident_id: UUID):
+        """Load the incident and pack its evidence into the prompt budget."""
+        # The session is synchronous; keep its queries off the event loop
+        incident, evidence = await asyncio.to_thread(self._load_incident_evidence, incident_id)
+        if not incident:
+            return None, [], ""
         if not evidence:
-            return []
+            return incident, [], ""
         
-        # Summarize evidence
-        evidence_text = "\n".join([
-            f"{e.evidence_type}: {e.title}\n{e.content or ''}"
-            for e in evidence[:10]  # Limit to avoid token limits
-        ])
+        # Rank and pack evidence; overflow is summarized rather than dropped
+        packed = await EvidencePromptBuilder(self.ml_service).build(incident, evidence)
+        
+        return incident, packed["included"], packed["text"]
+    
+    def _save_hypotheses(
+        self,
+        incident_id: UUID,
+        hypotheses_data: List[Dict[str, Any]],
+        evidence: List[EvidenceItem]
+    ) -> List[Hypothesis]:
+        """Persist ranked hypotheses in one insert."""
+        hypotheses = [
+            Hypothesis(
+                incident_id=incident_id,
+                title=data["title"],
+                description=data["description"],
+                confidence=data["confidence"],
+                rank=data.get("rank", rank),
+                # Fall back to the top-ranked evidence when the model cited none
+                supporting_evidence=data.get("evidence_ids") or [str(e.id) for e in evidence[:3]]
+            )
+            for rank, data in enumerate(hypotheses_data, start=1)
+        ]
+        
+        self.db.add_all(hypotheses)
+        self.db.flush()
+        ids = [hypothesis.id for hypothesis in hypotheses]
+        self.db.commit()
+        
+        # Reload the expired rows (created_at is set by the server) in one
+        # query rather than one refresh per hypothesis
+        loaded = {
+            hypothesis.id: hypothesis
+            for hypothesis in self.db.query(Hypothesis).filter(Hypothesis.id.in_(ids))
+        }
+        return [loaded[hypothesis_id] for hypothesis_id in ids]
+    
+    async def generate_hypotheses(self, incident_id: UUID, use_cache: bool = True) -> List[Hypothesis]:
+        """Generate ranked hypotheses based on evidence (one LLM call)."""
+        incident, evidence, evidence_text = await self._hypothesis_prompt_inputs(incident_id)
+        if not incident or not evidence:
+            return []
         
-        # Generate hypothesis using ML
-        hypothesis_data = await self.ml_service.generate_hypothesis(
+        # Generate hypotheses using ML
+        hypotheses_data = await self.ml_service.generate_hypotheses(
             incident.title,
-            evidence_text
+            evidence_text,
+            evidence_ids=[str(e.id) for e in evidence],
+            use_cache=use_cache
         )
         
-        # Create hypothesis
-        hypothesis = Hypothesis(
-            incident_id=incident_id,
-            title=hypothesis_data["title"],
-            description=hypothesis_data["description"],
-            confidence=hypothesis_data["confidence"],
-            rank=1,
-            supporting_evidence=[str(e.id) for e in evidence[:3]]
+        return await asyncio.to_thread(self._save_hypotheses, incident_id, hypotheses_data, evidence)
+    
+    async def stream_hypotheses(self, incident_id: UUID, use_cache: bool = True) -> AsyncIterator[Tuple[str, Any]]:
+        """Generate ranked hypotheses, yielding progress as the JSON streams.
+        
+        Yields ("token", text) for each generated token and ("candidate", dict)
+        as soon as each hypothesis object is complete. Once generation finishes
+        the hypotheses are ranked, persisted, and yielded as ("hypothesis",
+        Hypothesis) in rank order.
+        """
+        incident, evidence, evidence_text = await self._hypothesis_prompt_inputs(incident_id)
+        if not incident or not evidence:
+            return
+        
+        prompt = self.ml_service.build_hypotheses_prompt(incident.title, evidence_text)
+        parser = IncrementalJSONArrayParser("hypotheses")
+        parts = []
+        async for token in self.ml_service.generate_text_stream(
+            prompt,
+            max_tokens=settings.HYPOTHESIS_MAX_TOKENS,
+            temperature=0.3,
+            use_cache=use_cache,
+            grammar=self.ml_service.hypothesis_grammar()
+        ):
+            parts.append(token)
+            yield "token", token
+            for candidate in parser.feed(token):
+                yield "candidate", candidate
+        
+        hypotheses_data = self.ml_service.parse_hypotheses(
+            incident.title,
+            "".join(parts),
+            evidence_ids=[str(e.id) for e in evidence]
+        )[:settings.HYPOTHESIS_COUNT]
+        for hypothesis in await asyncio.to_thread(self._save_hypotheses, incident_id, hypotheses_data, evidence):
+            yield "hypothesis", hypothesis
+    
+    def _postmortem_prompt_inputs(self, incident: Incident):
+        """Collect the timeline, hypotheses and resolution for a postmortem prompt."""
+        events = self.db.query(TimelineEvent).filter(
+            TimelineEvent.incident_id == incident.id
+        ).order_by(TimelineEvent.timestamp.asc()).all()
+        
+        timeline_text = "\n".join([
+            f"{e.timestamp}: {e.title}"
+            for e in events
+        ])
+        
+        hypotheses = self.db.query(Hypothesis).filter(
+            Hypothesis.incident_id == incident.id
+        ).all()
+        hypotheses_text = [h.title for h in hypotheses]
+        
+        resolution = incident.resolved_at.isoformat() if incident.resolved_at else None
+        return timeline_text, hypotheses_text, resolution
+    
+    def _save_postmortem(self, incident: Incident, postmortem_data: Dict[str, Any]) -> Postmortem:
+        postmortem = Postmortem(
+            incident_id=incident.id,
+            title=postmortem_data["title"],
+            summary=postmortem_data["summary"],
+            root_cause=postmortem_data["root_cause"],
+            contributing_factors=postmortem_data["contributing_factors"],
+            impact=postmortem_data["impact"],
+            resolution=postmortem_data["resolution"],
+            follow_ups=postmortem_data["follow_ups"]
         )
         
-        self.db.add(hypothesis)
+        self.db.add(postmortem)
         self.db.commit()
-        self.db.refresh(hypothesis)
+        self.db.refresh(postmortem)
+        
+        return postmortem
+    
+    async def generate_postmortem(self, incident_id: UUID, use_cache: bool = True) -> Optional[Postmortem]:
+        """Generate and store a postmortem draft."""
+        incident = await asyncio.to_thread(self._get_incident, incident_id)
+        if not incident:
+            return None
+        
+        timeline_text, hypotheses_text, resolution = await asyncio.to_thread(self._postmortem_prompt_inputs, incident)
+        postmortem_data = await self.ml_service.generate_postmortem(
+            incident.title,
+            timeline_text,
+            hypotheses_text,
+            resolution=resolution,
+            use_cache=use_cache
+        )
+        
+        postmortem = await asyncio.to_thread(self._save_postmortem, incident, postmortem_data)
+        await self._index_postmortem(postmortem)
+        return postmortem
+    
+    async def _index_postmortem(self, postmortem: Postmortem):
+        """Embed a new postmortem for search; failures leave it for the backfill."""
+        try:
+            await RAGService(self.db).index_postmortem(postmortem)
+        except Exception as e:
+            print(f"Postmortem indexing failed for {postmortem.id}: {e}")
+    
+    async def stream_postmortem(self, incident_id: UUID, use_cache: bool = True) -> AsyncIterator[Tuple[str, Any]]:
+        """Generate a postmortem, yielding ("token", text) and finally ("postmortem", Postmortem)."""
+        incident = await asyncio.to_thread(self._get_incident, incident_id)
+        if not incident:
+            return
+        
+        timeline_text, hypotheses_text, resolution = await asyncio.to_thread(self._postmortem_prompt_inputs, incident)
+        prompt = self.ml_service.build_postmortem_prompt(
+            incident.title, timeline_text, hypotheses_text, resolution
+        )
+        parts = []
+        async for token in self.ml_service.generate_text_stream(prompt, max_tokens=1024, use_cache=use_cache):
+            parts.append(token)
+            yield "token", token
         
-        return [hypothesis]
+        postmortem_data = self.ml_service.parse_postmortem(incident.title, "".join(parts), resolution)
+        postmortem = await asyncio.to_thread(self._save_postmortem, incident, postmortem_data)
+        yield "postmortem", postmortem
+        await self._index_postmortem(postmortem)
     
     async def generate_actions(self, incident_id: UUID) -> List[Action]:
         """Generate actionable next steps."""
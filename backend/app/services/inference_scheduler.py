@@ -0,0 +1,211 @@
+"""Per-model concurrency limiting and retry/backoff for inference requests."""
+import asyncio
+import random
+import time
+import weakref
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Optional
+import httpx
+from app.config import settings
+from app.services.http_client import get_inference_client
+
+
+# 503 = model loading / overloaded, 429 = rate limited, 502/504 = gateway hiccups
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+
+class _ModelStats:
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.queued = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    def record_wait(self, seconds: float):
+        self.queue_wait_total += seconds
+        self.queue_wait_max = max(self.queue_wait_max, seconds)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "queue_wait_avg_ms": round(1000 * self.queue_wait_total / self.requests, 2) if self.requests else 0.0,
+            "queue_wait_max_ms": round(1000 * self.queue_wait_max, 2)
+        }
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Extract a server wait hint from Retry-After or HF's ``estimated_time``."""
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(header)
+                return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    try:
+        body = response.json()
+    except Exception:
+        return None
+    if isinstance(body, dict) and isinstance(body.get("estimated_time"), (int, float)):
+        return max(0.0, float(body["estimated_time"]))
+    return None
+
+
+class InferenceScheduler:
+    """Shared gate in front of the inference API.
+
+    Limits in-flight requests per model (so a cold or slow model isn't
+    hammered), retries 429/5xx and transport errors with jittered
+    exponential backoff that honours Retry-After / ``estimated_time`` hints,
+    and tracks how long requests wait for a slot.
+    """
+
+    def __init__(self):
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+        self._stats: Dict[str, _ModelStats] = {}
+
+    def _limit(self, model: str) -> int:
+        return settings.INFERENCE_MODEL_CONCURRENCY.get(model, settings.INFERENCE_MAX_IN_FLIGHT_PER_MODEL)
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        semaphore = semaphores.get(model)
+        if semaphore is None:
+            semaphore = semaphores[model] = asyncio.Semaphore(self._limit(model))
+        return semaphore
+
+    def _model_stats(self, model: str) -> _ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = _ModelStats()
+        return stats
+
+    def backoff_delay(self, attempt: int, hint: Optional[float] = None) -> float:
+        """Delay before retry ``attempt`` (0-based)."""
+        cap = settings.INFERENCE_RETRY_MAX_DELAY
+        if hint is not None:
+            # Trust the server, plus a little jitter so waiters don't stampede
+            return min(cap, hint) * random.uniform(1.0, 1.2)
+        # Full jitter exponential backoff
+        return random.uniform(0, min(cap, settings.INFERENCE_RETRY_BASE_DELAY * (2 ** attempt)))
+
+    @asynccontextmanager
+    async def _slot(self, model: str):
+        stats = self._model_stats(model)
+        semaphore = self._semaphore(model)
+        started = time.monotonic()
+        stats.queued += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            stats.queued -= 1
+        stats.requests += 1
+        stats.record_wait(time.monotonic() - started)
+        stats.in_flight += 1
+        try:
+            yield
+        finally:
+            stats.in_flight -= 1
+            semaphore.release()
+
+    async def post(self, model: str, url: str, **kwargs) -> httpx.Response:
+        """POST to the inference API with concurrency limiting and retries.
+
+        Returns the final response (which may still be an error status once
+        retries are exhausted); transport errors are re-raised.
+        """
+        client = get_inference_client()
+        stats = self._model_stats(model)
+        max_retries = settings.INFERENCE_MAX_RETRIES
+
+        for attempt in range(max_retries + 1):
+            try:
+                async with self._slot(model):
+                    response = await client.post(url, **kwargs)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                if attempt >= max_retries:
+                    stats.failures += 1
+                    raise
+                stats.retries += 1
+                delay = self.backoff_delay(attempt)
+                print(f"Inference request to {model} failed ({e!r}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < max_retries:
+                stats.retries += 1
+                delay = self.backoff_delay(attempt, retry_after_seconds(response))
+                print(f"Inference API returned {response.status_code} for {model}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code >= 400:
+                stats.failures += 1
+            return response
+
+        # Unreachable: the last attempt always returns or raises
+        raise RuntimeError("Inference retry loop exited unexpectedly")
+
+    @asynccontextmanager
+    async def stream(self, model: str, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Open a streaming response, retrying only before any bytes are consumed.
+
+        Retryable statuses and transport errors are retried like ``post``
+        until the response is handed to the caller; errors while the caller
+        reads the stream are not. The model slot is held for the whole stream.
+        """
+        client = get_inference_client()
+        stats = self._model_stats(model)
+        max_retries = settings.INFERENCE_MAX_RETRIES
+        attempt = 0
+        yielded = False
+
+        while True:
+            try:
+                async with self._slot(model):
+                    async with client.stream(method, url, **kwargs) as response:
+                        if response.status_code in RETRYABLE_STATUS_CODES and attempt < max_retries:
+                            await response.aread()
+                            hint = retry_after_seconds(response)
+                        else:
+                            if response.status_code >= 400:
+                                stats.failures += 1
+                            yielded = True
+                            yield response
+                            return
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                if yielded:
+                    raise
+                if attempt >= max_retries:
+                    stats.failures += 1
+                    raise
+                stats.retries += 1
+                delay = self.backoff_delay(attempt)
+                print(f"Inference stream to {model} failed ({e!r}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            stats.retries += 1
+            delay = self.backoff_delay(attempt, hint)
+            print(f"Inference API returned {response.status_code} for {model} stream, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {model: stats.as_dict() for model, stats in self._stats.items()}
+
+
+inference_scheduler = InferenceScheduler()
@@ -0,0 +1,131 @@
+"""Response cache and single-flight deduplication for LLM generations."""
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+import weakref
+from typing import Awaitable, Callable, Dict, Optional
+from app.config import settings
+from app.services.cache import TwoTierCache, get_redis_client
+
+
+def llm_cache_key(
+    model: str,
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    grammar: Optional[Dict] = None
+) -> str:
+    """Key on (model, prompt hash, max_tokens, temperature[, output grammar])."""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    parts = [model, prompt_hash, max_tokens, round(temperature, 4)]
+    if grammar:
+        parts.append(grammar)
+    raw = json.dumps(parts, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Caches generated text and makes identical concurrent prompts share one call.
+
+    Deduplication works at two levels: callers in the same process await the
+    same in-flight task, and callers in other processes (e.g. three Celery
+    tasks from three button clicks) wait on a short-lived Redis lock and then
+    read the leader's result from the cache.
+    """
+
+    POLL_INTERVAL = 0.25
+
+    def __init__(self):
+        self.cache = TwoTierCache(
+            "llm",
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            ttl=settings.LLM_CACHE_TTL,
+            use_redis=settings.LLM_CACHE_REDIS
+        )
+        self._inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Task]]" = weakref.WeakKeyDictionary()
+        self.deduplicated = 0
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        """Return a cached response or run ``generate`` once for all concurrent callers."""
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached.decode("utf-8")
+
+        inflight = self._inflight.setdefault(asyncio.get_running_loop(), {})
+        task = inflight.get(key)
+        if task is not None:
+            self.deduplicated += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._generate_once(key, generate))
+        inflight[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                inflight.pop(key, None)
+            else:
+                task.add_done_callback(lambda _: inflight.pop(key, None))
+
+    async def _generate_once(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        redis = get_redis_client() if settings.LLM_CACHE_REDIS else None
+        lock_key = f"opslens:llm:lock:{key}"
+        token = uuid.uuid4().hex
+        acquired = True
+
+        if redis is not None:
+            try:
+                acquired = bool(await redis.set(
+                    lock_key, token, nx=True, ex=int(settings.LLM_SINGLE_FLIGHT_TIMEOUT)
+                ))
+            except Exception as e:
+                print(f"LLM single-flight lock unavailable: {e}")
+                redis = None
+                acquired = True
+
+        if not acquired:
+            result = await self._wait_for_leader(redis, key, lock_key)
+            if result is not None:
+                self.deduplicated += 1
+                return result
+
+        try:
+            result = await generate()
+            await self.cache.set(key, result.encode("utf-8"))
+            return result
+        finally:
+            if redis is not None and acquired:
+                try:
+                    # Only release our own lock
+                    if await redis.get(lock_key) == token.encode("utf-8"):
+                        await redis.delete(lock_key)
+                except Exception:
+                    pass
+
+    async def _wait_for_leader(self, redis, key: str, lock_key: str) -> Optional[str]:
+        """Poll for another process's result until its lock is released or expires."""
+        deadline = time.monotonic() + settings.LLM_SINGLE_FLIGHT_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            # Polls aren't lookups; keep them out of the hit/miss stats
+            cached = await self.cache.get(key, record=False)
+            if cached is not None:
+                return cached.decode("utf-8")
+            try:
+                if not await redis.exists(lock_key):
+                    # Leader failed or gave up - one more look, then do it ourselves
+                    cached = await self.cache.get(key, record=False)
+                    return cached.decode("utf-8") if cached is not None else None
+            except Exception:
+                return None
+        return None
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats["deduplicated"] = self.deduplicated
+        return stats
+
+
+llm_cache = LLMResponseCache()
@@ -0,0 +1,179 @@
+"""Streaming log template mining (Drain) for compressing log evidence."""
+import re
+from typing import Any, Dict, Iterable, List, Optional
+from app.config import settings
+
+
+WILDCARD = "<*>"
+
+TIMESTAMP_RE = re.compile(
+    r"^\[?(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?)\]?\s*"
+)
+
+# Tokens that are almost always variables; masked before clustering
+MASKS = [
+    re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"),  # UUID
+    re.compile(r"^\d{1,3}(\.\d{1,3}){3}(:\d+)?$"),  # IPv4[:port]
+    re.compile(r"^0x[0-9a-fA-F]+$"),  # Hex
+    re.compile(r"^[-+]?\d+([.,:]\d+)*(ms|s|m|h|%|[kKmMgG]i?[bB])?[,;:)]?$"),  # Numbers, durations, sizes
+]
+
+
+def _mask(token: str) -> str:
+    for pattern in MASKS:
+        if pattern.match(token):
+            return WILDCARD
+    return token
+
+
+def _has_digit(token: str) -> bool:
+    return any(c.isdigit() for c in token)
+
+
+class LogCluster:
+    """One template and the statistics of the lines it absorbed."""
+
+    def __init__(self, tokens: List[str]):
+        self.template = list(tokens)
+        self.count = 0
+        self.first_seen: Optional[str] = None
+        self.last_seen: Optional[str] = None
+        self.samples: List[List[str]] = []
+
+    def similarity(self, tokens: List[str]) -> float:
+        """Share of positions where the template matches (wildcards count as matches)."""
+        same = sum(1 for t, u in zip(self.template, tokens) if t == u or t == WILDCARD)
+        return same / len(tokens) if tokens else 1.0
+
+    def absorb(self, masked: List[str], raw: List[str], timestamp: Optional[str], max_samples: int):
+        self.template = [t if t == u else WILDCARD for t, u in zip(self.template, masked)]
+        self.count += 1
+        if timestamp:
+            if self.first_seen is None:
+                self.first_seen = timestamp
+            self.last_seen = timestamp
+        params = [r for t, r in zip(self.template, raw) if t == WILDCARD]
+        if params and len(self.samples) < max_samples and params not in self.samples:
+            self.samples.append(params)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "template": " ".join(self.template),
+            "count": self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "samples": self.samples
+        }
+
+
+class LogTemplateMiner:
+    """Drain-style online log parser.
+
+    Lines are routed through a fixed-depth prefix tree (token count, then
+    the first few tokens) to a small set of candidate clusters; a line joins
+    the most similar cluster above the similarity threshold, turning the
+    positions that differ into wildcards, or starts a new cluster. Each line
+    is processed once, so arbitrarily large logs can be streamed through.
+    """
+
+    def __init__(
+        self,
+        depth: Optional[int] = None,
+        similarity_threshold: Optional[float] = None,
+        max_children: Optional[int] = None,
+        max_samples: int = 3
+    ):
+        self.depth = max(3, depth or settings.LOG_MINER_DEPTH)
+        self.similarity_threshold = similarity_threshold if similarity_threshold is not None else settings.LOG_MINER_SIMILARITY
+        self.max_children = max_children or settings.LOG_MINER_MAX_CHILDREN
+        self.max_samples = max_samples
+        self.root: Dict[Any, Any] = {}
+        self.clusters: List[LogCluster] = []
+        self.total_lines = 0
+
+    def _leaf(self, tokens: List[str]) -> List[LogCluster]:
+        node = self.root.setdefault(len(tokens), {})
+        for token in tokens[:self.depth - 2]:
+            key = WILDCARD if _has_digit(token) or token == WILDCARD else token
+            if key not in node and len(node) >= self.max_children:
+                key = WILDCARD
+            node = node.setdefault(key, {})
+        return node.setdefault(None, [])
+
+    def add_line(self, line: str) -> Optional[LogCluster]:
+        """Feed one log line; returns the cluster it was assigned to."""
+        line = line.strip()
+        if not line:
+            return None
+
+        timestamp = None
+        match = TIMESTAMP_RE.match(line)
+        if match:
+            timestamp = match.group(1)
+            line = line[match.end():]
+
+        raw = line.split()
+        if not raw:
+            return None
+        masked = [_mask(t) for t in raw]
+        self.total_lines += 1
+
+        candidates = self._leaf(masked)
+        best, best_score = None, -1.0
+        for cluster in candidates:
+            score = cluster.similarity(masked)
+            if score > best_score:
+                best, best_score = cluster, score
+
+        if best is None or best_score < self.similarity_threshold:
+            best = LogCluster(masked)
+            candidates.append(best)
+            self.clusters.append(best)
+
+        best.absorb(masked, raw, timestamp, self.max_samples)
+        return best
+
+    def add_lines(self, lines: Iterable[str]):
+        for line in lines:
+            self.add_line(line)
+
+    def digest(self, max_templates: Optional[int] = None) -> Dict[str, Any]:
+        """Templates ordered by frequency, with counts and time range."""
+        max_templates = max_templates or settings.LOG_DIGEST_MAX_TEMPLATES
+        ordered = sorted(self.clusters, key=lambda c: c.count, reverse=True)
+        return {
+            "total_lines": self.total_lines,
+            "template_count": len(self.clusters),
+            "templates": [c.to_dict() for c in ordered[:max_templates]],
+            "omitted_templates": max(0, len(ordered) - max_templates)
+        }
+
+
+def mine_log_text(text: str, max_templates: Optional[int] = None) -> Dict[str, Any]:
+    """Build a template digest for a block of log text."""
+    miner = LogTemplateMiner()
+    miner.add_lines(text.splitlines())
+    return miner.digest(max_templates)
+
+
+def should_digest(evidence_type: str, content: Optional[str]) -> bool:
+    """Logs long enough for templating to pay off."""
+    if not content or evidence_type != "log":
+        return False
+    return content.count("\n") + 1 >= settings.LOG_DIGEST_MIN_LINES
+
+
+def render_log_digest(digest: Dict[str, Any]) -> str:
+    """Compact text form of a digest for LLM prompts."""
+    lines = [f"{digest['total_lines']} log lines, {digest['template_count']} distinct templates:"]
+    for t in digest["templates"]:
+        span = ""
+        if t.get("first_seen"):
+            span = f" [{t['first_seen']}" + (f" .. {t['last_seen']}]" if t.get("last_seen") != t["first_seen"] else "]")
+        lines.append(f"{t['count']}x{span} {t['template']}")
+        if t.get("samples"):
+            examples = "; ".join(", ".join(s) for s in t["samples"])
+            lines.append(f"    e.g. {examples}")
+    if digest.get("omitted_templates"):
+        lines.append(f"... {digest['omitted_templates']} rarer templates omitted")
+    return "\n".join(lines)
@@ -0,0 +1,129 @@
+"""Header-aware chunking of markdown documents (runbooks) for embedding."""
+import re
+from typing import Dict, List, Optional
+from app.config import settings
+from app.services.prompt_builder import CHARS_PER_TOKEN, estimate_tokens
+
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+
+def split_sections(markdown: str) -> List[Dict[str, str]]:
+    """Split markdown at ATX headings (outside code fences).
+
+    Each section carries its heading path (e.g. "Mitigation > Rollback") so a
+    chunk keeps the context of where it sits in the document.
+    """
+    sections = []
+    path: List[str] = []
+    lines: List[str] = []
+    in_fence = False
+
+    def flush():
+        body = "\n".join(lines).strip()
+        if body:
+            sections.append({"heading": " > ".join(path), "content": body})
+        lines.clear()
+
+    for line in markdown.splitlines():
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(line)
+        if match:
+            flush()
+            level = len(match.group(1))
+            path[:] = path[:level - 1] + [match.group(2)]
+            continue
+        lines.append(line)
+    flush()
+    return sections
+
+
+def _hard_cut(text: str, max_chars: int, overlap_chars: int, min_chars: int) -> List[str]:
+    """Cut text into windows of at most max_chars that share overlap_chars.
+
+    A final window adding fewer than min_chars of new text is merged into the
+    previous one rather than left as a tiny trailing chunk.
+    """
+    step = max(1, max_chars - overlap_chars)
+    starts = [0]
+    while starts[-1] + max_chars < len(text):
+        starts.append(starts[-1] + step)
+    if len(starts) > 1 and len(text) - (starts[-2] + max_chars) < min_chars:
+        starts.pop()
+    return [text[start:start + max_chars] for start in starts[:-1]] + [text[starts[-1]:]]
+
+
+def _split_long(text: str, max_tokens: int, overlap_tokens: int) -> List[str]:
+    """Window an oversized section on paragraph (then line) boundaries with overlap."""
+    units = [u for u in re.split(r"\n\s*\n", text) if u.strip()]
+    if any(estimate_tokens(u) > max_tokens for u in units):
+        units = [line for u in units for line in (u.splitlines() if estimate_tokens(u) > max_tokens else [u])]
+
+    windows: List[str] = []
+    current: List[str] = []
+    for unit in units:
+        if len(unit) > max_tokens * CHARS_PER_TOKEN:
+            # A single huge line (e.g. a stack trace); hard-cut it, overlapping the cuts
+            units_cut = _hard_cut(
+                unit,
+                max_tokens * CHARS_PER_TOKEN,
+                overlap_tokens * CHARS_PER_TOKEN,
+                settings.RUNBOOK_CHUNK_MIN_TOKENS * CHARS_PER_TOKEN
+            )
+        else:
+            units_cut = [unit]
+        for piece in units_cut:
+            if current and estimate_tokens("\n\n".join(current + [piece])) > max_tokens:
+                windows.append("\n\n".join(current))
+                # Carry trailing units forward as overlap (if they fit beside the piece)
+                carried: List[str] = []
+                for previous in reversed(current):
+                    candidate = [previous] + carried
+                    if (
+                        estimate_tokens("\n\n".join(candidate)) > overlap_tokens
+                        or estimate_tokens("\n\n".join(candidate + [piece])) > max_tokens
+                    ):
+                        break
+                    carried.insert(0, previous)
+                current = carried
+            current.append(piece)
+    if current:
+        windows.append("\n\n".join(current))
+    return windows
+
+
+def chunk_markdown(
+    markdown: str,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None
+) -> List[Dict[str, str]]:
+    """Chunk markdown into sections of at most ~max_tokens.
+
+    Sections are kept whole when they fit; small neighbouring sections under
+    the same parent heading are merged, and long ones are windowed with
+    ``overlap_tokens`` of shared context.
+    """
+    max_tokens = max_tokens or settings.RUNBOOK_CHUNK_MAX_TOKENS
+    overlap_tokens = settings.RUNBOOK_CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+
+    chunks: List[Dict[str, str]] = []
+    for section in split_sections(markdown):
+        heading, content = section["heading"], section["content"]
+        if estimate_tokens(content) > max_tokens:
+            for window in _split_long(content, max_tokens, overlap_tokens):
+                chunks.append({"heading": heading, "content": window})
+            continue
+
+        previous = chunks[-1] if chunks else None
+        if (
+            previous is not None
+            and previous["heading"].rsplit(" > ", 1)[0] == heading.rsplit(" > ", 1)[0]
+            and estimate_tokens(previous["content"]) < settings.RUNBOOK_CHUNK_MIN_TOKENS
+            and estimate_tokens(previous["content"] + content) <= max_tokens
+        ):
+            previous["content"] += f"\n\n{heading.rsplit(' > ', 1)[-1]}\n{content}" if heading else f"\n\n{content}"
+            continue
+        chunks.append({"heading": heading, "content": content})
+    return chunks
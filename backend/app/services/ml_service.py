@@ -1,13 +1,106 @@
 """ML service for interacting with Hugging Face Inference API."""
 import httpx
-from typing import Optional, List, Dict, Any
+import json
+from typing import Optional, List, Dict, Any, AsyncIterator
 from app.config import settings
+from app.services.inference_scheduler import inference_scheduler
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_batcher import embedding_batcher
+from app.services.embedding_backends import (
+    embedding_model_id,
+    embedding_model_name,
+    get_local_backend,
+    local_model_name,
+    use_local_embeddings
+)
+from app.services.llm_cache import llm_cache, llm_cache_key
+from app.services.image_preprocessing import prepare_image_for_vlm
+from app.services.log_miner import mine_log_text, render_log_digest
+from app.services.structured_output import parse_json_array_objects
+import asyncio
 import base64
 from pathlib import Path
 
 
+# Questions answered for each analyzed screenshot
+VLM_ASPECTS = {
+    "description": "Describe what you see in this image in detail.",
+    "anomalies": "What errors or anomalies do you see?",
+    "metrics": "What are the key metrics and their values?",
+    "summary": "Summarize the important information in this dashboard screenshot."
+}
+
+LIST_ASPECTS = ("anomalies", "metrics")
+
+# JSON schema for ranked root-cause hypotheses
+HYPOTHESIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "hypotheses": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "description": {"type": "string"},
+                    "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+                    "evidence_ids": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["title", "description", "confidence", "evidence_ids"]
+            }
+        }
+    },
+    "required": ["hypotheses"]
+}
+
+
+def parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """Extract the first JSON object from model output (tolerates code fences and chatter)."""
+    start = text.find("{")
+    while start != -1:
+        try:
+            value, _ = json.JSONDecoder().raw_decode(text[start:])
+            if isinstance(value, dict):
+                return value
+        except json.JSONDecodeError:
+            pass
+        start = text.find("{", start + 1)
+    return None
+
+
+def _normalize_aspect(name: str, value: Any):
+    """Lists for anomalies/metrics, strings for the rest."""
+    if name in LIST_ASPECTS:
+        if value is None:
+            return []
+        if isinstance(value, list):
+            return [str(v).strip() for v in value if str(v).strip()]
+        if isinstance(value, dict):
+            return [f"{k}: {v}" for k, v in value.items()]
+        # Free text: one entry per bullet/line
+        return [line.strip().lstrip("-*• ").strip() for line in str(value).splitlines() if line.strip()]
+    if value is None:
+        return ""
+    return value.strip() if isinstance(value, str) else json.dumps(value)
+
+
+def format_image_analysis(analysis: Dict[str, Any]) -> str:
+    """Render a structured image analysis as evidence text."""
+    sections = [f"Summary: {analysis.get('summary', '')}", f"Description: {analysis.get('description', '')}"]
+    if analysis.get("anomalies"):
+        sections.append("Anomalies:\n" + "\n".join(f"- {a}" for a in analysis["anomalies"]))
+    if analysis.get("metrics"):
+        sections.append("Metrics:\n" + "\n".join(f"- {m}" for m in analysis["metrics"]))
+    return "\n\n".join(sections)
+
+
 class MLService:
-    """Service for ML model interactions via Hugging Face Inference API."""
+    """Service for ML model interactions via Hugging Face Inference API.
+
+    Instances are cheap: HTTP connections come from the process-wide pool in
+    app.services.http_client and requests go through the shared
+    inference_scheduler, so creating an MLService per request is fine.
+    """
     
     def __init__(self):
         self.api_key = settings.HUGGINGFACE_API_KEY
@@ -22,48 +115,157 @@ class MLService:
         prompt: str,
         model: Optional[str] = None,
         max_tokens: int = 512,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        use_cache: bool = True,
+        grammar: Optional[Dict[str, Any]] = None
     ) -> str:
-        """Generate text using LLM."""
+        """Generate text using LLM.
+        
+        Responses are cached per (model, prompt, max_tokens, temperature) and
+        identical concurrent prompts share one request. Pass use_cache=False
+        to force a fresh generation. ``grammar`` constrains the output
+        (text-generation-inference grammar, e.g. {"type": "json", "value": schema}).
+        """
         model = model or settings.LLM_MODEL
-        url = f"{self.base_url}/models/{model}"
+        if not (use_cache and settings.LLM_CACHE_ENABLED):
+            return await self._request_text(prompt, model, max_tokens, temperature, grammar)
         
+        key = llm_cache_key(model, prompt, max_tokens, temperature, grammar)
+        return await llm_cache.get_or_generate(
+            key,
+            lambda: self._request_text(prompt, model, max_tokens, temperature, grammar)
+        )
+    
+    async def generate_text_stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        max_tokens: int = 512,
+        temperature: float = 0.7,
+        use_cache: bool = True,
+        grammar: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """Generate text using LLM, yielding tokens as the server produces them.
+        
+        Uses the inference server's token stream (text-generation-inference
+        SSE format). A cached response is yielded in one piece, and the full
+        text is cached once the stream completes.
+        """
+        model = model or settings.LLM_MODEL
+        use_cache = use_cache and settings.LLM_CACHE_ENABLED
+        key = llm_cache_key(model, prompt, max_tokens, temperature, grammar)
+        
+        if use_cache:
+            cached = await llm_cache.cache.get(key)
+            if cached is not None:
+                yield cached.decode("utf-8")
+                return
+        
+        url = f"{self.base_url}/models/{model}"
         payload = {
             "inputs": prompt,
-            "parameters": {
-                "max_new_tokens": max_tokens,
-                "temperature": temperature,
-                "return_full_text": False
-            }
+            "parameters": self._text_parameters(max_tokens, temperature, grammar),
+            "stream": True
         }
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, json=payload, headers=self.headers)
+        parts = []
+        async with inference_scheduler.stream(model, "POST", url, json=payload, headers=self.headers) as response:
             response.raise_for_status()
-            result = response.json()
-            
-            # Handle different response formats
-            if isinstance(result, list) and len(result) > 0:
-                return result[0].get("generated_text", "")
-            elif isinstance(result, dict):
-                return result.get("generated_text", "")
-            else:
-                return str(result)
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if not data or data == "[DONE]":
+                    continue
+                try:
+                    event = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                if "error" in event:
+                    raise Exception(f"LLM stream failed: {event['error']}")
+                token = event.get("token") or {}
+                if token.get("special"):
+                    continue
+                text = token.get("text", "")
+                if text:
+                    parts.append(text)
+                    yield text
+        
+        if use_cache:
+            await llm_cache.cache.set(key, "".join(parts).encode("utf-8"))
     
-    async def analyze_image(
+    def _text_parameters(
+        self,
+        max_tokens: int,
+        temperature: float,
+        grammar: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        parameters = {
+            "max_new_tokens": max_tokens,
+            "temperature": temperature,
+            "return_full_text": False
+        }
+        if grammar:
+            parameters["grammar"] = grammar
+        return parameters
+    
+    async def _request_text(
         self,
-        image_path: str,
         prompt: str,
-        model: Optional[str] = None
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        grammar: Optional[Dict[str, Any]] = None
     ) -> str:
-        """Analyze an image using VLM."""
-        model = model or settings.VLM_MODEL
+        """Call the inference API for a text generation (no caching)."""
         url = f"{self.base_url}/models/{model}"
         
+        payload = {
+            "inputs": prompt,
+            "parameters": self._text_parameters(max_tokens, temperature, grammar)
+        }
+        
+        response = await inference_scheduler.post(model, url, json=payload, headers=self.headers)
+        response.raise_for_status()
+        result = response.json()
+        
+        # Handle different response formats
+        if isinstance(result, list) and len(result) > 0:
+            return result[0].get("generated_text", "")
+        elif isinstance(result, dict):
+            return result.get("generated_text", "")
+        else:
+            return str(result)
+    
+    async def _encode_image(self, image_path: str) -> str:
+        """Preprocess an image and return it base64-encoded."""
+        # Downscaled/re-encoded variant (cached next to the original)
+        image_path = await prepare_image_for_vlm(image_path)
+        
         # Read and encode image as base64
         with open(image_path, "rb") as f:
             image_bytes = f.read()
-            image_data = base64.b64encode(image_bytes).decode("utf-8")
+            return base64.b64encode(image_bytes).decode("utf-8")
+    
+    async def analyze_image(
+        self,
+        image_path: str,
+        prompt: str,
+        model: Optional[str] = None
+    ) -> str:
+        """Analyze an image using VLM."""
+        image_data = await self._encode_image(image_path)
+        return await self._request_vlm(image_data, prompt, model or settings.VLM_MODEL)
+    
+    async def _request_vlm(
+        self,
+        image_data: str,
+        prompt: str,
+        model: str,
+        max_tokens: int = 512
+    ) -> str:
+        """Send one already-encoded image and prompt to the VLM."""
+        url = f"{self.base_url}/models/{model}"
         
         # Hugging Face Inference API format for vision-language models
         # Format: data:image/jpeg;base64,<base64_data> or just base64
@@ -87,48 +289,40 @@ class MLService:
                 ]
             },
             "parameters": {
-                "max_new_tokens": 512
+                "max_new_tokens": max_tokens
             }
         }
         
         try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                response = await client.post(url, json=payload, headers=self.headers)
-                
-                # Handle loading state (model might be loading)
-                if response.status_code == 503:
-                    # Model is loading, wait and retry
-                    import asyncio
-                    await asyncio.sleep(10)
-                    response = await client.post(url, json=payload, headers=self.headers)
-                
-                response.raise_for_status()
-                result = response.json()
-                
-                # Handle different response formats
-                if isinstance(result, list) and len(result) > 0:
-                    # Check for message format
-                    if isinstance(result[0], dict):
-                        if "generated_text" in result[0]:
-                            return result[0]["generated_text"]
-                        elif "message" in result[0]:
-                            return result[0]["message"].get("content", "")
-                    return str(result[0])
-                elif isinstance(result, dict):
-                    # Check for various response formats
-                    if "generated_text" in result:
-                        return result["generated_text"]
-                    elif "message" in result:
-                        return result["message"].get("content", "")
-                    elif "text" in result:
-                        return result["text"]
-                    elif "output" in result:
-                        return result["output"]
-                    else:
-                        # Return string representation
-                        return str(result)
+            # Loading-model 503s are retried by the scheduler using the server's estimated_time
+            response = await inference_scheduler.post(model, url, json=payload, headers=self.headers, timeout=120.0)
+            response.raise_for_status()
+            result = response.json()
+            
+            # Handle different response formats
+            if isinstance(result, list) and len(result) > 0:
+                # Check for message format
+                if isinstance(result[0], dict):
+                    if "generated_text" in result[0]:
+                        return result[0]["generated_text"]
+                    elif "message" in result[0]:
+                        return result[0]["message"].get("content", "")
+                return str(result[0])
+            elif isinstance(result, dict):
+                # Check for various response formats
+                if "generated_text" in result:
+                    return result["generated_text"]
+                elif "message" in result:
+                    return result["message"].get("content", "")
+                elif "text" in result:
+                    return result["text"]
+                elif "output" in result:
+                    return result["output"]
                 else:
+                    # Return string representation
                     return str(result)
+            else:
+                return str(result)
         except httpx.HTTPStatusError as e:
             error_msg = f"HTTP {e.response.status_code}: {e.response.text}"
             print(f"VLM API Error: {error_msg}")
@@ -137,13 +331,111 @@ class MLService:
             print(f"VLM Error: {str(e)}")
             raise Exception(f"VLM analysis failed: {str(e)}")
     
+    async def analyze_image_structured(
+        self,
+        image_path: str,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Answer all VLM_ASPECTS about an image, in one request if possible.
+        
+        Asks the model for a JSON object with description, anomalies,
+        metrics and summary. If the reply can't be parsed, falls back to one
+        prompt per aspect, run concurrently. The image is encoded only once
+        either way. The result's "mode" is "single_pass" or "per_prompt".
+        """
+        model = model or settings.VLM_MODEL
+        image_data = await self._encode_image(image_path)
+        
+        questions = "\n".join(f'- "{name}": {question}' for name, question in VLM_ASPECTS.items())
+        prompt = f"""Analyze this dashboard screenshot and answer every question below.
+
+{questions}
+
+Respond with only a JSON object with the keys "description" (string), "anomalies" (list of strings), "metrics" (list of "name: value" strings) and "summary" (string)."""
+        
+        try:
+            response = await self._request_vlm(image_data, prompt, model, max_tokens=768)
+            parsed = parse_json_object(response)
+            if parsed and all(parsed.get(name) for name in ("description", "summary")):
+                result = {name: _normalize_aspect(name, parsed.get(name)) for name in VLM_ASPECTS}
+                result["mode"] = "single_pass"
+                return result
+            print("VLM structured response incomplete, falling back to per-prompt analysis")
+        except Exception as e:
+            print(f"VLM structured analysis failed, falling back to per-prompt analysis: {e}")
+        
+        answers = await asyncio.gather(
+            *[self._request_vlm(image_data, question, model) for question in VLM_ASPECTS.values()],
+            return_exceptions=True
+        )
+        result = {"mode": "per_prompt", "errors": {}}
+        for name, answer in zip(VLM_ASPECTS, answers):
+            if isinstance(answer, Exception):
+                result[name] = _normalize_aspect(name, None)
+                result["errors"][name] = str(answer)
+            else:
+                result[name] = _normalize_aspect(name, answer)
+        if len(result["errors"]) == len(VLM_ASPECTS):
+            raise Exception(f"VLM analysis failed: {next(iter(result['errors'].values()))}")
+        return result
+    
     async def generate_embeddings(
         self,
         texts: List[str],
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        use_cache: bool = True
     ) -> List[List[float]]:
-        """Generate embeddings for texts."""
-        model = model or settings.EMBEDDING_MODEL
+        """Generate embeddings for texts.
+        
+        Results are cached by model + normalized text, so only texts that
+        haven't been embedded before are sent to the embedding backend
+        (the inference API, or a local model when EMBEDDING_BACKEND=local).
+        """
+        # ``model`` may be an id from embedding_model_id (e.g. a reindex job's)
+        model = embedding_model_name(model) if model else (
+            local_model_name() if use_local_embeddings() else settings.EMBEDDING_MODEL
+        )
+        if not texts:
+            return []
+        if not (use_cache and settings.EMBEDDING_CACHE_ENABLED):
+            return await self._fetch_embeddings(texts, model)
+        
+        # Quantized local vectors differ slightly from full-precision ones
+        cache_model = embedding_model_id(model)
+        
+        cached = await embedding_cache.get_many(cache_model, texts)
+        missing = list(dict.fromkeys(t for t, e in zip(texts, cached) if e is None))
+        
+        if missing:
+            fresh = await self._fetch_embeddings(missing, model)
+            if len(fresh) != len(missing):
+                # Unexpected response shape - don't cache, return as-is
+                return fresh
+            await embedding_cache.set_many(cache_model, missing, fresh)
+            by_text = dict(zip(missing, fresh))
+            cached = [e if e is not None else by_text[t] for t, e in zip(texts, cached)]
+        
+        return cached
+    
+    async def _fetch_embeddings(
+        self,
+        texts: List[str],
+        model: str
+    ) -> List[List[float]]:
+        """Embed texts, coalescing with concurrent callers when batching is enabled."""
+        if settings.EMBEDDING_BATCH_ENABLED:
+            return await embedding_batcher.submit(texts, model, self._request_embeddings)
+        return await self._request_embeddings(texts, model)
+    
+    async def _request_embeddings(
+        self,
+        texts: List[str],
+        model: str
+    ) -> List[List[float]]:
+        """Compute embeddings with the configured backend (no caching)."""
+        if use_local_embeddings():
+            return await get_local_backend(model).embed(texts)
+        
         url = f"{self.base_url}/models/{model}"
         
         # BGE-M3 expects inputs as a list of strings
@@ -151,37 +443,38 @@ class MLService:
             "inputs": texts
         }
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, json=payload, headers=self.headers)
-            response.raise_for_status()
-            result = response.json()
-            
-            # Handle different response formats
-            if isinstance(result, list):
-                # If it's a list of embeddings
-                return result
-            elif isinstance(result, dict) and "embeddings" in result:
-                return result["embeddings"]
-            else:
-                # Try to extract embeddings from the response
-                return result if isinstance(result, list) else [result]
+        response = await inference_scheduler.post(model, url, json=payload, headers=self.headers)
+        response.raise_for_status()
+        result = response.json()
+        
+        # Handle different response formats
+        if isinstance(result, list):
+            # If it's a list of embeddings
+            return result
+        elif isinstance(result, dict) and "embeddings" in result:
+            return result["embeddings"]
+        else:
+            # Try to extract embeddings from the response
+            return result if isinstance(result, list) else [result]
     
-    async def summarize_logs(self, logs: str) -> str:
-        """Summarize log content."""
-        prompt = f"""Summarize the following logs and identify key errors, warnings, and patterns:
+    async def summarize_logs(self, logs: str, digest: Optional[Dict[str, Any]] = None) -> str:
+        """Summarize log content.
+        
+        Logs are collapsed into templates with counts first (or a stored
+        digest is used), so repeated lines cost one prompt line instead of N.
+        """
+        digest = digest or mine_log_text(logs)
+        prompt = f"""Summarize the following logs and identify key errors, warnings, and patterns.
+The logs have been grouped into templates; <*> marks variable parts, and each line shows how many times it occurred and when.
 
-{logs}
+{render_log_digest(digest)}
 
 Summary:"""
         return await self.generate_text(prompt, max_tokens=256)
     
-    async def generate_hypothesis(
-        self,
-        incident_title: str,
-        evidence_summary: str
-    ) -> Dict[str, Any]:
-        """Generate a hypothesis about the root cause."""
-        prompt = f"""Based on the following incident and evidence, generate a hypothesis about the root cause.
+    def build_hypothesis_prompt(self, incident_title: str, evidence_summary: str) -> str:
+        """Build the root-cause hypothesis prompt."""
+        return f"""Based on the following incident and evidence, generate a hypothesis about the root cause.
 
 Incident: {incident_title}
 
@@ -195,9 +488,9 @@ Confidence: [0.0-1.0]
 Supporting Evidence: [List key evidence points]
 
 Hypothesis:"""
-        
-        response = await self.generate_text(prompt, max_tokens=512)
-        
+    
+    def parse_hypothesis(self, incident_title: str, response: str) -> Dict[str, Any]:
+        """Turn a raw hypothesis generation into hypothesis fields."""
         # Parse response (simplified - in production, use structured output)
         return {
             "title": incident_title.split(":")[0] if ":" in incident_title else f"Hypothesis for {incident_title}",
@@ -205,9 +498,108 @@ Hypothesis:"""
             "confidence": 0.7  # Default, could be extracted from response
         }
     
+    async def generate_hypothesis(
+        self,
+        incident_title: str,
+        evidence_summary: str,
+        use_cache: bool = True
+    ) -> Dict[str, Any]:
+        """Generate a hypothesis about the root cause."""
+        prompt = self.build_hypothesis_prompt(incident_title, evidence_summary)
+        response = await self.generate_text(prompt, max_tokens=512, use_cache=use_cache)
+        return self.parse_hypothesis(incident_title, response)
+    
+    def hypothesis_grammar(self) -> Optional[Dict[str, Any]]:
+        """Output grammar for structured hypotheses, if enabled."""
+        if not settings.LLM_JSON_GRAMMAR:
+            return None
+        return {"type": "json", "value": HYPOTHESIS_SCHEMA}
+    
+    def build_hypotheses_prompt(self, incident_title: str, evidence_summary: str, count: Optional[int] = None) -> str:
+        """Build the prompt for several ranked root-cause hypotheses as JSON."""
+        count = count or settings.HYPOTHESIS_COUNT
+        return f"""Based on the following incident and evidence, generate the {count} most likely root-cause hypotheses, most likely first.
+
+Incident: {incident_title}
+
+Evidence (each item starts with its [id]):
+{evidence_summary}
+
+Respond with JSON only, in this format:
+{{"hypotheses": [{{"title": "brief title", "description": "detailed explanation", "confidence": 0.0-1.0, "evidence_ids": ["ids of the supporting evidence items"]}}]}}
+
+JSON:"""
+    
+    def parse_hypotheses(
+        self,
+        incident_title: str,
+        response: str,
+        evidence_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Turn a structured generation into ranked hypothesis fields.
+        
+        Complete hypotheses are recovered even if the reply was truncated.
+        Cited evidence ids are restricted to ``evidence_ids`` when given.
+        Falls back to a single free-text hypothesis if no JSON is found.
+        """
+        valid_ids = set(evidence_ids) if evidence_ids is not None else None
+        hypotheses = []
+        for item in parse_json_array_objects(response, "hypotheses"):
+            title = str(item.get("title") or "").strip()
+            description = str(item.get("description") or "").strip()
+            if not title and not description:
+                continue
+            try:
+                confidence = min(1.0, max(0.0, float(item.get("confidence", 0.5))))
+            except (TypeError, ValueError):
+                confidence = 0.5
+            cited = item.get("evidence_ids") or []
+            if not isinstance(cited, list):
+                cited = [cited]
+            cited = [str(c).strip("[] ") for c in cited]
+            if valid_ids is not None:
+                cited = [c for c in cited if c in valid_ids]
+            hypotheses.append({
+                "title": (title or description)[:255],
+                "description": description or title,
+                "confidence": confidence,
+                "evidence_ids": list(dict.fromkeys(cited))
+            })
+        
+        if not hypotheses:
+            fallback = self.parse_hypothesis(incident_title, response)
+            fallback["evidence_ids"] = []
+            hypotheses = [fallback]
+        
+        # Stable sort keeps the model's own order between equal confidences
+        hypotheses.sort(key=lambda h: h["confidence"], reverse=True)
+        for rank, hypothesis in enumerate(hypotheses, start=1):
+            hypothesis["rank"] = rank
+        return hypotheses
+    
+    async def generate_hypotheses(
+        self,
+        incident_title: str,
+        evidence_summary: str,
+        evidence_ids: Optional[List[str]] = None,
+        count: Optional[int] = None,
+        use_cache: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Generate several ranked hypotheses in one structured LLM call."""
+        prompt = self.build_hypotheses_prompt(incident_title, evidence_summary, count)
+        response = await self.generate_text(
+            prompt,
+            max_tokens=settings.HYPOTHESIS_MAX_TOKENS,
+            temperature=0.3,
+            use_cache=use_cache,
+            grammar=self.hypothesis_grammar()
+        )
+        return self.parse_hypotheses(incident_title, response, evidence_ids)[:count or settings.HYPOTHESIS_COUNT]
+    
     async def generate_timeline_summary(
         self,
-        events: List[Dict[str, Any]]
+        events: List[Dict[str, Any]],
+        use_cache: bool = True
     ) -> str:
         """Generate a human-readable timeline summary."""
         events_text = "\n".join([
@@ -221,19 +613,19 @@ Hypothesis:"""
 
 Timeline Summary:"""
         
-        return await self.generate_text(prompt, max_tokens=512)
+        return await self.generate_text(prompt, max_tokens=512, use_cache=use_cache)
     
-    async def generate_postmortem(
+    def build_postmortem_prompt(
         self,
         incident_title: str,
         timeline: str,
         hypotheses: List[str],
         resolution: Optional[str] = None
-    ) -> Dict[str, Any]:
-        """Generate a postmortem draft."""
+    ) -> str:
+        """Build the postmortem prompt."""
         hypotheses_text = "\n".join([f"- {h}" for h in hypotheses])
         
-        prompt = f"""Write a postmortem for the following incident:
+        return f"""Write a postmortem for the following incident:
 
 Title: {incident_title}
 
@@ -254,9 +646,14 @@ Postmortem should include:
 6. Follow-up Actions
 
 Postmortem:"""
-        
-        content = await self.generate_text(prompt, max_tokens=1024)
-        
+    
+    def parse_postmortem(
+        self,
+        incident_title: str,
+        content: str,
+        resolution: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Turn a raw postmortem generation into postmortem fields."""
         return {
             "title": f"Postmortem: {incident_title}",
             "summary": content.split("\n\n")[0] if "\n\n" in content else content[:200],
@@ -266,4 +663,16 @@ Postmortem:"""
             "resolution": resolution or "Pending",
             "follow_ups": []
         }
-
+    
+    async def generate_postmortem(
+        self,
+        incident_title: str,
+        timeline: str,
+        hypotheses: List[str],
+        resolution: Optional[str] = None,
+        use_cache: bool = True
+    ) -> Dict[str, Any]:
+        """Generate a postmortem draft."""
+        prompt = self.build_postmortem_prompt(incident_title, timeline, hypotheses, resolution)
+        content = await self.generate_text(prompt, max_tokens=1024, use_cache=use_cache)
+        return self.parse_postmortem(incident_title, content, resolution)
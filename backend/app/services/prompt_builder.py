@@ -0,0 +1,199 @@
+"""Token-budgeted evidence packing for LLM prompts."""
+import asyncio
+from datetime import timezone
+from typing import Any, Dict, List, Optional
+import numpy as np
+from app.config import settings
+from app.db.models import Incident, EvidenceItem
+from app.services.ml_service import MLService
+from app.services.log_miner import render_log_digest
+
+
+# Rough prior on how useful each evidence type is for root-causing
+EVIDENCE_TYPE_WEIGHTS = {
+    "log": 1.0,
+    "trace": 0.9,
+    "metric": 0.9,
+    "screenshot": 0.8,
+    "pr": 0.7,
+}
+DEFAULT_TYPE_WEIGHT = 0.5
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English/log text)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, marking the cut."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + "\n[... truncated]"
+
+
+def render_evidence(evidence: EvidenceItem) -> str:
+    """Render one evidence item for a prompt, tagged with its ID.
+
+    Logs with a mined digest are rendered as templates with counts instead
+    of raw lines.
+    """
+    body = render_log_digest(evidence.log_digest) if evidence.log_digest else (evidence.content or "")
+    return f"[{evidence.id}] {evidence.evidence_type}: {evidence.title}\n{body}".rstrip()
+
+
+def _cosine(a, b) -> float:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(np.dot(a, b)) / denom if denom else 0.0
+
+
+def _timestamp(evidence: EvidenceItem) -> float:
+    created = evidence.created_at
+    if created is None:
+        return 0.0
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return created.timestamp()
+
+
+class EvidencePromptBuilder:
+    """Ranks evidence, packs it into a token budget and summarizes the rest.
+
+    Items are scored by recency, evidence type and embedding similarity to
+    the incident, then added whole (capped per item) until the budget is
+    used. Whatever doesn't fit is summarized in parallel chunks (map) and,
+    if needed, the chunk summaries are condensed once more (reduce), so
+    the final prompt stays bounded however much evidence accumulates.
+    """
+
+    def __init__(self, ml_service: Optional[MLService] = None):
+        self.ml_service = ml_service or MLService()
+        self.budget = settings.EVIDENCE_PROMPT_TOKEN_BUDGET
+        self.item_max_tokens = settings.EVIDENCE_ITEM_MAX_TOKENS
+        self.overflow_budget = int(self.budget * settings.EVIDENCE_OVERFLOW_BUDGET_RATIO)
+        self.chunk_tokens = settings.EVIDENCE_SUMMARY_CHUNK_TOKENS
+
+    async def rank(self, incident: Incident, evidence: List[EvidenceItem]) -> List[EvidenceItem]:
+        """Order evidence from most to least relevant to the incident."""
+        if not evidence:
+            return []
+
+        similarities = [0.0] * len(evidence)
+        if any(e.embedding is not None for e in evidence):
+            try:
+                query = f"{incident.title}\n{incident.description or ''}"
+                incident_embedding = (await self.ml_service.generate_embeddings([query]))[0]
+                similarities = [
+                    _cosine(e.embedding, incident_embedding) if e.embedding is not None else 0.0
+                    for e in evidence
+                ]
+            except Exception as e:
+                print(f"Evidence similarity ranking skipped: {e}")
+
+        timestamps = [_timestamp(e) for e in evidence]
+        oldest, newest = min(timestamps), max(timestamps)
+        span = (newest - oldest) or 1.0
+
+        def score(i: int) -> float:
+            recency = (timestamps[i] - oldest) / span
+            type_weight = EVIDENCE_TYPE_WEIGHTS.get(evidence[i].evidence_type, DEFAULT_TYPE_WEIGHT)
+            return (
+                settings.EVIDENCE_RANK_SIMILARITY_WEIGHT * similarities[i]
+                + settings.EVIDENCE_RANK_RECENCY_WEIGHT * recency
+                + settings.EVIDENCE_RANK_TYPE_WEIGHT * type_weight
+            )
+
+        order = sorted(range(len(evidence)), key=score, reverse=True)
+        return [evidence[i] for i in order]
+
+    async def build(self, incident: Incident, evidence: List[EvidenceItem]) -> Dict[str, Any]:
+        """Pack evidence into the prompt budget.
+
+        Returns a dict with the evidence ``text`` for the prompt, the
+        ``included`` items (in rank order) and the ``summarized`` overflow.
+        """
+        ranked = await self.rank(incident, evidence)
+
+        rendered = [truncate_to_tokens(render_evidence(e), self.item_max_tokens) for e in ranked]
+        costs = [estimate_tokens(block) for block in rendered]
+
+        included: List[EvidenceItem] = []
+        overflow: List[EvidenceItem] = []
+        blocks: List[str] = []
+        remaining = self.budget
+        if sum(costs) > self.budget:
+            # Keep room for the summary of whatever doesn't fit
+            remaining -= self.overflow_budget
+
+        for item, block, cost in zip(ranked, rendered, costs):
+            if cost <= remaining:
+                blocks.append(block)
+                included.append(item)
+                remaining -= cost
+            else:
+                overflow.append(item)
+
+        if overflow:
+            summary = await self.summarize_overflow(incident, overflow)
+            if summary:
+                blocks.append(f"Summary of {len(overflow)} additional evidence items:\n{summary}")
+
+        return {
+            "text": "\n\n".join(blocks),
+            "included": included,
+            "summarized": overflow
+        }
+
+    def _chunk(self, items: List[EvidenceItem]) -> List[str]:
+        chunks, current, size = [], [], 0
+        for item in items:
+            block = truncate_to_tokens(render_evidence(item), self.chunk_tokens)
+            cost = estimate_tokens(block)
+            if current and size + cost > self.chunk_tokens:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(block)
+            size += cost
+        if current:
+            chunks.append("\n\n".join(current))
+        return chunks
+
+    async def summarize_overflow(self, incident: Incident, items: List[EvidenceItem]) -> str:
+        """Map-reduce summarize evidence that didn't fit in the budget."""
+        # Overflow is in rank order; cap the map fan-out so latency stays bounded
+        chunks = self._chunk(items)[:settings.EVIDENCE_SUMMARY_MAX_CHUNKS]
+        semaphore = asyncio.Semaphore(settings.EVIDENCE_SUMMARY_CONCURRENCY)
+        per_chunk_tokens = max(64, self.overflow_budget // max(1, len(chunks)))
+
+        async def summarize(text: str, max_tokens: int) -> str:
+            prompt = f"""Incident: {incident.title}
+
+Summarize the following evidence for root-cause analysis. Keep error messages, service names, timestamps and evidence IDs in [brackets]. Be concise.
+
+{text}
+
+Summary:"""
+            async with semaphore:
+                return (await self.ml_service.generate_text(prompt, max_tokens=max_tokens, temperature=0.2)).strip()
+
+        try:
+            partials = await asyncio.gather(*[summarize(c, min(256, per_chunk_tokens)) for c in chunks])
+        except Exception as e:
+            print(f"Evidence overflow summarization failed: {e}")
+            return ""
+
+        combined = "\n\n".join(p for p in partials if p)
+        if estimate_tokens(combined) <= self.overflow_budget:
+            return combined
+
+        # Reduce step: condense the chunk summaries into one
+        try:
+            return await summarize(truncate_to_tokens(combined, self.chunk_tokens), self.overflow_budget)
+        except Exception as e:
+            print(f"Evidence summary reduce step failed: {e}")
+            return truncate_to_tokens(combined, self.overflow_budget)
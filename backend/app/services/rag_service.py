@@ -1,8 +1,134 @@
 """RAG service for semantic search over runbooks and postmortems."""
+import asyncio
+import hashlib
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.db.models import Runbook, Postmortem, EvidenceItem
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+from datetime import datetime
+from app.db.models import Runbook, RunbookChunk, Postmortem, EvidenceItem, Incident, TEXT_SEARCH_CONFIG
+from app.config import settings
+from app.db.vector_indexes import MAX_EF_SEARCH, apply_search_params, nearest
 from app.services.ml_service import MLService
+from app.services.embedding_backends import embedding_model_id
+from app.services.markdown_chunker import chunk_markdown
+from app.services.log_miner import render_log_digest
+from app.services.prompt_builder import CHARS_PER_TOKEN, DEFAULT_TYPE_WEIGHT, EVIDENCE_TYPE_WEIGHTS
+from app.services.runbook_index import runbook_index
+
+
+# ts_rank_cd normalization 32: rank / (rank + 1), bounded to [0, 1)
+TS_RANK_NORMALIZATION = 32
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: Optional[int] = None) -> List[Hashable]:
+    """Merge ranked lists by summing 1 / (k + rank) for each item.
+    
+    Rank-based, so lexical and vector scores need no calibration against
+    each other; items found by both retrievers rise to the top.
+    """
+    k = k if k is not None else settings.SEARCH_RRF_K
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def hybrid_depth(limit: int) -> int:
+    """Candidates to fetch from each retriever before fusing."""
+    return min(max(limit * settings.SEARCH_HYBRID_CANDIDATES_FACTOR, limit), MAX_EF_SEARCH)
+
+
+def fuse_results(
+    lexical: List[Any],
+    semantic: List[Any],
+    limit: int,
+    key: Callable[[Any], Hashable] = lambda row: row.id
+) -> List[Any]:
+    """Fuse two ranked result lists (ORM rows by default, matched by id).
+    
+    When both lists contain an item, the semantic entry is kept.
+    """
+    by_id = {key(item): item for item in lexical + semantic}
+    fused = reciprocal_rank_fusion([[key(item) for item in lexical], [key(item) for item in semantic]])
+    return [by_id[item_id] for item_id in fused[:limit]]
+
+
+def runbook_document(runbook: Runbook) -> str:
+    """Text embedded for a whole runbook."""
+    return f"{runbook.title}\n{runbook.description or ''}\n{runbook.content}"
+
+
+def chunk_document(runbook: Runbook, section: Dict[str, str]) -> str:
+    """Text embedded for one runbook section, prefixed with its context."""
+    heading = f"{section['heading']}\n" if section.get("heading") else ""
+    return f"{runbook.title}\n{heading}{section['content']}"
+
+
+def postmortem_document(postmortem: Postmortem) -> str:
+    """Text embedded for a postmortem."""
+    factors = postmortem.contributing_factors or []
+    parts = [
+        postmortem.title,
+        postmortem.summary,
+        f"Root cause: {postmortem.root_cause}" if postmortem.root_cause else None,
+        "Contributing factors: " + "; ".join(str(f) for f in factors) if factors else None,
+        f"Impact: {postmortem.impact}" if postmortem.impact else None,
+        f"Resolution: {postmortem.resolution}" if postmortem.resolution else None,
+    ]
+    return "\n".join(p for p in parts if p)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def runbook_content_hash(runbook: Runbook) -> str:
+    """Hash of everything a runbook's document and section embeddings derive from."""
+    chunking = (
+        f"{settings.RUNBOOK_CHUNK_MAX_TOKENS}:{settings.RUNBOOK_CHUNK_OVERLAP_TOKENS}:"
+        f"{settings.RUNBOOK_CHUNK_MIN_TOKENS}"
+    )
+    return content_hash(f"{chunking}\0{runbook_document(runbook)}")
+
+
+def is_indexed(row: Any, digest: str) -> bool:
+    """Whether the row's embedding was computed from this text by the current model."""
+    return (
+        row.embedding is not None
+        and row.content_hash == digest
+        and row.embedding_model == embedding_model_id()
+    )
+
+
+def stale_embeddings(model: Any, embedding_model: Optional[str] = None):
+    """Filter for rows with no embedding, or one from a different (or unknown) model."""
+    embedding_model = embedding_model or embedding_model_id()
+    return or_(model.embedding.is_(None), model.embedding_model.is_distinct_from(embedding_model))
+
+
+def incident_document(incident: Incident) -> str:
+    """Text embedded for an incident: title, description and top evidence.
+    
+    Evidence is taken by type weight, then recency, and each item is cut to
+    a short digest (mined log templates rather than raw lines), so the
+    vector reflects the failure signature without being drowned by logs.
+    """
+    evidence = sorted(
+        incident.evidence_items,
+        key=lambda e: (
+            EVIDENCE_TYPE_WEIGHTS.get(e.evidence_type, DEFAULT_TYPE_WEIGHT),
+            e.created_at.timestamp() if e.created_at else 0.0
+        ),
+        reverse=True
+    )[:settings.INCIDENT_EMBEDDING_EVIDENCE_ITEMS]
+    max_chars = settings.INCIDENT_EMBEDDING_EVIDENCE_TOKENS * CHARS_PER_TOKEN
+    
+    parts = [incident.title, incident.description]
+    for item in evidence:
+        body = render_log_digest(item.log_digest) if item.log_digest else (item.content or "")
+        parts.append(f"{item.evidence_type}: {item.title}\n{body}"[:max_chars].rstrip())
+    return "\n".join(p for p in parts if p)
 
 
 class RAGService:
@@ -12,34 +138,233 @@ class RAGService:
         self.db = db
         self.ml_service = MLService()
     
-    async def index_runbook(self, runbook_id: str):
-        """Generate and store embedding for a runbook."""
+    async def index_runbook(self, runbook_id: str, force: bool = False):
+        """Generate and store embeddings for a runbook and its sections."""
         runbook = self.db.query(Runbook).filter(Runbook.id == runbook_id).first()
         if not runbook:
             return
         
-        # Generate embedding
-        text_to_embed = f"{runbook.title}\n{runbook.description or ''}\n{runbook.content}"
-        embeddings = await self.ml_service.generate_embeddings([text_to_embed])
+        await self.index_runbooks_batch([runbook], force=force)
+    
+    async def index_runbooks_batch(self, runbooks: List[Runbook], force: bool = False) -> List[Runbook]:
+        """Chunk runbooks by section and embed every chunk in one call.
+        
+        Each runbook keeps a whole-document embedding alongside its chunks;
+        existing chunks are replaced. Runbooks whose text (and chunking
+        settings) and model are unchanged since they were last embedded are
+        skipped unless ``force``. Returns the runbooks that were re-indexed.
+        """
+        plans = []
+        texts = []
+        for runbook in runbooks:
+            digest = runbook_content_hash(runbook)
+            if not force and is_indexed(runbook, digest):
+                continue
+            sections = chunk_markdown(runbook.content or "")
+            plans.append((runbook, digest, sections))
+            texts.append(runbook_document(runbook))
+            texts.extend(chunk_document(runbook, section) for section in sections)
         
-        if embeddings and len(embeddings) > 0:
-            runbook.embedding = embeddings[0]
-            self.db.commit()
+        if not plans:
+            return []
+        
+        # One call; the batcher splits it into API-sized batches
+        embeddings = await self.ml_service.generate_embeddings(texts)
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        
+        vectors = iter(embeddings)
+        for runbook, digest, sections in plans:
+            runbook.embedding = next(vectors)
+            runbook.content_hash = digest
+            runbook.embedding_model = embedding_model_id()
+            runbook.chunks = [
+                RunbookChunk(
+                    chunk_index=i,
+                    heading=section["heading"] or None,
+                    content=section["content"],
+                    embedding=next(vectors)
+                )
+                for i, section in enumerate(sections)
+            ]
+        # Flush to assign the chunk ids before the commit expires the rows
+        self.db.flush()
+        entries = [
+            (
+                str(runbook.id),
+                runbook.service,
+                runbook.embedding,
+                [(str(chunk.id), chunk.embedding) for chunk in runbook.chunks]
+            )
+            for runbook, _, _ in plans
+        ]
+        self.db.commit()
+        
+        if settings.RUNBOOK_INDEX_ENABLED:
+            runbook_index.upsert_many(entries)
+        return [runbook for runbook, _, _ in plans]
     
     async def search_runbooks(
         self,
         query: str,
         service: Optional[str] = None,
-        limit: int = 10
+        limit: int = 10,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        mode: Optional[str] = None
     ) -> List[Runbook]:
-        """Search runbooks using semantic similarity."""
+        """Search runbooks.
+        
+        ``mode`` is "semantic" (vector similarity), "lexical" (full-text, no
+        embedding call) or "hybrid" (both, merged by reciprocal rank fusion);
+        defaults to SEARCH_DEFAULT_MODE. ``ef_search`` (HNSW) and ``probes``
+        (IVFFlat) trade latency for recall of the vector part.
+        """
+        matches = await self.search_runbook_sections(query, service, limit, ef_search, probes, mode)
+        return [runbook for runbook, _ in matches]
+    
+    async def search_runbook_sections(
+        self,
+        query: str,
+        service: Optional[str] = None,
+        limit: int = 10,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        mode: Optional[str] = None
+    ) -> List[Tuple[Runbook, Optional[RunbookChunk]]]:
+        """Like search_runbooks, paired with the best-matching section.
+        
+        The section is None for runbooks found only by full-text search or
+        not chunked yet.
+        """
+        mode = mode or settings.SEARCH_DEFAULT_MODE
+        if mode == "lexical":
+            lexical = await asyncio.to_thread(self._lexical_runbooks, query, service, limit)
+            return [(r, None) for r in lexical]
+        if mode == "semantic":
+            return await self._semantic_runbooks(query, service, limit, ef_search, probes)
+        
+        # Hybrid: fuse deeper candidate lists from both retrievers
+        depth = hybrid_depth(limit)
+        lexical = [(r, None) for r in await asyncio.to_thread(self._lexical_runbooks, query, service, depth)]
+        semantic = await self._semantic_runbooks(query, service, depth, ef_search, probes)
+        return fuse_results(lexical, semantic, limit, key=lambda match: match[0].id)
+    
+    async def _semantic_runbooks(
+        self,
+        query: str,
+        service: Optional[str],
+        limit: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ) -> List[Tuple[Runbook, Optional[RunbookChunk]]]:
+        """Runbooks ordered by embedding cosine similarity (best section first)."""
         # Generate query embedding
         embeddings = await self.ml_service.generate_embeddings([query])
         if not embeddings or len(embeddings) == 0:
             return []
         
-        query_embedding = embeddings[0]
+        # The session is synchronous; keep its queries off the event loop
+        return await asyncio.to_thread(self.runbooks_near_vector, embeddings[0], service, limit, ef_search, probes)
+    
+    def runbooks_near_vector(
+        self,
+        query_embedding: List[float],
+        service: Optional[str],
+        limit: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ) -> List[Tuple[Runbook, Optional[RunbookChunk]]]:
+        """Runbooks (with their best section) nearest to an already computed query vector."""
+        if settings.RUNBOOK_INDEX_ENABLED and runbook_index.is_current(self._embedded_vector_count):
+            indexed = self._indexed_runbooks(query_embedding, service, limit)
+            if indexed is not None:
+                return indexed
+        
+        matches: List[Tuple[Runbook, Optional[RunbookChunk]]] = []
+        if settings.RUNBOOK_CHUNK_SEARCH:
+            matches = self._semantic_runbook_chunks(query_embedding, service, limit, ef_search, probes)
+            if len(matches) >= limit:
+                return matches
+        
+        # Runbook-level vectors cover runbooks that haven't been chunked yet
+        seen = {runbook.id for runbook, _ in matches}
+        for runbook in self._semantic_runbook_documents(query_embedding, service, limit, ef_search, probes):
+            if runbook.id not in seen and len(matches) < limit:
+                matches.append((runbook, None))
+        return matches
+    
+    def _indexed_runbooks(
+        self,
+        query_embedding: List[float],
+        service: Optional[str],
+        limit: int
+    ) -> Optional[List[Tuple[Runbook, Optional[RunbookChunk]]]]:
+        """Like the pgvector path, served from the memory-mapped index: best
+        sections first, topped up by document vectors. None if the hits no
+        longer match the database (a runbook was deleted or re-chunked since
+        the index was read), so the caller falls back to pgvector."""
+        hits = []
+        if settings.RUNBOOK_CHUNK_SEARCH:
+            hits = runbook_index.search(query_embedding, limit=limit, service=service, sections=True)
+        if len(hits) < limit:
+            seen = {runbook_id for runbook_id, _, _ in hits}
+            for hit in runbook_index.search(query_embedding, limit=limit + len(seen), service=service, sections=False):
+                if hit[0] not in seen and len(hits) < limit:
+                    hits.append(hit)
+        if not hits:
+            return []
+        
+        runbooks = {str(r.id): r for r in self.db.query(Runbook).filter(Runbook.id.in_([h[0] for h in hits]))}
+        chunk_ids = [chunk_id for _, chunk_id, _ in hits if chunk_id]
+        chunks = {}
+        if chunk_ids:
+            chunks = {str(c.id): c for c in self.db.query(RunbookChunk).filter(RunbookChunk.id.in_(chunk_ids))}
+        if len(runbooks) < len(hits) or len(chunks) < len(chunk_ids):
+            return None
+        return [(runbooks[runbook_id], chunks[chunk_id] if chunk_id else None) for runbook_id, chunk_id, _ in hits]
+    
+    def _semantic_runbook_chunks(
+        self,
+        query_embedding: List[float],
+        service: Optional[str],
+        limit: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ) -> List[Tuple[Runbook, RunbookChunk]]:
+        """Nearest sections, aggregated to runbooks by their best section."""
+        # The ANN scan can't return more than MAX_EF_SEARCH rows anyway
+        depth = min(limit * settings.RUNBOOK_CHUNK_CANDIDATES_FACTOR, MAX_EF_SEARCH)
+        sql_query = self.db.query(RunbookChunk).join(Runbook).filter(
+            RunbookChunk.embedding.isnot(None)
+        )
+        
+        if service:
+            sql_query = sql_query.filter(Runbook.service == service)
+        
+        apply_search_params(self.db, ef_search=ef_search, probes=probes, limit=depth)
+        chunks = nearest(sql_query, RunbookChunk.id, RunbookChunk.embedding, query_embedding, depth).all()
         
+        matches = []
+        seen = set()
+        for chunk in chunks:
+            if chunk.runbook_id in seen:
+                continue
+            seen.add(chunk.runbook_id)
+            matches.append((chunk.runbook, chunk))
+            if len(matches) == limit:
+                break
+        return matches
+    
+    def _semantic_runbook_documents(
+        self,
+        query_embedding: List[float],
+        service: Optional[str],
+        limit: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ) -> List[Runbook]:
+        """Runbooks ordered by whole-document embedding similarity."""
         # Build query
         sql_query = self.db.query(Runbook).filter(
             Runbook.embedding.isnot(None)
@@ -48,23 +373,165 @@ class RAGService:
         if service:
             sql_query = sql_query.filter(Runbook.service == service)
         
-        # Use cosine similarity (pgvector)
-        sql_query = sql_query.order_by(
-            Runbook.embedding.cosine_distance(query_embedding)
-        ).limit(limit)
+        # Use cosine similarity (pgvector, served by the ANN index)
+        apply_search_params(self.db, ef_search=ef_search, probes=probes, limit=limit)
+        return nearest(sql_query, Runbook.id, Runbook.embedding, query_embedding, limit).all()
+    
+    def _embedded_vector_count(self) -> int:
+        """Embedded runbooks plus their embedded sections (the rows of the mmap index)."""
+        runbooks = self.db.query(func.count(Runbook.id)).filter(Runbook.embedding.isnot(None)).scalar()
+        sections = self.db.query(func.count(RunbookChunk.id)).join(Runbook).filter(
+            Runbook.embedding.isnot(None),
+            RunbookChunk.embedding.isnot(None)
+        ).scalar()
+        return runbooks + sections
+    
+    def _lexical_runbooks(self, query: str, service: Optional[str], limit: int) -> List[Runbook]:
+        """Runbooks ordered by full-text rank (exact tokens like error codes match here)."""
+        ts_query = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, query)
+        sql_query = self.db.query(Runbook).filter(Runbook.search_vector.op("@@")(ts_query))
+        
+        if service:
+            sql_query = sql_query.filter(Runbook.service == service)
+        
+        return sql_query.order_by(
+            func.ts_rank_cd(Runbook.search_vector, ts_query, TS_RANK_NORMALIZATION).desc()
+        ).limit(limit).all()
+    
+    async def index_postmortem(self, postmortem: Postmortem, force: bool = False):
+        """Generate and store embedding for a postmortem."""
+        await self.index_postmortems_batch([postmortem], force=force)
+    
+    async def index_postmortems_batch(self, postmortems: List[Postmortem], force: bool = False):
+        """Generate and store embeddings for many postmortems at once (unchanged ones are skipped)."""
+        documents = [postmortem_document(p) for p in postmortems]
+        items = [
+            (p, d) for p, d in zip(postmortems, documents)
+            if d and (force or not is_indexed(p, content_hash(d)))
+        ]
+        if not items:
+            return
+        
+        embeddings = await self.ml_service.generate_embeddings([d for _, d in items])
+        if len(embeddings) != len(items):
+            raise ValueError(f"Expected {len(items)} embeddings, got {len(embeddings)}")
         
-        return sql_query.all()
+        for (postmortem, document), embedding in zip(items, embeddings):
+            postmortem.embedding = embedding
+            postmortem.content_hash = content_hash(document)
+            postmortem.embedding_model = embedding_model_id()
+        await asyncio.to_thread(self.db.commit)
+    
+    async def backfill_postmortem_embeddings(self, batch_size: int = 64) -> int:
+        """Embed every postmortem that has no embedding yet; returns the count."""
+        indexed = 0
+        last_id = None
+        while True:
+            # Keyset pagination, so rows that can't be embedded aren't revisited
+            query = self.db.query(Postmortem).filter(Postmortem.embedding.is_(None))
+            if last_id is not None:
+                query = query.filter(Postmortem.id > last_id)
+            batch = query.order_by(Postmortem.id).limit(batch_size).all()
+            if not batch:
+                return indexed
+            
+            last_id = batch[-1].id
+            await self.index_postmortems_batch(batch)
+            indexed += sum(1 for p in batch if p.embedding is not None)
+    
+    def _filter_postmortems(
+        self,
+        sql_query,
+        severity: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None
+    ):
+        if severity:
+            sql_query = sql_query.join(Incident, Postmortem.incident_id == Incident.id).filter(
+                Incident.severity == severity
+            )
+        if created_after:
+            sql_query = sql_query.filter(Postmortem.created_at >= created_after)
+        if created_before:
+            sql_query = sql_query.filter(Postmortem.created_at < created_before)
+        return sql_query
     
     async def search_postmortems(
         self,
         query: str,
-        limit: int = 10
+        limit: int = 10,
+        mode: Optional[str] = None,
+        severity: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ) -> List[Postmortem]:
+        """Search postmortems.
+        
+        Modes match search_runbooks. Results can be filtered by the incident's
+        severity and by creation time.
+        """
+        mode = mode or settings.SEARCH_DEFAULT_MODE
+        filters = dict(severity=severity, created_after=created_after, created_before=created_before)
+        if mode == "lexical":
+            return await asyncio.to_thread(self._lexical_postmortems, query, limit, **filters)
+        if mode == "semantic":
+            return await self._semantic_postmortems(query, limit, ef_search, probes, **filters)
+        
+        depth = hybrid_depth(limit)
+        lexical = await asyncio.to_thread(self._lexical_postmortems, query, depth, **filters)
+        semantic = await self._semantic_postmortems(query, depth, ef_search, probes, **filters)
+        return fuse_results(lexical, semantic, limit)
+    
+    async def _semantic_postmortems(
+        self,
+        query: str,
+        limit: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        **filters
+    ) -> List[Postmortem]:
+        """Postmortems ordered by embedding cosine similarity."""
+        embeddings = await self.ml_service.generate_embeddings([query])
+        if not embeddings:
+            return []
+        
+        return await asyncio.to_thread(self._postmortems_near_vector, embeddings[0], limit, ef_search, probes, **filters)
+    
+    def _postmortems_near_vector(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        **filters
     ) -> List[Postmortem]:
-        """Search postmortems using semantic similarity."""
-        # For postmortems, we'd need to add embedding column
-        # For now, return text-based search
-        return self.db.query(Postmortem).filter(
-            Postmortem.title.ilike(f"%{query}%")
+        sql_query = self._filter_postmortems(
+            self.db.query(Postmortem).filter(Postmortem.embedding.isnot(None)),
+            **filters
+        )
+        
+        # Filters are applied to the ANN scan's candidates; raise ef_search/probes if results run short
+        apply_search_params(self.db, ef_search=ef_search, probes=probes, limit=limit)
+        return nearest(sql_query, Postmortem.id, Postmortem.embedding, query_embedding, limit).all()
+    
+    def _lexical_postmortems(self, query: str, limit: int, **filters) -> List[Postmortem]:
+        """Postmortems ordered by full-text rank over title, summary, root cause, impact and resolution."""
+        ts_query = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, query)
+        postmortems = self._filter_postmortems(
+            self.db.query(Postmortem).filter(Postmortem.search_vector.op("@@")(ts_query)),
+            **filters
+        ).order_by(
+            func.ts_rank_cd(Postmortem.search_vector, ts_query, TS_RANK_NORMALIZATION).desc()
+        ).limit(limit).all()
+        if postmortems:
+            return postmortems
+        
+        # Queries made only of stop words/punctuation produce an empty tsquery
+        return self._filter_postmortems(
+            self.db.query(Postmortem).filter(Postmortem.title.ilike(f"%{query}%")),
+            **filters
         ).limit(limit).all()
     
     async def get_relevant_runbooks_for_incident(
@@ -76,15 +543,30 @@ class RAGService:
         """Get relevant runbooks for an incident."""
         return await self.search_runbooks(incident_description, service=service, limit=limit)
     
-    async def index_evidence(self, evidence: EvidenceItem):
+    async def index_evidence(self, evidence: EvidenceItem, force: bool = False):
         """Generate and store embedding for an evidence item."""
-        if not evidence.content:
+        await self.index_evidence_batch([evidence], force=force)
+    
+    async def index_evidence_batch(self, evidence_items: List[EvidenceItem], force: bool = False):
+        """Generate and store embeddings for many evidence items at once.
+        
+        Items whose content and model are unchanged since they were last
+        embedded are skipped unless ``force``.
+        """
+        items = [
+            e for e in evidence_items
+            if e.content and (force or not is_indexed(e, content_hash(e.content)))
+        ]
+        if not items:
             return
         
-        # Generate embedding
-        embeddings = await self.ml_service.generate_embeddings([evidence.content])
+        # One call; the batcher splits it into API-sized batches
+        embeddings = await self.ml_service.generate_embeddings([e.content for e in items])
+        if len(embeddings) != len(items):
+            raise ValueError(f"Expected {len(items)} embeddings, got {len(embeddings)}")
         
-        if embeddings and len(embeddings) > 0:
-            evidence.embedding = embeddings[0]
-            self.db.commit()
-
+        for evidence, embedding in zip(items, embeddings):
+            evidence.embedding = embedding
+            evidence.content_hash = content_hash(evidence.content)
+            evidence.embedding_model = embedding_model_id()
+        self.db.commit()
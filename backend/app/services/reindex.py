@@ -0,0 +1,427 @@
+"""Resumable bulk (re-)embedding of runbooks, chunks, evidence and postmortems.
+
+Rows are read in keyset order (by id) a page at a time through a server-side
+cursor, embedded in batches with bounded concurrency, and written back with
+batched UPDATEs. The write and the job's checkpoint commit together, so an
+interrupted job resumes exactly where it stopped.
+
+To switch embedding models without a window of mixed vectors, embed into a
+shadow column and swap it in once complete:
+
+    python -m app.services.reindex start evidence_items                       # fill missing or stale embeddings
+    python -m app.services.reindex start runbooks --model BAAI/bge-large-en-v1.5 --shadow --swap
+    python -m app.services.reindex resume <job_id>
+    python -m app.services.reindex status
+    python -m app.services.reindex stale                                      # rows not embedded by EMBEDDING_MODEL
+    python -m app.services.reindex drop-previous runbooks                     # drop the rollback column after a swap
+
+Set EMBEDDING_MODEL to the new model when the swap happens, so queries and
+newly indexed rows use it too.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.dialects.postgresql import UUID as PGUUID
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db.models import EvidenceItem, Postmortem, ReindexJob, Runbook, RunbookChunk
+from app.db.vector_indexes import autocommit_connection, create_vector_index, index_name
+from app.db.vector_types import embedding_sql_type, embedding_type
+from app.services.embedding_backends import embedding_model_id
+from app.services.ml_service import MLService
+from app.services.rag_service import (
+    chunk_document,
+    content_hash,
+    postmortem_document,
+    runbook_content_hash,
+    runbook_document,
+    stale_embeddings
+)
+
+
+SHADOW_SUFFIX = "_next"
+PREVIOUS_SUFFIX = "_prev"
+
+
+class ReindexTarget:
+    """A table with an embedding column and how to build each row's text.
+
+    ``tracked`` tables record each row's content hash (``digest``, by
+    default a hash of the document) and embedding model when the job writes
+    their live ``embedding`` column, or when a shadow column is swapped in.
+    A runbook's hash also covers its sections, which are the separate
+    ``runbook_chunks`` target: re-embed both with the same model.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        statement: Callable[[], Any],
+        document: Callable[[Any], Optional[str]],
+        tracked: bool = False,
+        digest: Optional[Callable[[Any, str], str]] = None
+    ):
+        self.model = model
+        self.table = model.__tablename__
+        self.statement = statement
+        self.document = document
+        self.tracked = tracked
+        self.digest = digest or (lambda row, document: content_hash(document))
+
+
+REINDEX_TARGETS: Dict[str, ReindexTarget] = {
+    "runbooks": ReindexTarget(
+        Runbook,
+        lambda: select(Runbook.id, Runbook.title, Runbook.description, Runbook.content),
+        runbook_document,
+        tracked=True,
+        digest=lambda row, document: runbook_content_hash(row)
+    ),
+    "runbook_chunks": ReindexTarget(
+        RunbookChunk,
+        lambda: select(RunbookChunk.id, RunbookChunk.heading, RunbookChunk.content, Runbook.title).join(Runbook),
+        lambda row: chunk_document(row, {"heading": row.heading, "content": row.content})
+    ),
+    "evidence_items": ReindexTarget(
+        EvidenceItem,
+        lambda: select(EvidenceItem.id, EvidenceItem.content),
+        lambda row: row.content,
+        tracked=True
+    ),
+    "postmortems": ReindexTarget(
+        Postmortem,
+        lambda: select(
+            Postmortem.id, Postmortem.title, Postmortem.summary, Postmortem.root_cause,
+            Postmortem.contributing_factors, Postmortem.impact, Postmortem.resolution
+        ),
+        postmortem_document,
+        tracked=True
+    ),
+}
+
+
+def shadow_column(column: str = "embedding") -> str:
+    return f"{column}{SHADOW_SUFFIX}"
+
+
+class EmbeddingReindexer:
+    """Runs (or resumes) one ReindexJob."""
+
+    def __init__(self, db: Session, job: ReindexJob):
+        self.db = db
+        self.job = job
+        self.target = REINDEX_TARGETS[job.target]
+        self.ml_service = MLService()
+        self.batch_size = settings.REINDEX_BATCH_SIZE
+        self.concurrency = settings.REINDEX_CONCURRENCY
+        self.tracked = self.target.tracked and job.column_name == "embedding"
+        assignments = f"{job.column_name} = :vector"
+        if self.tracked:
+            assignments += ", content_hash = :content_hash, embedding_model = :model"
+        self.update = text(
+            f"UPDATE {self.target.table} SET {assignments} WHERE id = :row_id"
+        ).bindparams(
+            bindparam("vector", type_=embedding_type()),
+            bindparam("row_id", type_=PGUUID(as_uuid=True))
+        )
+
+    def _page(self) -> List[Any]:
+        """Next page of rows after the checkpoint, read through a server-side cursor."""
+        model = self.target.model
+        statement = self.target.statement()
+        if self.job.only_missing and self.tracked:
+            # Missing, or embedded by another model than this job's
+            statement = statement.where(stale_embeddings(model, self.job.model))
+        elif self.job.only_missing:
+            # The column may be an unmapped shadow column
+            statement = statement.where(text(f"{self.target.table}.{self.job.column_name} IS NULL"))
+        if self.job.last_id is not None:
+            statement = statement.where(model.id > self.job.last_id)
+        statement = statement.order_by(model.id).limit(self.batch_size * self.concurrency)
+
+        result = self.db.execute(statement.execution_options(yield_per=self.batch_size))
+        return list(result)
+
+    async def _embed_page(self, rows: List[Any]) -> List[Dict[str, Any]]:
+        documents = [(row, self.target.document(row)) for row in rows]
+        documents = [(row, doc) for row, doc in documents if doc]
+        batches = [documents[i:i + self.batch_size] for i in range(0, len(documents), self.batch_size)]
+
+        # Bypass the embedding cache: a bulk pass would only evict hot entries
+        results = await asyncio.gather(*(
+            self.ml_service.generate_embeddings([doc for _, doc in batch], model=self.job.model, use_cache=False)
+            for batch in batches
+        ))
+        updates = []
+        for batch, vectors in zip(batches, results):
+            if len(vectors) != len(batch):
+                raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+            for (row, doc), vector in zip(batch, vectors):
+                update = {"row_id": row.id, "vector": vector}
+                if self.tracked:
+                    update.update(content_hash=self.target.digest(row, doc), model=self.job.model)
+                updates.append(update)
+        return updates
+
+    async def run(self) -> ReindexJob:
+        job = self.job
+        job.status = "running"
+        job.error = None
+        self.db.commit()
+
+        started = time.monotonic()
+        processed_this_run = 0
+        try:
+            while True:
+                rows = self._page()
+                if not rows:
+                    if self._needs_catch_up():
+                        # Rows added behind the cursor during the main pass
+                        job.catch_up = True
+                        job.last_id = None
+                        self.db.commit()
+                        continue
+                    break
+
+                updates = await self._embed_page(rows)
+                if updates:
+                    self.db.execute(self.update, updates)
+                job.last_id = rows[-1].id
+                job.processed = (job.processed or 0) + len(updates)
+                job.skipped = (job.skipped or 0) + len(rows) - len(updates)
+                processed_this_run += len(updates)
+                job.rows_per_second = processed_this_run / max(time.monotonic() - started, 1e-6)
+                # Writes and checkpoint commit together
+                self.db.commit()
+                print(f"Reindex {job.target}.{job.column_name}: {job.processed} rows, {job.rows_per_second:.1f} rows/s")
+
+            job.status = "completed"
+            job.finished_at = datetime.now(timezone.utc)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+            self.db.commit()
+            raise
+
+        if job.swap_on_complete and job.column_name != "embedding":
+            swap_shadow_column(self.db, job)
+        return job
+
+    def _needs_catch_up(self) -> bool:
+        # Rows inserted below the cursor get indexed into `embedding` by the
+        # normal path, but a shadow column only gets them from a second pass
+        return self.job.column_name != "embedding" and not self.job.catch_up
+
+
+def create_reindex_job(
+    db: Session,
+    target: str,
+    model: Optional[str] = None,
+    shadow: bool = False,
+    only_missing: Optional[bool] = None,
+    swap: bool = False
+) -> ReindexJob:
+    """Create a job; ``shadow`` embeds into a new column for a later swap."""
+    if target not in REINDEX_TARGETS:
+        raise ValueError(f"Unknown reindex target {target!r}; choose one of {sorted(REINDEX_TARGETS)}")
+    if swap and not shadow:
+        raise ValueError("swap requires a shadow column")
+
+    column = "embedding"
+    if shadow:
+        column = shadow_column()
+        db.execute(text(
+            f"ALTER TABLE {target} ADD COLUMN IF NOT EXISTS {column} {embedding_sql_type()}"
+        ))
+        # Every row starts NULL in the shadow column; the filter also drives the catch-up pass
+        only_missing = True
+    elif only_missing is None:
+        only_missing = True
+
+    job = ReindexJob(
+        target=target,
+        column_name=column,
+        model=embedding_model_id(model),
+        only_missing=only_missing,
+        swap_on_complete=swap
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def swap_shadow_column(db: Session, job: ReindexJob):
+    """Atomically rename the shadow column into place and index it.
+
+    The previous vectors are kept as ``embedding_prev`` for rollback until
+    the next swap (or ``drop_previous_column``). Their ANN index is dropped,
+    so vector index memory doesn't double; a rollback has to rebuild it.
+    """
+    table = job.target
+    previous = f"embedding{PREVIOUS_SUFFIX}"
+    for quantized in (False, True):
+        ann = index_name(table, "embedding", quantized)
+        # Also clears _prev indexes kept by swaps before they were dropped
+        db.execute(text(f"DROP INDEX IF EXISTS {ann}{PREVIOUS_SUFFIX}"))
+        db.execute(text(f"DROP INDEX IF EXISTS {ann}"))
+    db.execute(text(f"ALTER TABLE {table} DROP COLUMN IF EXISTS {previous}"))
+    db.execute(text(f"ALTER TABLE {table} RENAME COLUMN embedding TO {previous}"))
+    db.execute(text(f"ALTER TABLE {table} RENAME COLUMN {job.column_name} TO embedding"))
+    if REINDEX_TARGETS[table].tracked:
+        db.execute(
+            text(f"UPDATE {table} SET embedding_model = :model WHERE embedding IS NOT NULL"),
+            {"model": job.model}
+        )
+    job.status = "swapped"
+    db.commit()
+    print(f"Swapped {table}.{job.column_name} into {table}.embedding")
+
+    if settings.VECTOR_INDEX_METHOD != "none":
+        with autocommit_connection() as conn:
+            create_vector_index(conn, table, "embedding", settings.VECTOR_INDEX_METHOD, concurrently=True)
+
+    if table in ("runbooks", "runbook_chunks") and settings.RUNBOOK_INDEX_ENABLED:
+        from app.services.runbook_index import build_runbook_index_from_db
+        build_runbook_index_from_db(db)
+
+
+def drop_previous_column(db: Session, target: str) -> bool:
+    """Drop the ``embedding_prev`` column kept for rollback by the last swap."""
+    if target not in REINDEX_TARGETS:
+        raise ValueError(f"Unknown reindex target {target!r}")
+    previous = f"embedding{PREVIOUS_SUFFIX}"
+    exists = db.execute(
+        text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = :table AND column_name = :column"
+        ),
+        {"table": target, "column": previous}
+    ).first() is not None
+    if exists:
+        db.execute(text(f"ALTER TABLE {target} DROP COLUMN {previous}"))
+        db.commit()
+    return exists
+
+
+async def run_reindex_job(db: Session, job_id: UUID) -> ReindexJob:
+    job = db.query(ReindexJob).filter(ReindexJob.id == job_id).first()
+    if not job:
+        raise ValueError(f"Reindex job {job_id} not found")
+    if job.status in ("completed", "swapped"):
+        return job
+    return await EmbeddingReindexer(db, job).run()
+
+
+def stale_summary(db: Session, model: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Per table: rows without an embedding, rows embedded by another (or an
+    unrecorded) model, and embedded row counts by model. One aggregate query
+    per table."""
+    model = embedding_model_id(model)
+    summary = {}
+    for name, target in REINDEX_TARGETS.items():
+        if not hasattr(target.model, "embedding_model"):
+            continue
+        rows = db.query(
+            target.model.embedding_model,
+            func.count(),
+            func.count(target.model.embedding)
+        ).group_by(target.model.embedding_model).all()
+        summary[name] = {
+            "missing": sum(total - embedded for _, total, embedded in rows),
+            "stale": sum(embedded for row_model, _, embedded in rows if row_model != model),
+            "by_model": {row_model or "unknown": embedded for row_model, _, embedded in rows if embedded}
+        }
+    return summary
+
+
+def stale_rows(db: Session, target: str, model: Optional[str] = None, limit: int = 100) -> List[UUID]:
+    """Ids of rows in ``target`` that need (re-)embedding for ``model``."""
+    if target not in REINDEX_TARGETS or not hasattr(REINDEX_TARGETS[target].model, "embedding_model"):
+        raise ValueError(f"{target!r} does not record embedding models")
+    table_model = REINDEX_TARGETS[target].model
+    rows = db.query(table_model.id).filter(
+        stale_embeddings(table_model, embedding_model_id(model))
+    ).order_by(table_model.id).limit(limit)
+    return [row.id for row in rows]
+
+
+def job_status(job: ReindexJob) -> Dict[str, Any]:
+    return {
+        "id": str(job.id),
+        "target": job.target,
+        "column": job.column_name,
+        "model": job.model,
+        "status": job.status,
+        "processed": job.processed,
+        "skipped": job.skipped,
+        "rows_per_second": job.rows_per_second,
+        "catch_up": job.catch_up,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+async def _run_and_close(coroutine):
+    """Run a job on the CLI's one-off loop and close the inference client before it ends."""
+    from app.services.http_client import close_inference_client
+    try:
+        return await coroutine
+    finally:
+        await close_inference_client()
+
+
+def main():
+    from app.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk (re-)embed rows")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    start = subparsers.add_parser("start", help="Start a new job")
+    start.add_argument("target", choices=sorted(REINDEX_TARGETS))
+    start.add_argument("--model", default=None, help="Embedding model (default: EMBEDDING_MODEL)")
+    start.add_argument("--shadow", action="store_true", help="Write to a shadow column")
+    start.add_argument("--swap", action="store_true", help="Swap the shadow column in when done")
+    start.add_argument("--all", action="store_true", help="Re-embed rows that already have an embedding")
+    resume = subparsers.add_parser("resume", help="Resume an interrupted job")
+    resume.add_argument("job_id", type=UUID)
+    subparsers.add_parser("status", help="List recent jobs")
+    stale = subparsers.add_parser("stale", help="Count rows missing or stale for EMBEDDING_MODEL")
+    stale.add_argument("--model", default=None, help="Embedding model (default: EMBEDDING_MODEL)")
+    drop_previous = subparsers.add_parser("drop-previous", help="Drop the column kept for rollback by the last swap")
+    drop_previous.add_argument("target", choices=sorted(REINDEX_TARGETS))
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "start":
+            job = create_reindex_job(
+                db, args.target, model=args.model, shadow=args.shadow,
+                only_missing=False if args.all else None, swap=args.swap
+            )
+            print(f"Started job {job.id}")
+            job = asyncio.run(_run_and_close(EmbeddingReindexer(db, job).run()))
+            print(job_status(job))
+        elif args.command == "resume":
+            print(job_status(asyncio.run(_run_and_close(run_reindex_job(db, args.job_id)))))
+        elif args.command == "stale":
+            for target, counts in stale_summary(db, args.model).items():
+                print(target, counts)
+        elif args.command == "drop-previous":
+            dropped = drop_previous_column(db, args.target)
+            print(f"Dropped {args.target}.embedding{PREVIOUS_SUFFIX}" if dropped else "Nothing to drop")
+        else:
+            for job in db.query(ReindexJob).order_by(ReindexJob.created_at.desc()).limit(20):
+                print(job_status(job))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
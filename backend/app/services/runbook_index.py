@@ -0,0 +1,442 @@
+"""In-process, memory-mapped vector index for runbook search.
+
+Runbook section (chunk) embeddings and whole-document embeddings are exported
+to one normalized matrix (``vectors.npy``) plus a JSON sidecar recording each
+row's runbook, section and service (``meta.json``). Every API and worker
+process maps the same file read-only, so the OS page cache holds one copy and
+a top-k search is a single vectorized dot product with no DB round trip.
+
+Re-indexing a runbook overwrites its rows in the mapped file and appends only
+the sections that don't fit, then replaces the sidecar; readers notice the new
+sidecar on their next search and remap. Rows left over when a runbook loses
+sections are blanked until the next build. The sidecar records the embedding
+model, and searches fall back to pgvector while the index is from another
+model or its row count differs from the embedded rows in the database. Build
+(or compact) from the database with:
+
+    python -m app.services.runbook_index build
+"""
+import fcntl
+import io
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from numpy.lib import format as npy_format
+from app.config import settings
+from app.services.embedding_backends import embedding_model_id
+
+
+VECTORS_FILE = "vectors.npy"
+META_FILE = "meta.json"
+LOCK_FILE = ".lock"
+SCORE_BLOCK_ROWS = 65536
+
+# (runbook_id, service, document embedding, [(chunk_id, chunk embedding), ...])
+IndexEntry = Tuple[str, Optional[str], Sequence[float], List[Tuple[str, Sequence[float]]]]
+
+
+def index_dir() -> str:
+    return settings.RUNBOOK_INDEX_DIR or os.path.join(settings.ARTIFACTS_DIR, "runbook_index")
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _rows(entries: List[IndexEntry]):
+    """Flatten entries into parallel runbook, section, service and vector lists
+    (the document row first, then one row per section)."""
+    runbooks, sections, services, vectors = [], [], [], []
+    for runbook_id, service, embedding, chunks in entries:
+        for section_id, vector in [(None, embedding)] + list(chunks):
+            runbooks.append(str(runbook_id))
+            sections.append(str(section_id) if section_id is not None else None)
+            services.append(service)
+            vectors.append(vector)
+    return runbooks, sections, services, vectors
+
+
+class RunbookVectorIndex:
+    """Brute-force cosine top-k over a shared memory-mapped matrix."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or index_dir()
+        self.dtype = np.float16 if settings.RUNBOOK_INDEX_DTYPE == "float16" else np.float32
+        self.vectors: Optional[np.ndarray] = None
+        self.runbooks: List[Optional[str]] = []
+        self.sections: List[Optional[str]] = []
+        self.runbook_codes: Optional[np.ndarray] = None
+        self.section_rows: Optional[np.ndarray] = None
+        self.service_codes: Optional[np.ndarray] = None
+        self.service_lookup: Dict[Optional[str], int] = {}
+        self.live_rows = 0
+        self.model: Optional[str] = None
+        self.version: Optional[Tuple[int, int]] = None
+        self.last_check = 0.0
+        self.database_rows: Optional[int] = None
+        self.last_count = 0.0
+        self.searches = 0
+        self.reloads = 0
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.directory, META_FILE)
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.directory, VECTORS_FILE)
+
+    def _current_version(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.meta_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load(self):
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        vectors = np.load(self.vectors_path, mmap_mode="r")
+        runbooks = meta["runbooks"]
+        if len(runbooks) > vectors.shape[0]:
+            # A writer is mid-update; keep the previous mapping and retry later
+            return
+        # Rows past the sidecar are being appended by a writer
+        vectors = vectors[:len(runbooks)]
+        runbook_lookup: Dict[str, int] = {}
+        service_lookup: Dict[Optional[str], int] = {}
+        runbook_codes = np.array(
+            [runbook_lookup.setdefault(r, len(runbook_lookup)) if r is not None else -1 for r in runbooks],
+            dtype=np.int32
+        )
+        service_codes = np.array([service_lookup.setdefault(s, len(service_lookup)) for s in meta["services"]], dtype=np.int32)
+
+        self.vectors = vectors
+        self.runbooks = runbooks
+        self.sections = meta["sections"]
+        self.runbook_codes = runbook_codes
+        self.section_rows = np.array([s is not None for s in self.sections], dtype=bool)
+        self.service_codes = service_codes
+        self.service_lookup = service_lookup
+        self.live_rows = int((runbook_codes >= 0).sum())
+        self.model = meta.get("model")
+        self.reloads += 1
+
+    def refresh(self, force: bool = False) -> bool:
+        """Remap if the files changed; returns whether the index is usable."""
+        now = time.monotonic()
+        if force or now - self.last_check >= settings.RUNBOOK_INDEX_CHECK_INTERVAL:
+            self.last_check = now
+            version = self._current_version()
+            if version is None:
+                self.vectors, self.version = None, None
+            elif version != self.version:
+                try:
+                    self._load()
+                    self.version = version
+                except (OSError, ValueError, KeyError) as e:
+                    # KeyError: a sidecar from an older layout; rebuild the index
+                    print(f"Runbook index load failed: {e}")
+        return self.vectors is not None and self.live_rows > 0
+
+    def is_current(self, count_rows: Callable[[], int]) -> bool:
+        """Whether the index is usable, built with the current embedding model
+        and holds as many vectors as ``count_rows()`` finds embedded in the
+        database (runbooks plus sections, counted at most every
+        RUNBOOK_INDEX_CHECK_INTERVAL)."""
+        if not self.refresh() or self.model != embedding_model_id():
+            return False
+        now = time.monotonic()
+        if self.database_rows is None or now - self.last_count >= settings.RUNBOOK_INDEX_CHECK_INTERVAL:
+            self.database_rows = count_rows()
+            self.last_count = now
+        return self.live_rows == self.database_rows
+
+    def search(
+        self,
+        query: Sequence[float],
+        limit: int = 10,
+        service: Optional[str] = None,
+        sections: bool = True
+    ) -> List[Tuple[str, Optional[str], float]]:
+        """Return (runbook_id, chunk_id, cosine similarity) for the top ``limit``
+        runbooks, each by its best section (``sections``) or by its
+        whole-document vector (chunk_id None)."""
+        if not self.refresh():
+            return []
+        self.searches += 1
+
+        q = _normalize(np.asarray(query, dtype=np.float32))
+        if self.vectors.dtype == np.float32:
+            scores = self.vectors @ q
+        else:
+            # No BLAS for float16; upcast block by block to bound memory
+            scores = np.concatenate([
+                self.vectors[start:start + SCORE_BLOCK_ROWS].astype(np.float32) @ q
+                for start in range(0, self.vectors.shape[0], SCORE_BLOCK_ROWS)
+            ])
+
+        mask = (self.runbook_codes >= 0) & (self.section_rows == sections)
+        if service is not None:
+            code = self.service_lookup.get(service)
+            if code is None:
+                return []
+            mask &= self.service_codes == code
+        scores[~mask] = -np.inf
+        return self._best_per_runbook(scores, limit)
+
+    def _best_per_runbook(self, scores: np.ndarray, limit: int) -> List[Tuple[str, Optional[str], float]]:
+        candidates = int(np.isfinite(scores).sum())
+        k = min(limit * settings.RUNBOOK_CHUNK_CANDIDATES_FACTOR, candidates)
+        while k > 0:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            hits, seen = [], set()
+            for i in top:
+                if self.runbook_codes[i] in seen:
+                    continue
+                seen.add(self.runbook_codes[i])
+                hits.append((self.runbooks[i], self.sections[i], float(scores[i])))
+                if len(hits) == limit:
+                    return hits
+            if k == candidates:
+                return hits
+            # A few runbooks filled the candidates with their sections; rank every row
+            k = candidates
+        return []
+
+    def _write(self, runbooks: List[Optional[str]], sections: List[Optional[str]], services: List[Optional[str]], vectors: np.ndarray, model: Optional[str]):
+        """Atomically replace the index files."""
+        os.makedirs(self.directory, exist_ok=True)
+        vectors_tmp = f"{self.vectors_path}.{os.getpid()}.tmp"
+        with open(vectors_tmp, "wb") as f:
+            np.save(f, vectors.astype(self.dtype))
+        # Vectors first: readers key on meta.json and check the row counts agree
+        os.replace(vectors_tmp, self.vectors_path)
+        self._write_meta(runbooks, sections, services, model)
+
+    def _write_meta(self, runbooks: List[Optional[str]], sections: List[Optional[str]], services: List[Optional[str]], model: Optional[str]):
+        meta_tmp = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(meta_tmp, "w") as f:
+            json.dump({
+                "runbooks": runbooks,
+                "sections": sections,
+                "services": services,
+                "dtype": np.dtype(self.dtype).name,
+                "model": model
+            }, f)
+        os.replace(meta_tmp, self.meta_path)
+
+    def _locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        lock = open(os.path.join(self.directory, LOCK_FILE), "w")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def build(self, entries: List[IndexEntry]):
+        """Replace the whole index (dropping blanked rows) with the given runbooks."""
+        lock = self._locked()
+        try:
+            runbooks, sections, services, vectors = _rows(entries)
+            if vectors:
+                matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+            else:
+                matrix = np.zeros((0, 0), dtype=np.float32)
+            self._write(runbooks, sections, services, matrix, embedding_model_id())
+        finally:
+            lock.close()
+        self.refresh(force=True)
+
+    def upsert(self, entry: IndexEntry):
+        """Add or replace one runbook's vectors."""
+        self.upsert_many([entry])
+
+    def upsert_many(self, entries: List[IndexEntry]):
+        """Add or replace runbooks' document and section vectors (used when
+        runbooks are re-indexed).
+
+        Each runbook's existing rows are overwritten in place; only sections
+        beyond them are appended to the file, and leftover rows are blanked.
+        """
+        entries = list({str(e[0]): e for e in entries}.values())
+        if not entries:
+            return
+        lock = self._locked()
+        try:
+            runbooks, sections, services, vectors = _rows(entries)
+            new_vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+            model = embedding_model_id()
+            if os.path.exists(self.meta_path):
+                # Work from the files, not our mapping, so concurrent writers don't lose updates
+                with open(self.meta_path) as f:
+                    meta = json.load(f)
+                if meta["runbooks"] and meta.get("model") != model:
+                    # Mixed vectors: keep the old model so searches fall back until a rebuild
+                    model = meta.get("model")
+                self._merge(meta, runbooks, sections, services, new_vectors, model)
+            else:
+                self._write(runbooks, sections, services, new_vectors, model)
+        finally:
+            lock.close()
+        self.refresh(force=True)
+
+    def _merge(
+        self,
+        meta: Dict[str, Any],
+        runbooks: List[str],
+        sections: List[Optional[str]],
+        services: List[Optional[str]],
+        new_vectors: np.ndarray,
+        model: Optional[str]
+    ):
+        all_runbooks, all_sections, all_services = meta["runbooks"], meta["sections"], meta["services"]
+        # Only a runbook's own rows are reused, so a reader still on the old
+        # sidecar never scores one runbook's vector under another's id
+        updated = set(runbooks)
+        own_rows: Dict[str, List[int]] = {}
+        for i, runbook_id in enumerate(all_runbooks):
+            if runbook_id in updated:
+                own_rows.setdefault(runbook_id, []).append(i)
+        count = len(all_runbooks)
+        slots = []
+        for runbook_id, section_id, service in zip(runbooks, sections, services):
+            free = own_rows.get(runbook_id)
+            if free:
+                slot = free.pop(0)
+            else:
+                slot = len(all_runbooks)
+                all_runbooks.append(None)
+                all_sections.append(None)
+                all_services.append(None)
+            all_runbooks[slot], all_sections[slot], all_services[slot] = runbook_id, section_id, service
+            slots.append(slot)
+        blanked = [slot for free in own_rows.values() for slot in free]
+        for slot in blanked:
+            all_runbooks[slot], all_sections[slot], all_services[slot] = None, None, None
+
+        rows = np.asarray(slots)
+        if not self._write_rows_in_place(count, rows, new_vectors, blanked):
+            if count:
+                vectors = np.load(self.vectors_path).astype(np.float32)
+                if vectors.shape[1] != new_vectors.shape[1]:
+                    print(f"Runbook index holds {vectors.shape[1]}-dim vectors, not {new_vectors.shape[1]}; rebuild it")
+                    return
+                vectors = np.vstack([vectors, np.zeros((len(all_runbooks) - count, vectors.shape[1]), dtype=np.float32)])
+            else:
+                vectors = np.zeros((len(all_runbooks), new_vectors.shape[1]), dtype=np.float32)
+            vectors[rows] = new_vectors
+            vectors[blanked] = 0.0
+            self._write(all_runbooks, all_sections, all_services, vectors, model)
+            return
+        self._write_meta(all_runbooks, all_sections, all_services, model)
+
+    def _write_rows_in_place(self, count: int, rows: np.ndarray, new_vectors: np.ndarray, blanked: List[int]) -> bool:
+        """Overwrite rows of the existing file and append the rest, growing its
+        header in place. Returns False if the file can't be extended (other
+        dtype or width, or a header without room), leaving it untouched."""
+        dtype = np.dtype(self.dtype)
+        width = new_vectors.shape[1]
+        try:
+            with open(self.vectors_path, "rb") as f:
+                version = npy_format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran_order, file_dtype = npy_format.read_array_header_1_0(f)
+                else:
+                    shape, fortran_order, file_dtype = npy_format.read_array_header_2_0(f)
+                offset = f.tell()
+        except (OSError, ValueError):
+            return False
+        if fortran_order or file_dtype != dtype or shape != (count, width) or count == 0:
+            return False
+
+        existing = rows < count
+        header = {
+            "descr": npy_format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": (count + int((~existing).sum()), width)
+        }
+        buffer = io.BytesIO()
+        if version == (1, 0):
+            npy_format.write_array_header_1_0(buffer, header)
+        else:
+            npy_format.write_array_header_2_0(buffer, header)
+        # np.save leaves room in the header for the row count to grow
+        if len(buffer.getvalue()) != offset:
+            return False
+
+        mapped = np.memmap(self.vectors_path, dtype=dtype, mode="r+", offset=offset, shape=(count, width))
+        mapped[rows[existing]] = new_vectors[existing].astype(dtype)
+        mapped[blanked] = 0
+        mapped.flush()
+        del mapped
+        if not existing.all():
+            with open(self.vectors_path, "r+b") as f:
+                # Past the rows the header counts, in case an earlier append was interrupted
+                f.seek(offset + count * width * dtype.itemsize)
+                f.truncate()
+                f.write(np.ascontiguousarray(new_vectors[~existing].astype(dtype)).tobytes())
+                f.flush()
+                # Grow the shape last: readers key on meta.json and ignore rows past it
+                f.seek(0)
+                f.write(buffer.getvalue())
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.RUNBOOK_INDEX_ENABLED,
+            "path": self.directory,
+            "vectors": self.live_rows if self.vectors is not None else 0,
+            "blank_rows": len(self.runbooks) - self.live_rows if self.vectors is not None else 0,
+            "dtype": np.dtype(self.dtype).name,
+            "model": self.model,
+            "searches": self.searches,
+            "reloads": self.reloads
+        }
+
+
+runbook_index = RunbookVectorIndex()
+
+
+def build_runbook_index_from_db(db) -> int:
+    """Export every embedded runbook and its sections from the database into
+    the index; returns the number of runbooks."""
+    from app.db.models import Runbook, RunbookChunk
+
+    rows = db.query(Runbook.id, Runbook.service, Runbook.embedding).filter(
+        Runbook.embedding.isnot(None)
+    ).all()
+    chunks: Dict[str, List[Tuple[str, Sequence[float]]]] = {}
+    for chunk in db.query(RunbookChunk.id, RunbookChunk.runbook_id, RunbookChunk.embedding).filter(
+        RunbookChunk.embedding.isnot(None)
+    ).order_by(RunbookChunk.runbook_id, RunbookChunk.chunk_index):
+        chunks.setdefault(str(chunk.runbook_id), []).append((str(chunk.id), chunk.embedding))
+    runbook_index.build([(str(r.id), r.service, r.embedding, chunks.get(str(r.id), [])) for r in rows])
+    return len(rows)
+
+
+def main():
+    import argparse
+    from app.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Manage the memory-mapped runbook vector index")
+    parser.add_argument("command", choices=["build", "status"])
+    args = parser.parse_args()
+
+    if args.command == "build":
+        db = SessionLocal()
+        try:
+            count = build_runbook_index_from_db(db)
+        finally:
+            db.close()
+        print(f"Indexed {count} runbooks into {runbook_index.directory}")
+    else:
+        runbook_index.refresh(force=True)
+        print(runbook_index.stats())
+
+
+if __name__ == "__main__":
+    main()
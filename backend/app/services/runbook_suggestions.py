@@ -0,0 +1,173 @@
+"""Precomputed runbook suggestions per incident.
+
+Suggestions are computed in the background when an incident is created (or
+its title, description or top evidence changes) and stored with their scores,
+so the incident page reads them with an indexed lookup instead of embedding
+the incident and running a vector search on every load. When runbooks are re-indexed, the
+stored suggestions of active incidents are updated for just those runbooks.
+"""
+import hashlib
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+import numpy as np
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db.models import Incident, IncidentRunbookSuggestion, Runbook, RunbookChunk
+from app.services.embedding_backends import embedding_model_id
+from app.services.rag_service import RAGService, incident_document
+
+
+ACTIVE_STATUSES = ("open", "investigating")
+
+
+def query_hash(text: str) -> str:
+    return hashlib.sha256(f"{embedding_model_id()}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _similarities(matrix: np.ndarray, vector: np.ndarray) -> np.ndarray:
+    """Cosine similarity of each row of matrix with vector."""
+    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(vector) or 1.0)
+    norms[norms == 0] = 1.0
+    return (matrix @ vector) / norms
+
+
+class RunbookSuggestionService:
+    """Computes, stores and serves runbook suggestions for incidents."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.rag_service = RAGService(db)
+
+    def is_stale(self, incident: Incident) -> bool:
+        return incident.embedding_source_hash != query_hash(incident_document(incident))
+
+    async def refresh_for_incident(self, incident: Incident, force: bool = False) -> List[IncidentRunbookSuggestion]:
+        """Re-embed an incident and recompute its suggestions if its text or
+        top evidence changed (or ``force``).
+
+        This is the only writer of ``Incident.embedding``, so the stored
+        suggestions always match the stored vector.
+        """
+        if not force and not self.is_stale(incident):
+            return incident.runbook_suggestions
+
+        text = incident_document(incident)
+        embeddings = await self.rag_service.ml_service.generate_embeddings([text])
+        if not embeddings:
+            return []
+        query = np.asarray(embeddings[0], dtype=np.float32)
+        incident.embedding = embeddings[0]
+        incident.embedding_source_hash = query_hash(text)
+
+        matches = self.rag_service.runbooks_near_vector(
+            embeddings[0], None, settings.RUNBOOK_SUGGESTIONS_STORED
+        )
+        scored = [
+            (runbook, chunk, self._score(query, chunk.embedding if chunk is not None else runbook.embedding))
+            for runbook, chunk in matches
+        ]
+        suggestions = self._replace(incident, self._rank(incident.id, scored))
+        self.db.commit()
+        return suggestions
+
+    def _score(self, query: np.ndarray, embedding) -> float:
+        if embedding is None:
+            return 0.0
+        return float(_similarities(np.asarray(embedding, dtype=np.float32)[None, :], query)[0])
+
+    def _rank(
+        self,
+        incident_id: UUID,
+        scored: List[Tuple[Runbook, Optional[RunbookChunk], float]]
+    ) -> List[IncidentRunbookSuggestion]:
+        scored = sorted(scored, key=lambda s: s[2], reverse=True)[:settings.RUNBOOK_SUGGESTIONS_STORED]
+        return [
+            IncidentRunbookSuggestion(
+                incident_id=incident_id,
+                runbook_id=runbook.id,
+                chunk_id=chunk.id if chunk is not None else None,
+                rank=rank,
+                score=score,
+                section=chunk.heading if chunk is not None else None
+            )
+            for rank, (runbook, chunk, score) in enumerate(scored, start=1)
+        ]
+
+    def _replace(self, incident: Incident, suggestions: List[IncidentRunbookSuggestion]) -> List[IncidentRunbookSuggestion]:
+        # Delete first: the unit of work would otherwise insert before deleting
+        # and trip the (incident_id, runbook_id) unique constraint
+        self.db.query(IncidentRunbookSuggestion).filter(
+            IncidentRunbookSuggestion.incident_id == incident.id
+        ).delete(synchronize_session=False)
+        self.db.expire(incident, ["runbook_suggestions"])
+        self.db.add_all(suggestions)
+        return suggestions
+
+    def refresh_for_runbooks(self, runbook_ids: List[UUID]) -> int:
+        """Rescore re-indexed runbooks against every active incident.
+
+        Only the given runbooks are compared (one matrix product over their
+        sections), then merged into each incident's stored list. Returns the
+        number of incidents whose suggestions changed.
+        """
+        if not runbook_ids:
+            return 0
+        incidents = self.db.query(Incident).filter(
+            Incident.status.in_(ACTIVE_STATUSES),
+            Incident.embedding.isnot(None)
+        ).all()
+        if not incidents:
+            return 0
+
+        runbooks = self.db.query(Runbook).filter(Runbook.id.in_(runbook_ids)).all()
+        # Each runbook is represented by its sections, or its document vector if unchunked
+        vectors, owners = [], []
+        for runbook in runbooks:
+            chunks = [c for c in runbook.chunks if c.embedding is not None]
+            for chunk in chunks:
+                vectors.append(chunk.embedding)
+                owners.append((runbook, chunk))
+            if not chunks and runbook.embedding is not None:
+                vectors.append(runbook.embedding)
+                owners.append((runbook, None))
+        updated_ids = set(runbook_ids)
+        matrix = np.asarray(vectors, dtype=np.float32) if vectors else None
+
+        changed = 0
+        for incident in incidents:
+            best: Dict[UUID, Tuple[Runbook, Optional[RunbookChunk], float]] = {}
+            if matrix is not None:
+                sims = _similarities(matrix, np.asarray(incident.embedding, dtype=np.float32))
+                for (runbook, chunk), score in zip(owners, sims):
+                    if runbook.id not in best or score > best[runbook.id][2]:
+                        best[runbook.id] = (runbook, chunk, float(score))
+
+            kept = [
+                (s.runbook, s.chunk, s.score)
+                for s in incident.runbook_suggestions
+                if s.runbook_id not in updated_ids
+            ]
+            previous = [(s.runbook_id, s.chunk_id, round(s.score, 6)) for s in incident.runbook_suggestions]
+            ranked = self._rank(incident.id, kept + list(best.values()))
+            if [(s.runbook_id, s.chunk_id, round(s.score, 6)) for s in ranked] != previous:
+                self._replace(incident, ranked)
+                changed += 1
+        self.db.commit()
+        return changed
+
+    def get_suggestions(self, incident: Incident, limit: Optional[int] = None) -> List[IncidentRunbookSuggestion]:
+        """Stored suggestions, best first.
+
+        Never embeds on the request path: the worker refreshes them whenever
+        the incident's text or evidence changes (``embedding_source_hash``
+        records what they were computed from). An incident that was never
+        embedded gets a refresh scheduled and no suggestions yet.
+        """
+        limit = limit or settings.RUNBOOK_SUGGESTIONS_DEFAULT_LIMIT
+        if incident.embedding is None:
+            from app.workers.incident_worker import schedule_suggestion_refresh
+            schedule_suggestion_refresh(incident.id)
+            return []
+        return self.db.query(IncidentRunbookSuggestion).filter(
+            IncidentRunbookSuggestion.incident_id == incident.id
+        ).order_by(IncidentRunbookSuggestion.rank).limit(limit).all()
@@ -0,0 +1,81 @@
+"""Similar past incidents ("has this happened before?").
+
+Incidents are matched on their stored embedding (title, description and top
+evidence digests, see ``incident_document``) through the ANN index, and
+returned with what was learned from them: confirmed hypotheses and the
+postmortem. For a recurring failure that answers the page without an LLM call.
+"""
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db.models import Hypothesis, Incident, Postmortem
+from app.db.vector_indexes import apply_search_params, nearest
+
+
+RESOLVED_STATUSES = ("resolved", "closed")
+
+
+class SimilarIncidentService:
+    """Finds past incidents similar to a given one."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def find_similar(
+        self,
+        incident: Incident,
+        limit: Optional[int] = None,
+        resolved_only: bool = False,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Nearest other incidents, most similar first.
+
+        Each result has the ``incident``, its cosine ``similarity``, its
+        ``confirmed_hypotheses`` and its latest ``postmortem`` (or None).
+        """
+        limit = limit or settings.SIMILAR_INCIDENTS_DEFAULT_LIMIT
+        if incident.embedding is None:
+            # Embedded by the suggestion refresh worker, which keeps the
+            # stored suggestions in step with the vector
+            from app.workers.incident_worker import schedule_suggestion_refresh
+            schedule_suggestion_refresh(incident.id)
+            return []
+
+        distance = Incident.embedding.cosine_distance(incident.embedding).label("distance")
+        query = self.db.query(Incident, distance).filter(
+            Incident.id != incident.id,
+            Incident.embedding.isnot(None)
+        )
+        if resolved_only:
+            query = query.filter(Incident.status.in_(RESOLVED_STATUSES))
+
+        apply_search_params(self.db, ef_search=ef_search, probes=probes, limit=limit)
+        matches = nearest(query, Incident.id, Incident.embedding, incident.embedding, limit).all()
+        if not matches:
+            return []
+
+        # Two queries for all matches rather than two per match
+        ids = [match.id for match, _ in matches]
+        hypotheses: Dict[Any, List[Hypothesis]] = {}
+        for hypothesis in self.db.query(Hypothesis).filter(
+            Hypothesis.incident_id.in_(ids),
+            Hypothesis.status == "confirmed"
+        ).order_by(Hypothesis.rank):
+            hypotheses.setdefault(hypothesis.incident_id, []).append(hypothesis)
+
+        postmortems: Dict[Any, Postmortem] = {}
+        for postmortem in self.db.query(Postmortem).filter(
+            Postmortem.incident_id.in_(ids)
+        ).order_by(Postmortem.created_at):
+            postmortems[postmortem.incident_id] = postmortem
+
+        return [
+            {
+                "incident": match,
+                "similarity": 1.0 - float(match_distance),
+                "confirmed_hypotheses": hypotheses.get(match.id, []),
+                "postmortem": postmortems.get(match.id)
+            }
+            for match, match_distance in matches
+        ]
@@ -0,0 +1,82 @@
+"""Parsing of JSON-structured LLM output, including partial/streamed output."""
+import json
+from typing import Any, Dict, List, Optional
+
+
+class IncrementalJSONArrayParser:
+    """Extracts complete objects from a JSON array as text arrives.
+
+    Feed generated text chunk by chunk; each call returns the objects of the
+    target array (``{"<key>": [ {...}, {...} ]}``, or a bare top-level array)
+    that became complete. Objects already emitted are not lost if the
+    generation is later cut off mid-object by the token limit, which a
+    plain ``json.loads`` of the whole reply would reject.
+    """
+
+    def __init__(self, key: Optional[str] = None):
+        self.key = key
+        self.buffer = ""
+        self.pos = 0
+        self.array_start: Optional[int] = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.object_start: Optional[int] = None
+        self.done = False
+
+    def _find_array(self) -> bool:
+        if self.key is not None:
+            marker = self.buffer.find(f'"{self.key}"')
+            if marker == -1:
+                return False
+            bracket = self.buffer.find("[", marker)
+        else:
+            bracket = self.buffer.find("[")
+        if bracket == -1:
+            return False
+        self.array_start = bracket
+        self.pos = bracket + 1
+        return True
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.buffer += chunk
+        if self.done or (self.array_start is None and not self._find_array()):
+            return []
+
+        completed = []
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                if self.depth == 0:
+                    self.object_start = self.pos
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0 and self.object_start is not None:
+                    try:
+                        value = json.loads(self.buffer[self.object_start:self.pos + 1])
+                        if isinstance(value, dict):
+                            completed.append(value)
+                    except json.JSONDecodeError:
+                        pass
+                    self.object_start = None
+            elif char == "]" and self.depth == 0:
+                self.done = True
+                self.pos += 1
+                break
+            self.pos += 1
+        return completed
+
+
+def parse_json_array_objects(text: str, key: Optional[str] = None) -> List[Dict[str, Any]]:
+    """All complete objects of the target array in a (possibly truncated) reply."""
+    return IncrementalJSONArrayParser(key).feed(text)
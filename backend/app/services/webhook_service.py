@@ -1,8 +1,10 @@
 """Service for sending outgoing webhooks."""
 import httpx
 from typing import List, Dict, Any, Optional
-from app.db import SessionLocal
-from app.db.models import WebhookEndpoint, Incident
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth.models import WebhookEndpoint
+from app.db.models import Incident
 from app.config import settings
 import hmac
 import hashlib
@@ -13,7 +15,7 @@ from datetime import datetime
 class WebhookService:
     """Service for sending webhooks to external systems."""
     
-    def __init__(self, db: SessionLocal):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
     async def send_webhook(
@@ -47,9 +49,9 @@ class WebhookService:
     async def notify_incident_created(self, incident: Incident):
         """Send webhook when incident is created."""
         # Get all active webhook endpoints for incident.created event
-        endpoints = self.db.query(WebhookEndpoint).filter(
-            WebhookEndpoint.is_active == True
-        ).all()
+        endpoints = (await self.db.scalars(
+            select(WebhookEndpoint).where(WebhookEndpoint.is_active == True)
+        )).all()
         
         payload = {
             "event": "incident.created",
@@ -69,13 +71,13 @@ class WebhookService:
                 await self.send_webhook(endpoint.url, payload, endpoint.secret)
                 # Update last_triggered
                 endpoint.last_triggered = datetime.utcnow()
-                self.db.commit()
+                await self.db.commit()
     
     async def notify_incident_updated(self, incident: Incident):
         """Send webhook when incident is updated."""
-        endpoints = self.db.query(WebhookEndpoint).filter(
-            WebhookEndpoint.is_active == True
-        ).all()
+        endpoints = (await self.db.scalars(
+            select(WebhookEndpoint).where(WebhookEndpoint.is_active == True)
+        )).all()
         
         payload = {
             "event": "incident.updated",
@@ -93,13 +95,13 @@ class WebhookService:
             if "incident.updated" in (endpoint.events or "").split(","):
                 await self.send_webhook(endpoint.url, payload, endpoint.secret)
                 endpoint.last_triggered = datetime.utcnow()
-                self.db.commit()
+                await self.db.commit()
     
     async def notify_hypothesis_generated(self, incident_id: str, hypothesis_count: int):
         """Send webhook when hypotheses are generated."""
-        endpoints = self.db.query(WebhookEndpoint).filter(
-            WebhookEndpoint.is_active == True
-        ).all()
+        endpoints = (await self.db.scalars(
+            select(WebhookEndpoint).where(WebhookEndpoint.is_active == True)
+        )).all()
         
         payload = {
             "event": "hypothesis.generated",
@@ -114,5 +116,5 @@ class WebhookService:
             if "hypothesis.generated" in (endpoint.events or "").split(","):
                 await self.send_webhook(endpoint.url, payload, endpoint.secret)
                 endpoint.last_triggered = datetime.utcnow()
-                self.db.commit()
+                await self.db.commit()
 
@@ -2,11 +2,16 @@
 from app.celery_app import celery_app
 from app.db import SessionLocal
 from app.db.models import EvidenceItem
-from app.services.ml_service import MLService
+from app.services.ml_service import MLService, format_image_analysis
 from app.services.rag_service import RAGService
+from app.services.image_hashing import compute_perceptual_hash, hamming_distance
+from app.services.log_miner import mine_log_text, should_digest
+from app.workers.runtime import run_async
+from app.config import settings
 from uuid import UUID
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
 import os
-import asyncio
 
 
 @celery_app.task(name="process_evidence")
@@ -18,22 +23,89 @@ def process_evidence(evidence_id: str):
         if not evidence:
             return
         
+        # Collapse long logs into templates for LLM prompts
+        if should_digest(evidence.evidence_type, evidence.content):
+            evidence.log_digest = mine_log_text(evidence.content)
+            db.commit()
+        
         # Generate embedding if content exists
         if evidence.content:
             rag_service = RAGService(db)
             # Run async function in sync context
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                loop.run_until_complete(rag_service.index_evidence(evidence))
-            finally:
-                loop.close()
+            run_async(rag_service.index_evidence(evidence))
         
+        refresh_incident_embedding([evidence.incident_id])
         return {"status": "success"}
     finally:
         db.close()
 
 
+@celery_app.task(name="process_evidence_batch")
+def process_evidence_batch(evidence_ids: List[str]):
+    """Generate embeddings for many evidence items with batched API calls."""
+    db = SessionLocal()
+    try:
+        evidence_items = db.query(EvidenceItem).filter(
+            EvidenceItem.id.in_([UUID(e) for e in evidence_ids])
+        ).all()
+        
+        for evidence in evidence_items:
+            if should_digest(evidence.evidence_type, evidence.content):
+                evidence.log_digest = mine_log_text(evidence.content)
+        db.commit()
+        
+        rag_service = RAGService(db)
+        run_async(rag_service.index_evidence_batch(evidence_items))
+        refresh_incident_embedding(list({e.incident_id for e in evidence_items}))
+        
+        return {"status": "success", "processed": len(evidence_items)}
+    finally:
+        db.close()
+
+
+def refresh_incident_embedding(incident_ids: List[UUID]):
+    """New evidence can change an incident's embedding text; refresh it in the
+    background (debounced per incident, so a burst of evidence refreshes once)."""
+    from app.workers.incident_worker import schedule_suggestion_refresh
+    
+    for incident_id in incident_ids:
+        schedule_suggestion_refresh(incident_id)
+
+
+def find_duplicate_analysis(db, evidence: EvidenceItem) -> Optional[str]:
+    """Return the VLM analysis of a recent near-identical screenshot, if any.
+    
+    Candidates are analyzed screenshots from the last VLM_DEDUP_WINDOW_HOURS
+    (from the same incident unless VLM_DEDUP_SAME_INCIDENT_ONLY is off)
+    whose perceptual hash is within VLM_DEDUP_MAX_DISTANCE bits.
+    """
+    if not settings.VLM_DEDUP_ENABLED or not evidence.perceptual_hash:
+        return None
+    
+    since = datetime.now(timezone.utc) - timedelta(hours=settings.VLM_DEDUP_WINDOW_HOURS)
+    query = db.query(EvidenceItem.id, EvidenceItem.perceptual_hash, EvidenceItem.vlm_analysis).filter(
+        EvidenceItem.evidence_type == "screenshot",
+        EvidenceItem.id != evidence.id,
+        EvidenceItem.perceptual_hash.isnot(None),
+        EvidenceItem.vlm_analysis.isnot(None),
+        EvidenceItem.created_at >= since
+    )
+    if settings.VLM_DEDUP_SAME_INCIDENT_ONLY:
+        query = query.filter(EvidenceItem.incident_id == evidence.incident_id)
+    
+    candidates = query.order_by(EvidenceItem.created_at.desc()).limit(settings.VLM_DEDUP_MAX_CANDIDATES).all()
+    best = None
+    for candidate_id, candidate_hash, analysis in candidates:
+        distance = hamming_distance(evidence.perceptual_hash, candidate_hash)
+        if distance <= settings.VLM_DEDUP_MAX_DISTANCE and (best is None or distance < best[0]):
+            best = (distance, candidate_id, analysis)
+    
+    if best is None:
+        return None
+    print(f"Screenshot {evidence.id} matches {best[1]} (distance {best[0]}), reusing VLM analysis")
+    return best[2]
+
+
 @celery_app.task(name="process_screenshot")
 def process_screenshot(evidence_id: str):
     """Process screenshot with VLM."""
@@ -46,34 +118,33 @@ def process_screenshot(evidence_id: str):
         if not os.path.exists(evidence.file_path):
             return
         
-        # Analyze screenshot with VLM
-        ml_service = MLService()
-        prompt = "Describe what you see in this dashboard screenshot. Identify any errors, anomalies, or important metrics."
+        if not evidence.perceptual_hash:
+            evidence.perceptual_hash = run_async(compute_perceptual_hash(evidence.file_path))
+        
+        # Reuse the analysis of a near-identical screenshot if there is one
+        analysis = find_duplicate_analysis(db, evidence)
+        
+        if analysis is None:
+            # Analyze screenshot with VLM (description, anomalies, metrics, summary in one pass)
+            ml_service = MLService()
+            structured = run_async(ml_service.analyze_image_structured(evidence.file_path))
+            analysis = format_image_analysis(structured)
         
-        # Run async function in sync context
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            analysis = loop.run_until_complete(ml_service.analyze_image(evidence.file_path, prompt))
-        finally:
-            loop.close()
+        previous_analysis = evidence.vlm_analysis
+        evidence.vlm_analysis = analysis
         
-        # Update evidence with analysis
+        # Update evidence with analysis (once; a re-run leaves the content as is)
         if not evidence.content:
             evidence.content = analysis
-        else:
+        elif analysis != previous_analysis:
             evidence.content = f"{evidence.content}\n\nVLM Analysis:\n{analysis}"
         
         db.commit()
         
-        # Generate embedding
+        # Generate embedding (a no-op if the content didn't change)
         rag_service = RAGService(db)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(rag_service.index_evidence(evidence))
-        finally:
-            loop.close()
+        run_async(rag_service.index_evidence(evidence))
+        refresh_incident_embedding([evidence.incident_id])
         
         return {"status": "success", "analysis": analysis[:200] if analysis else ""}
     finally:
@@ -1,13 +1,18 @@
 """Celery tasks for incident processing."""
 from app.celery_app import celery_app
 from app.db import SessionLocal
-from app.db.models import Incident, TimelineEvent, Hypothesis, Action
+from app.db.models import Incident, TimelineEvent, Action, Runbook
 from app.services.incident_service import IncidentService
+from app.services.rag_service import RAGService
+from app.services.runbook_suggestions import RunbookSuggestionService
 from app.integrations.github import GitHubIntegration
 from app.integrations.pagerduty import PagerDutyIntegration
+from app.workers.runtime import run_async
+from app.config import settings
 from uuid import UUID
+from typing import List, Optional
 from datetime import datetime
-import asyncio
+import redis
 
 
 @celery_app.task(name="process_new_incident")
@@ -24,12 +29,7 @@ def process_new_incident(incident_id: str):
         pagerduty = PagerDutyIntegration()
         
         # Get recent GitHub merges (async)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            recent_merges = loop.run_until_complete(github.get_recent_merges(hours=24))
-        finally:
-            loop.close()
+        recent_merges = run_async(github.get_recent_merges(hours=24))
         for merge in recent_merges[:5]:  # Limit to 5
             # Parse merged_at timestamp
             merged_at_str = merge.get("merged_at")
@@ -61,12 +61,7 @@ def process_new_incident(incident_id: str):
             db.add(event)
         
         # Get PagerDuty incidents (async)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            pd_incidents = loop.run_until_complete(pagerduty.get_incidents(hours=24))
-        finally:
-            loop.close()
+        pd_incidents = run_async(pagerduty.get_incidents(hours=24))
         for pd_incident in pd_incidents[:5]:
             # Parse datetime safely
             created_at_str = pd_incident.get("created_at", "")
@@ -99,6 +94,10 @@ def process_new_incident(incident_id: str):
         # Trigger timeline generation
         generate_incident_timeline.delay(incident_id)
         
+        # Precompute runbook suggestions (with whatever evidence has arrived)
+        # so the incident page doesn't have to
+        schedule_suggestion_refresh(incident_id)
+        
     finally:
         db.close()
 
@@ -109,12 +108,7 @@ def generate_incident_timeline(incident_id: str):
     db = SessionLocal()
     try:
         service = IncidentService(db)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            events = loop.run_until_complete(service.generate_timeline(UUID(incident_id)))
-        finally:
-            loop.close()
+        events = run_async(service.generate_timeline(UUID(incident_id)))
         # Timeline is already generated from events
         return {"status": "success", "events_count": len(events)}
     finally:
@@ -122,21 +116,16 @@ def generate_incident_timeline(incident_id: str):
 
 
 @celery_app.task(name="generate_hypotheses")
-def generate_hypotheses(incident_id: str):
+def generate_hypotheses(incident_id: str, use_cache: bool = True):
     """Generate hypotheses for an incident."""
     db = SessionLocal()
     try:
         service = IncidentService(db)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            hypotheses = loop.run_until_complete(service.generate_hypotheses(UUID(incident_id)))
-            
-            # Generate actions based on hypotheses
-            if hypotheses:
-                loop.run_until_complete(service.generate_actions(UUID(incident_id)))
-        finally:
-            loop.close()
+        hypotheses = run_async(service.generate_hypotheses(UUID(incident_id), use_cache=use_cache))
+        
+        # Generate actions based on hypotheses
+        if hypotheses:
+            run_async(service.generate_actions(UUID(incident_id)))
         
         return {"status": "success", "hypotheses_count": len(hypotheses)}
     finally:
@@ -144,63 +133,106 @@ def generate_hypotheses(incident_id: str):
 
 
 @celery_app.task(name="generate_postmortem")
-def generate_postmortem(incident_id: str):
+def generate_postmortem(incident_id: str, use_cache: bool = True):
     """Generate a postmortem draft for an incident."""
     db = SessionLocal()
     try:
-        from app.db.models import Postmortem
-        from app.services.ml_service import MLService
-        
-        incident = db.query(Incident).filter(Incident.id == UUID(incident_id)).first()
-        if not incident:
+        service = IncidentService(db)
+        postmortem = run_async(service.generate_postmortem(UUID(incident_id), use_cache=use_cache))
+        if not postmortem:
             return
         
-        # Get timeline
-        events = db.query(TimelineEvent).filter(
-            TimelineEvent.incident_id == incident.id
-        ).order_by(TimelineEvent.timestamp.asc()).all()
-        
-        timeline_text = "\n".join([
-            f"{e.timestamp}: {e.title}"
-            for e in events
-        ])
-        
-        # Get hypotheses
-        hypotheses = db.query(Hypothesis).filter(
-            Hypothesis.incident_id == incident.id
-        ).all()
-        hypotheses_text = [h.title for h in hypotheses]
-        
-        # Generate postmortem
-        ml_service = MLService()
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            postmortem_data = loop.run_until_complete(ml_service.generate_postmortem(
-                incident.title,
-                timeline_text,
-                hypotheses_text,
-                resolution=incident.resolved_at.isoformat() if incident.resolved_at else None
-            ))
-        finally:
-            loop.close()
-        
-        # Create postmortem
-        postmortem = Postmortem(
-            incident_id=incident.id,
-            title=postmortem_data["title"],
-            summary=postmortem_data["summary"],
-            root_cause=postmortem_data["root_cause"],
-            contributing_factors=postmortem_data["contributing_factors"],
-            impact=postmortem_data["impact"],
-            resolution=postmortem_data["resolution"],
-            follow_ups=postmortem_data["follow_ups"]
-        )
+        return {"status": "success", "postmortem_id": str(postmortem.id)}
+    finally:
+        db.close()
+
+
+@celery_app.task(name="backfill_postmortem_embeddings")
+def backfill_postmortem_embeddings(batch_size: int = 64):
+    """Embed existing postmortems that have no embedding yet."""
+    db = SessionLocal()
+    try:
+        count = run_async(RAGService(db).backfill_postmortem_embeddings(batch_size=batch_size))
+        return {"status": "success", "indexed": count}
+    finally:
+        db.close()
+
+
+@celery_app.task(name="index_runbooks")
+def index_runbooks(runbook_ids: Optional[List[str]] = None, batch_size: int = 16, force: bool = False):
+    """Chunk and embed runbooks (all of them by default), a batch per embedding call.
+    
+    Runbooks unchanged since they were last embedded are skipped unless ``force``.
+    """
+    db = SessionLocal()
+    try:
+        rag_service = RAGService(db)
+        query = db.query(Runbook.id).order_by(Runbook.id)
+        if runbook_ids:
+            query = query.filter(Runbook.id.in_([UUID(i) for i in runbook_ids]))
+        ids = [row.id for row in query.all()]
         
-        db.add(postmortem)
-        db.commit()
+        suggestions = RunbookSuggestionService(db)
+        indexed = 0
+        for start in range(0, len(ids), batch_size):
+            batch = db.query(Runbook).filter(Runbook.id.in_(ids[start:start + batch_size])).all()
+            updated = run_async(rag_service.index_runbooks_batch(batch, force=force))
+            # Keep active incidents' stored suggestions in step with the new vectors
+            suggestions.refresh_for_runbooks([r.id for r in updated])
+            indexed += len(updated)
         
-        return {"status": "success", "postmortem_id": str(postmortem.id)}
+        return {"status": "success", "indexed": indexed, "unchanged": len(ids) - indexed}
     finally:
         db.close()
 
+
+_redis_client = None
+
+
+def _redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+
+def _pending_key(incident_id) -> str:
+    return f"opslens:suggestions:pending:{incident_id}"
+
+
+def schedule_suggestion_refresh(incident_id):
+    """Enqueue one debounced suggestion refresh per incident.
+    
+    A burst of evidence for the same incident sets the pending key once and
+    runs a single refresh RUNBOOK_SUGGESTIONS_REFRESH_DEBOUNCE seconds later;
+    the task clears the key when it starts, so evidence arriving mid-refresh
+    schedules another. Without Redis every call enqueues.
+    """
+    debounce = settings.RUNBOOK_SUGGESTIONS_REFRESH_DEBOUNCE
+    try:
+        if not _redis().set(_pending_key(incident_id), 1, nx=True, ex=max(1, debounce * 10)):
+            return
+    except redis.RedisError as e:
+        print(f"Suggestion refresh debounce unavailable: {e}")
+    refresh_runbook_suggestions.apply_async(args=[str(incident_id)], countdown=debounce)
+
+
+@celery_app.task(name="refresh_runbook_suggestions")
+def refresh_runbook_suggestions(incident_id: str, force: bool = False):
+    """Re-embed an incident if its text or top evidence changed, and store
+    its top runbook matches (the embedding also serves similar-incident search)."""
+    try:
+        _redis().delete(_pending_key(incident_id))
+    except redis.RedisError:
+        pass
+    
+    db = SessionLocal()
+    try:
+        incident = db.query(Incident).filter(Incident.id == UUID(incident_id)).first()
+        if not incident:
+            return
+        
+        suggestions = run_async(RunbookSuggestionService(db).refresh_for_incident(incident, force=force))
+        return {"status": "success", "suggestions_count": len(suggestions)}
+    finally:
+        db.close()
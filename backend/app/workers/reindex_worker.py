@@ -0,0 +1,22 @@
+"""Celery tasks for bulk (re-)embedding."""
+from app.celery_app import celery_app
+from app.config import settings
+from app.db import SessionLocal
+from app.services.reindex import job_status, run_reindex_job
+from app.workers.runtime import run_async
+from uuid import UUID
+
+
+@celery_app.task(
+    name="reindex_embeddings",
+    time_limit=settings.REINDEX_TASK_TIME_LIMIT,
+    soft_time_limit=settings.REINDEX_TASK_TIME_LIMIT - 60
+)
+def reindex_embeddings(job_id: str):
+    """Run or resume a reindex job from its last checkpoint."""
+    db = SessionLocal()
+    try:
+        job = run_async(run_reindex_job(db, UUID(job_id)))
+        return job_status(job)
+    finally:
+        db.close()
@@ -0,0 +1,45 @@
+"""Event loop management for running async services inside Celery tasks."""
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional
+from app.services.http_client import init_inference_client, close_inference_client
+
+
+_local = threading.local()
+
+
+def get_worker_loop() -> asyncio.AbstractEventLoop:
+    """Return the long-lived event loop for the current worker thread.
+
+    Tasks used to create and close a fresh loop per call, which made any
+    pooled connection unusable by the next task. Keeping one loop per worker
+    lets the shared inference client reuse keep-alive connections.
+    """
+    loop: Optional[asyncio.AbstractEventLoop] = getattr(_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        _local.loop = loop
+    return loop
+
+
+def run_async(coro: Coroutine[Any, Any, Any]) -> Any:
+    """Run a coroutine to completion on the worker loop."""
+    return get_worker_loop().run_until_complete(coro)
+
+
+def init_worker_runtime():
+    """Create the worker loop and open the shared inference client."""
+    run_async(init_inference_client())
+
+
+def shutdown_worker_runtime():
+    """Close pooled connections and the worker loop."""
+    loop: Optional[asyncio.AbstractEventLoop] = getattr(_local, "loop", None)
+    if loop is None or loop.is_closed():
+        return
+    try:
+        loop.run_until_complete(close_inference_client())
+    finally:
+        loop.close()
+        _local.loop = None
@@ -1,5 +1,5 @@
 import axios from 'axios'
-import { Incident, TimelineEvent, Hypothesis, EvidenceItem, Action, Runbook } from './types'
+import { Incident, TimelineEvent, Hypothesis, EvidenceItem, Action, Runbook, RunbookSuggestion, SimilarIncident } from './types'
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'
 
@@ -10,6 +10,26 @@ const client = axios.create({
   },
 })
 
+function streamGeneration<T>(path: string, resultEvent: string, onToken: (text: string) => void): Promise<T[]> {
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_URL}/api/v1${path}`)
+    const result: T[] = []
+    source.addEventListener('token', (e) => onToken(JSON.parse((e as MessageEvent).data).text))
+    source.addEventListener(resultEvent, (e) => {
+      result.push(JSON.parse((e as MessageEvent).data))
+    })
+    source.addEventListener('error', (e) => {
+      source.close()
+      const data = (e as MessageEvent).data
+      reject(new Error(data ? JSON.parse(data).detail : 'Stream failed'))
+    })
+    source.addEventListener('done', () => {
+      source.close()
+      resolve(result)
+    })
+  })
+}
+
 export const api = {
   // Incidents
   getIncidents: async (status?: string): Promise<Incident[]> => {
@@ -44,6 +64,16 @@ export const api = {
     await client.post(`/incidents/${id}/generate-postmortem`)
   },
 
+  // Streams hypothesis tokens over SSE; resolves with the stored hypothesis
+  streamHypotheses: (id: string, onToken: (text: string) => void): Promise<Hypothesis[]> => {
+    return streamGeneration<Hypothesis>(`/incidents/${id}/hypotheses/stream`, 'hypothesis', onToken)
+  },
+
+  streamPostmortem: async (id: string, onToken: (text: string) => void): Promise<{ id: string; title: string; summary: string } | null> => {
+    const results = await streamGeneration<{ id: string; title: string; summary: string }>(`/incidents/${id}/postmortem/stream`, 'postmortem', onToken)
+    return results[0] ?? null
+  },
+
   // Evidence
   getIncidentEvidence: async (incidentId: string, evidenceType?: string): Promise<EvidenceItem[]> => {
     const response = await client.get(`/evidence/incident/${incidentId}`, {
@@ -92,5 +122,19 @@ export const api = {
     })
     return response.data
   },
+
+  getSimilarIncidents: async (incidentId: string, limit?: number, resolvedOnly?: boolean): Promise<SimilarIncident[]> => {
+    const response = await client.get(`/incidents/${incidentId}/similar`, {
+      params: { limit, resolved_only: resolvedOnly },
+    })
+    return response.data
+  },
+
+  getRunbookSuggestions: async (incidentId: string, limit?: number): Promise<RunbookSuggestion[]> => {
+    const response = await client.get(`/incidents/${incidentId}/runbook-suggestions`, {
+      params: { limit },
+    })
+    return response.data
+  },
 }
 
@@ -56,8 +56,34 @@ export interface Runbook {
   id: string
   title: string
   description: string | null
-  content: string
+  content?: string | null
   service: string | null
   tags: string[]
+  section?: string | null
+  snippet?: string | null
+}
+
+export interface SimilarIncident {
+  incident: Incident
+  similarity: number
+  confirmed_hypotheses: Hypothesis[]
+  postmortem: {
+    id: string
+    title: string
+    summary: string | null
+    root_cause: string | null
+    resolution: string | null
+  } | null
+}
+
+export interface RunbookSuggestion {
+  runbook_id: string
+  title: string
+  description: string | null
+  service: string | null
+  rank: number
+  score: number
+  section: string | null
+  snippet: string | null
 }
 